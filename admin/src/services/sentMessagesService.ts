@@ -16,20 +16,43 @@ export interface SentMessageEnriched {
 interface GetSentMessagesParams {
   contact_id?: string;
   user_id?: number;
+  // Resume after a cursor returned by a previous call to fetch only new rows
+  cursor?: string;
+  updated_since?: string;
 }
 
-export async function getSentMessages(params?: GetSentMessagesParams): Promise<SentMessageEnriched[]> {
+export interface SentMessagesPage {
+  items: SentMessageEnriched[];
+  nextCursor?: string;
+}
+
+// Fetches every page after params.cursor and returns the cursor to resume from
+export async function getSentMessagesSince(params?: GetSentMessagesParams): Promise<SentMessagesPage> {
+  const items: SentMessageEnriched[] = [];
+  let cursor = params?.cursor;
   try {
-    const response = await api.get<SentMessageEnriched[]>('/sent_messages/', { 
-      params,
-      headers: {
-        'Access-Control-Allow-Origin': window.location.origin,
-        'Access-Control-Allow-Credentials': 'true'
+    while (true) {
+      const response = await api.get<SentMessageEnriched[]>('/sent_messages/', {
+        params: { ...params, cursor },
+        headers: {
+          'Access-Control-Allow-Origin': window.location.origin,
+          'Access-Control-Allow-Credentials': 'true'
+        }
+      });
+      items.push(...response.data);
+      cursor = response.headers['x-next-cursor'] || cursor;
+      if (response.headers['x-has-more'] !== 'true') {
+        break;
       }
-    });
-    return response.data;
+    }
+    return { items, nextCursor: cursor };
   } catch (error) {
     console.error('Failed to fetch sent messages:', error);
     throw error;
   }
 }
+
+export async function getSentMessages(params?: GetSentMessagesParams): Promise<SentMessageEnriched[]> {
+  const { items } = await getSentMessagesSince(params);
+  return items;
+}
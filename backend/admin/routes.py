@@ -0,0 +1,89 @@
+from fastapi import APIRouter, Depends, Query, status
+import logging
+
+from auth.auth import get_admin_user
+from auth.passwords import hash_stats
+from middleware.response_cache import response_cache_stats
+from models.user import User
+from utils.cache import cache_stats
+from utils.db_writer import db_writer
+from utils.entity_versions import entity_versions
+from utils.loop_monitor import loop_monitor
+from utils.query_stats import N_PLUS_ONE_THRESHOLD, query_stats
+from utils.request_metrics import request_metrics
+from utils.slow_queries import slow_query_log
+from utils.startup import startup_profile
+from utils.warmup import warmup_stats
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="", tags=["admin"])
+
+
+@router.get("/health")
+async def get_health(current_user: User = Depends(get_admin_user)):
+    """Cache, warm-up, password hashing, event loop, writer and response cache stats (on the loop, which owns them)."""
+    return {
+        "status": "ok",
+        "cache": cache_stats(),
+        "warmup": warmup_stats,
+        "password_hashing": hash_stats,
+        "event_loop": loop_monitor.snapshot(),
+        "db_writer": db_writer.stats,
+        "response_cache": {**response_cache_stats, **entity_versions.stats},
+    }
+
+
+@router.get("/query-stats")
+def get_query_stats(current_user: User = Depends(get_admin_user)):
+    """Per-route query counts, DB time and likely N+1 queries, by total DB time."""
+    return {
+        "n_plus_one_threshold": N_PLUS_ONE_THRESHOLD,
+        "routes": query_stats.snapshot(),
+    }
+
+
+@router.delete("/query-stats", status_code=status.HTTP_204_NO_CONTENT)
+def reset_query_stats(current_user: User = Depends(get_admin_user)):
+    """Start the aggregates over, e.g. before measuring a fix."""
+    query_stats.reset()
+
+
+@router.get("/request-stats")
+def get_request_stats(current_user: User = Depends(get_admin_user)):
+    """Per-route latency percentiles, response sizes and status codes, by total time."""
+    return {
+        "in_flight": request_metrics.in_flight,
+        "max_in_flight": request_metrics.max_in_flight,
+        "routes": request_metrics.snapshot(),
+    }
+
+
+@router.delete("/request-stats", status_code=status.HTTP_204_NO_CONTENT)
+def reset_request_stats(current_user: User = Depends(get_admin_user)):
+    request_metrics.reset()
+
+
+@router.get("/slow-queries")
+def get_slow_queries(
+    limit: int = Query(20, ge=1, le=200),
+    current_user: User = Depends(get_admin_user)
+):
+    """Slow statements by total time, with their query plans, and the most recent slow queries."""
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "top": slow_query_log.top(limit),
+        "recent": list(slow_query_log.recent)[-limit:][::-1],
+    }
+
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT)
+def reset_slow_queries(current_user: User = Depends(get_admin_user)):
+    slow_query_log.reset()
+
+
+@router.get("/startup")
+def get_startup_profile(current_user: User = Depends(get_admin_user)):
+    """How long building the app took, by step; per-module import times with STARTUP_PROFILE=true."""
+    return startup_profile.report()
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Header
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -11,15 +13,19 @@ import json
 import time
 import logging
 from dotenv import load_dotenv
-import bcrypt
 from utils.cache import redis_cache
+from auth.token_cache import resolve_token_user
+from auth.passwords import (
+    BCRYPT_ROUNDS, PASSWORD_REHASH_ON_LOGIN, check_password, hash_password,
+    hash_password_async, hash_stats, needs_rehash, verify_password_async,
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Import models from their respective modules to avoid circular imports
 from models.base import Base
-from models.user import User
+from models.user import User, normalize_email
 from models.contact import Contact
 from models.shared_contact import SharedContact
 from models.messages.message import Message
@@ -27,7 +33,8 @@ from models.contact_match import ContactMatch
 from models.contacts.campaign_contact import CampaignContact
 from models.messages.message_template import MessageTemplate
 from models.messages.user_message_template import UserMessageTemplate
-from database import get_db
+from database import get_db, get_async_read_db
+from utils.db_writer import db_writer
 
 load_dotenv()
 
@@ -35,29 +42,6 @@ router = APIRouter(prefix="/api/auth", tags=["auth"])
 # This is just for Swagger UI - the actual URL is handled by FastAPI's routing
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
 
-# --- Add global exception handler for validation errors ---
-from fastapi import APIRouter
-from fastapi.requests import Request as FastAPIRequest
-from fastapi.responses import JSONResponse
-from fastapi.exception_handlers import RequestValidationError
-from fastapi.exceptions import RequestValidationError as FastAPIRequestValidationError
-
-app = None
-try:
-    import main
-    app = main.app
-except Exception:
-    pass
-
-if app is not None:
-    @app.exception_handler(FastAPIRequestValidationError)
-    async def validation_exception_handler(request: FastAPIRequest, exc: FastAPIRequestValidationError):
-        print(f"VALIDATION ERROR: {exc.errors()}")
-        return JSONResponse(
-            status_code=422,
-            content={"detail": exc.errors(), "body": exc.body},
-        )
-
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 # Set token expiration to 30 days (60 minutes * 24 hours * 30 days)
@@ -104,39 +88,14 @@ class Token(BaseModel):
     user: Optional[UserInToken] = None
 
 def get_password_hash(password):
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    """Blocking; async handlers use hash_password_async instead."""
+    return hash_password(password)
 
 def verify_password(plain_password, hashed_password):
-    try:
-        # Add more detailed logging for debugging
-        print(f"Verifying password: length={len(plain_password)}, hash_length={len(hashed_password) if hashed_password else 'None'}, hash_type={type(hashed_password)}")
-        
-        # Ensure we have valid inputs
-        if not plain_password or not hashed_password:
-            print("Missing password or hash")
-            return False
-            
-        # bcrypt.checkpw expects the hashed password as bytes
-        plain_bytes = plain_password.encode('utf-8')
-        
-        # Handle different hash formats
-        if isinstance(hashed_password, str):
-            # Remove any whitespace that might have been introduced
-            hashed_password = hashed_password.strip()
-            hash_bytes = hashed_password.encode('utf-8')
-        else:
-            hash_bytes = hashed_password
-            
-        # Verify the password
-        result = bcrypt.checkpw(plain_bytes, hash_bytes)
-        print(f"Password verification result: {result}")
-        return result
-    except Exception as e:
-        print(f"Password verification error: {e}")
-        return False
+    """Blocking; async handlers use verify_password_async instead."""
+    return check_password(plain_password, hashed_password)
 
-async def get_user(db: Session, email: str):
+async def get_user(db: AsyncSession, email: str):
     """
     Get a user by email from the database with Redis caching.
     
@@ -149,7 +108,7 @@ async def get_user(db: Session, email: str):
     """
     start_time = time.time()
     try:
-        email_lower = email.lower()
+        email_lower = normalize_email(email)
         
         # Try to get from cache first
         cache_key = f"user:email:{email_lower}"
@@ -182,12 +141,9 @@ async def get_user(db: Session, email: str):
         logger.info(f"User cache miss for email: {email_lower}")
         db_query_start = time.time()
         
-        # Try exact match first (indexed query)
-        user = db.query(User).filter(User.email == email_lower).first()
-        
-        # If not found, try case-insensitive search
-        if not user:
-            user = db.query(User).filter(User.email.ilike(f"%{email_lower}%")).first()
+        # Unique index on the normalized email; one indexed probe regardless of case
+        result = await db.execute(select(User).where(User.email_lower == email_lower))
+        user = result.scalars().first()
         
         db_query_time = (time.time() - db_query_start) * 1000
         logger.info(f"Database query for user took {db_query_time:.2f}ms")
@@ -208,10 +164,6 @@ async def get_user(db: Session, email: str):
                 "max_neighbor_messages": user.max_neighbor_messages
             }
             await redis_cache.set(cache_key, json.dumps(user_dict), ex=1800)  # 30 minutes
-            
-            # Also cache by ID for token validation
-            id_cache_key = f"user:id:{user.id}"
-            await redis_cache.set(id_cache_key, json.dumps(user_dict), ex=1800)  # 30 minutes
         
         elapsed = (time.time() - start_time) * 1000
         logger.info(f"User lookup completed in {elapsed:.2f}ms")
@@ -221,7 +173,7 @@ async def get_user(db: Session, email: str):
         logger.error(f"Error in get_user ({elapsed:.2f}ms): {e}")
         return None
 
-async def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """Authenticate a user with Redis caching for performance"""
     start_time = time.time()
     logger.info(f"Authenticating user: {email}")
@@ -232,14 +184,17 @@ async def authenticate_user(db: Session, email: str, password: str):
         logger.warning(f"No user found for email: {email}")
         return False
     
-    # Verify password
+    # Verify password on the hashing pool so the event loop keeps serving
     pw_verify_start = time.time()
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         pw_verify_time = (time.time() - pw_verify_start) * 1000
         logger.warning(f"Password verification failed for user: {email} (took {pw_verify_time:.2f}ms)")
         return False
     
     pw_verify_time = (time.time() - pw_verify_start) * 1000
+
+    if PASSWORD_REHASH_ON_LOGIN and needs_rehash(user.password_hash):
+        await _rehash_password(user, password)
     total_time = (time.time() - start_time) * 1000
     
     # Log performance metrics
@@ -248,8 +203,32 @@ async def authenticate_user(db: Session, email: str, password: str):
     
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Validate JWT token and return current user with Redis caching"""
+def _update_user_columns(conn, user_id: int, values: Dict[str, Any]):
+    """Writer unit: update columns of one users row."""
+    conn.execute(update(User.__table__).where(User.id == user_id).values(**values))
+
+def _insert_user(conn, values: Dict[str, Any]) -> int:
+    """Writer unit: insert a users row and return its id."""
+    return conn.execute(insert(User.__table__).values(**values)).inserted_primary_key[0]
+
+async def _rehash_password(user, password: str):
+    """Replace a hash made with an outdated cost factor, using the password just verified."""
+    try:
+        new_hash = await hash_password_async(password)
+        await db_writer.submit(_update_user_columns, user.id, {"password_hash": new_hash})
+        user.password_hash = new_hash
+        hash_stats["rehashes"] += 1
+        await redis_cache.delete(f"user:email:{user.email_lower}")
+        logger.info(f"Rehashed password for user {user.id} with cost {BCRYPT_ROUNDS}")
+    except Exception as e:
+        logger.error(f"Failed to rehash password for user {user.id}: {e}")
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """
+    Validate JWT token and return current user, using the in-process verified-token cache.
+    A plain function, so FastAPI runs it in the threadpool: a cache miss decodes
+    the token and queries the users table.
+    """
     start_time = time.time()
     
     credentials_exception = HTTPException(
@@ -263,98 +242,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         if token.lower().startswith("bearer "):
             token = token[7:]
         
-        # Try to get from token cache first
-        token_cache_key = f"token:{token[:64]}"  # Use first 64 chars of token as key
-        cached_user_id = await redis_cache.get(token_cache_key)
-        
-        if cached_user_id:
-            # Token is valid, get user from cache
-            user_id = cached_user_id
-            logger.info(f"Token cache hit for user ID: {user_id}")
-            
-            # Try to get user from cache
-            user_cache_key = f"user:id:{user_id}"
-            cached_user = await redis_cache.get(user_cache_key)
-            
-            if cached_user:
-                # User found in cache
-                user_dict = json.loads(cached_user)
-                
-                # Reconstruct User object
-                user = User(
-                    id=user_dict["id"],
-                    email=user_dict["email"],
-                    password_hash=user_dict["password_hash"],
-                    first_name=user_dict.get("first_name"),
-                    last_name=user_dict.get("last_name"),
-                    role=user_dict.get("role", "user"),
-                    city=user_dict.get("city"),
-                    state=user_dict.get("state"),
-                    zip_code=user_dict.get("zip_code"),
-                    has_shared_contacts=user_dict.get("has_shared_contacts"),
-                    max_neighbor_messages=user_dict.get("max_neighbor_messages")
-                )
-                
-                elapsed = (time.time() - start_time) * 1000
-                logger.info(f"Token validation completed from cache in {elapsed:.2f}ms")
-                return user
-        
-        # Not in cache, decode and validate token
-        logger.info("Token cache miss, validating JWT")
-        jwt_start_time = time.time()
-        
-        # Decode the JWT token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], audience="RightImpact-client")
-        user_id = payload.get("sub")
-        if not user_id:
-            logger.warning("No user ID in token")
-            raise credentials_exception
-        
-        jwt_time = (time.time() - jwt_start_time) * 1000
-        logger.info(f"JWT decode took {jwt_time:.2f}ms")
-        
-        # Cache the token->user_id mapping (expires with token)
-        token_exp = payload.get("exp")
-        if token_exp:
-            # Calculate seconds until expiration
-            now = int(time.time())
-            ttl = max(0, token_exp - now)  # Don't use negative TTL
-            await redis_cache.set(token_cache_key, user_id, ex=ttl)
-        
-        # Get user from database by ID
-        db_start_time = time.time()
-        user = db.query(User).filter(User.id == int(user_id)).first()
-        db_time = (time.time() - db_start_time) * 1000
-        
+        user = resolve_token_user(db, token)
         if user is None:
-            logger.warning(f"User not found for ID: {user_id}")
+            logger.warning("User not found for token subject")
             raise credentials_exception
         
-        # Cache the user for future requests
-        user_dict = {
-            "id": user.id,
-            "email": user.email,
-            "password_hash": user.password_hash,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "role": user.role,
-            "city": user.city,
-            "state": user.state,
-            "zip_code": user.zip_code,
-            "has_shared_contacts": user.has_shared_contacts,
-            "max_neighbor_messages": user.max_neighbor_messages
-        }
-        
-        user_cache_key = f"user:id:{user.id}"
-        await redis_cache.set(user_cache_key, json.dumps(user_dict), ex=1800)  # 30 minutes
-        
         elapsed = (time.time() - start_time) * 1000
-        logger.info(f"Token validation completed in {elapsed:.2f}ms (DB: {db_time:.2f}ms)")
+        logger.debug(f"Token validation completed in {elapsed:.2f}ms")
         return user
         
     except JWTError as e:
         logger.error(f"JWT Error: {str(e)}")
         raise credentials_exception
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in get_current_user: {str(e)}")
         raise credentials_exception
@@ -416,7 +317,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         raise
 
 @router.post("/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_read_db)):
     """Register a new user with performance tracking"""
     start_time = time.time()
     logger.info(f"Registration attempt for: {user.email}")
@@ -433,24 +334,26 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     try:
         # Hash password
         hash_start = time.time()
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await hash_password_async(user.password)
         hash_time = (time.time() - hash_start) * 1000
         logger.info(f"Password hashing took {hash_time:.2f}ms")
         
         # Create user object
         db_user = User(
-            email=user.email.lower(),  # Store email in lowercase for consistency
+            email=normalize_email(user.email),  # Store email in lowercase for consistency
             password_hash=hashed_password,
             first_name=user.first_name,
             last_name=user.last_name,
-            role=user.role or "user"
+            role=user.role or "user",
+            has_shared_contacts=False
         )
         
-        # Save to database
+        # Save to database through the shared writer
         db_start = time.time()
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        db_user.id = await db_writer.submit(_insert_user, {
+            column.key: getattr(db_user, column.key)
+            for column in User.__table__.columns if getattr(db_user, column.key) is not None
+        })
         db_time = (time.time() - db_start) * 1000
         logger.info(f"Database operations took {db_time:.2f}ms")
         
@@ -470,11 +373,9 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             "max_neighbor_messages": db_user.max_neighbor_messages
         }
         
-        # Cache by email and ID
-        email_cache_key = f"user:email:{db_user.email.lower()}"
-        id_cache_key = f"user:id:{db_user.id}"
+        # Cache by email for login
+        email_cache_key = f"user:email:{db_user.email_lower}"
         await redis_cache.set(email_cache_key, json.dumps(user_dict), ex=1800)  # 30 minutes
-        await redis_cache.set(id_cache_key, json.dumps(user_dict), ex=1800)  # 30 minutes
         cache_time = (time.time() - cache_start) * 1000
         
         # Create access token
@@ -483,10 +384,6 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
             data={"sub": str(db_user.id)}, expires_delta=access_token_expires
         )
         
-        # Cache the token
-        token_cache_key = f"token:{access_token[:64]}"  # Use first 64 chars of token as key
-        await redis_cache.set(token_cache_key, str(db_user.id), ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
-        
         # Log performance metrics
         total_time = (time.time() - start_time) * 1000
         logger.info(f"User registration successful: {db_user.email} (ID: {db_user.id})")
@@ -507,7 +404,6 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     except Exception as e:
         elapsed = (time.time() - start_time) * 1000
         logger.error(f"Registration error ({elapsed:.2f}ms): {str(e)}")
-        db.rollback()
         raise HTTPException(
             status_code=500,
             detail="Internal server error"
@@ -522,7 +418,7 @@ from fastapi.exceptions import RequestValidationError as FastAPIRequestValidatio
 async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Login endpoint with performance optimizations and Redis caching"""
     start_time = time.time()
@@ -545,8 +441,7 @@ async def login(
             logger.info(f"User has no role, setting default role: user")
             role = 'user'
             user.role = role
-            db.add(user)
-            db.commit()
+            await db_writer.submit(_update_user_columns, user.id, {"role": role})
         
         # Create access token with user ID as sub
         token_start = time.time()
@@ -557,10 +452,6 @@ async def login(
         )
         token_time = (time.time() - token_start) * 1000
         
-        # Cache the token->user_id mapping
-        token_cache_key = f"token:{access_token[:64]}"  # Use first 64 chars of token as key
-        await redis_cache.set(token_cache_key, str(user.id), ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
-        
         # Prepare response
         response = {
             "access_token": access_token, 
@@ -596,12 +487,8 @@ async def login(
         )
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    current_user = await get_current_user(token, db)
-    logger.info(f"[DEBUG] User has_shared_contacts value: {current_user.has_shared_contacts} (type: {type(current_user.has_shared_contacts)})")
+async def read_users_me(current_user: User = Depends(get_current_user)):
+    logger.debug("User %s has_shared_contacts: %r", current_user.id, current_user.has_shared_contacts)
     # Ensure we return a UserResponse, not the raw SQLAlchemy model
     return UserResponse(
         id=current_user.id,
@@ -1,7 +1,6 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from datetime import datetime
+from jose import JWTError, ExpiredSignatureError
 import models
 from database import get_db
 from sqlalchemy.orm import Session
@@ -11,10 +10,11 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from auth.auth import oauth2_scheme
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
-ALGORITHM = "HS256"
+from auth.token_cache import resolve_token_user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# A plain function, so FastAPI runs it in the threadpool: a cache miss
+# decodes the token and queries the users table
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -25,34 +25,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         if token.lower().startswith("bearer "):
             token = token[7:]
             
-        # Decode with audience validation
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], audience="RightImpact-client")
-        sub = payload.get("sub")
-        if sub is None:
-            print("No subject in token")
-            raise credentials_exception
-            
-        # Verify token expiration
-        if datetime.fromtimestamp(payload["exp"]) < datetime.utcnow():
-            print("Token has expired")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has expired",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
-        # Try to find user by ID first (assuming sub is an ID if it's numeric)
-        if sub.isdigit():
-            user = db.query(models.User).filter(models.User.id == int(sub)).first()
-            if user:
-                return user
-                
-        # If not found by ID or sub is not numeric, try by email
-        user = db.query(models.User).filter(models.User.email == sub).first()
+        # Verified tokens are cached in-process, keyed by a hash of the full token
+        user = resolve_token_user(db, token)
         if user is None:
-            print(f"User not found for sub: {sub}")
+            print("User not found for token subject")
             raise credentials_exception
             
+    except ExpiredSignatureError:
+        print("Token has expired")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     except JWTError as e:
         print(f"JWT Error: {str(e)}")
         raise credentials_exception
@@ -0,0 +1,122 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is slow on purpose (100-300 ms per call), so calling it inside an async
+handler stalls every other request. Hashing and verification run on a
+dedicated pool of PASSWORD_HASH_CONCURRENCY workers instead; callers beyond
+that wait in the pool's queue without blocking the loop, and the queue depth
+and wait times are recorded in hash_stats.
+
+With PASSWORD_REHASH_ON_LOGIN enabled, hashes whose cost differs from
+BCRYPT_ROUNDS are replaced on the user's next successful login.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # thread or process
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_REHASH_ON_LOGIN = os.getenv("PASSWORD_REHASH_ON_LOGIN", "false").lower() == "true"
+
+hash_stats = {
+    "hashes": 0, "verifies": 0, "rehashes": 0,
+    "in_flight": 0, "queue_depth": 0, "max_queue_depth": 0,
+    "queue_wait_ms": 0.0, "max_queue_wait_ms": 0.0, "work_ms": 0.0,
+}
+
+_executor: Optional[Executor] = None
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    """Hash a password with bcrypt (blocking)."""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def check_password(plain_password: str, hashed_password) -> bool:
+    """Check a password against a bcrypt hash (blocking). Malformed hashes never match."""
+    if not plain_password or not hashed_password:
+        return False
+    if isinstance(hashed_password, str):
+        # Remove any whitespace that might have been introduced
+        hashed_password = hashed_password.strip().encode('utf-8')
+    try:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password)
+    except ValueError as e:
+        logger.error(f"Password verification error: {e}")
+        return False
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a bcrypt hash was made with a cost other than BCRYPT_ROUNDS."""
+    try:
+        return int(hashed_password.split('$')[2]) != BCRYPT_ROUNDS
+    except (AttributeError, IndexError, ValueError):
+        return False
+
+
+# Run in the pool; they report when they started so queue wait can be measured
+def _timed_hash(password: str, rounds: int) -> Tuple[str, float]:
+    started_at = time.time()
+    return hash_password(password, rounds), started_at
+
+
+def _timed_check(plain_password: str, hashed_password) -> Tuple[bool, float]:
+    started_at = time.time()
+    return check_password(plain_password, hashed_password), started_at
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY)
+        else:
+            # bcrypt releases the GIL while hashing, so threads run in parallel
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_CONCURRENCY, thread_name_prefix="bcrypt")
+        logger.info(f"Password hashing pool: {PASSWORD_HASH_EXECUTOR} x {PASSWORD_HASH_CONCURRENCY}")
+    return _executor
+
+
+async def _run(func, *args):
+    submitted_at = time.time()
+    hash_stats["in_flight"] += 1
+    depth = max(0, hash_stats["in_flight"] - PASSWORD_HASH_CONCURRENCY)
+    hash_stats["queue_depth"] = depth
+    hash_stats["max_queue_depth"] = max(hash_stats["max_queue_depth"], depth)
+    try:
+        result, started_at = await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+    finally:
+        hash_stats["in_flight"] -= 1
+        hash_stats["queue_depth"] = max(0, hash_stats["in_flight"] - PASSWORD_HASH_CONCURRENCY)
+    waited = max(0.0, started_at - submitted_at) * 1000
+    hash_stats["queue_wait_ms"] += waited
+    hash_stats["max_queue_wait_ms"] = max(hash_stats["max_queue_wait_ms"], waited)
+    hash_stats["work_ms"] += (time.time() - started_at) * 1000
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the hashing pool."""
+    hash_stats["hashes"] += 1
+    return await _run(_timed_hash, password, BCRYPT_ROUNDS)
+
+
+async def verify_password_async(plain_password: str, hashed_password) -> bool:
+    """Verify a password on the hashing pool."""
+    hash_stats["verifies"] += 1
+    return await _run(_timed_check, plain_password, hashed_password)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
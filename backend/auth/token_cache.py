@@ -0,0 +1,172 @@
+"""
+In-process cache of verified access tokens.
+
+Entries are keyed by the SHA-256 of the full token and hold the decoded
+claims together with a snapshot of the user's columns, so an authenticated
+request normally needs neither jwt.decode, Redis nor a users query. An entry
+never outlives the token's exp. The user snapshot is re-read from the
+database after USER_SNAPSHOT_TTL seconds, and dropped on every worker as soon
+as invalidate_user() is called for that user.
+"""
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from jose import jwt
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models.user import User, normalize_email
+from utils.cache import redis_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
+ALGORITHM = "HS256"
+AUDIENCE = "RightImpact-client"
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+USER_SNAPSHOT_TTL = int(os.getenv("USER_SNAPSHOT_TTL", "300"))
+
+# Everything a request needs to know about the user; the hash is only for login
+SNAPSHOT_COLUMNS = [column.key for column in User.__table__.columns if column.key != "password_hash"]
+USER_CACHE_PREFIX = "user:id:"
+
+
+class VerifiedToken:
+    __slots__ = ("claims", "expires_at", "user_id", "snapshot", "snapshot_at")
+
+    def __init__(self, claims: Dict[str, Any], user: User):
+        self.claims = claims
+        self.expires_at = claims["exp"]
+        self.user_id = user.id
+        self.refresh(user)
+
+    def refresh(self, user: User):
+        self.snapshot = {key: getattr(user, key) for key in SNAPSHOT_COLUMNS}
+        self.snapshot_at = time.monotonic()
+
+
+class VerifiedTokenCache:
+    """LRU of verified tokens, indexed by user so a user's entries can be dropped together."""
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, VerifiedToken]" = OrderedDict()
+        self._by_user: Dict[int, set] = {}
+        self.stats = {"hits": 0, "misses": 0, "snapshot_refreshes": 0, "evictions": 0, "user_invalidations": 0}
+
+    def get(self, key: str) -> Optional[VerifiedToken]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: VerifiedToken):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._by_user.setdefault(entry.user_id, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def drop_user(self, user_id: int):
+        keys = self._by_user.pop(user_id, ())
+        for key in keys:
+            self._entries.pop(key, None)
+        if keys:
+            self.stats["user_invalidations"] += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry.user_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry.user_id]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _load_user(db: Session, sub) -> Optional[User]:
+    if sub is None:
+        return None
+    sub = str(sub)
+    # sub is the user id; older tokens may carry the email instead
+    if sub.isdigit():
+        user = db.query(User).filter(User.id == int(sub)).first()
+        if user:
+            return user
+    return db.query(User).filter(User.email_lower == normalize_email(sub)).first()
+
+
+def _attach_snapshot(db: Session, snapshot: Dict[str, Any]) -> User:
+    """Turn a snapshot into a User bound to db without querying; other attributes load lazily."""
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def resolve_token_user(db: Session, token: str) -> Optional[User]:
+    """
+    Return the user a bearer token belongs to, or None if that user no longer exists.
+    Raises JWTError (including ExpiredSignatureError) for tokens that fail verification.
+    """
+    key = token_key(token)
+    entry = verified_tokens.get(key)
+    if entry is None:
+        verified_tokens.stats["misses"] += 1
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], audience=AUDIENCE)
+        user = _load_user(db, claims.get("sub"))
+        if user is not None and claims.get("exp"):
+            verified_tokens.put(key, VerifiedToken(claims, user))
+        return user
+
+    verified_tokens.stats["hits"] += 1
+    if time.monotonic() - entry.snapshot_at > USER_SNAPSHOT_TTL:
+        verified_tokens.stats["snapshot_refreshes"] += 1
+        user = db.query(User).filter(User.id == entry.user_id).first()
+        if user is None:
+            verified_tokens.drop_user(entry.user_id)
+            return None
+        entry.refresh(user)
+        return user
+    return _attach_snapshot(db, entry.snapshot)
+
+
+async def invalidate_user(user_id: int, email: Optional[str] = None):
+    """Drop cached copies of a user after it changes, on this and every other worker."""
+    verified_tokens.drop_user(user_id)
+    # Deleting the Redis copy also broadcasts the key to other workers
+    await redis_cache.delete(f"{USER_CACHE_PREFIX}{user_id}")
+    if email:
+        await redis_cache.delete(f"user:email:{normalize_email(email)}")
+
+
+def _on_remote_invalidation(key: str):
+    if key.startswith(USER_CACHE_PREFIX):
+        try:
+            verified_tokens.drop_user(int(key[len(USER_CACHE_PREFIX):]))
+        except ValueError:
+            pass
+
+
+redis_cache.remote_key_hooks.append(_on_remote_invalidation)
@@ -1,7 +1,7 @@
 import re
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, update
 from datetime import datetime
 import logging
 
@@ -10,6 +10,7 @@ from models.targets.target_list import TargetList
 from models.targets.target_contact import TargetContact
 from models.shared_contact import SharedContact
 from models.contact_match import ContactMatch
+from utils.bulk import copy_rows, in_values
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +28,7 @@ def clean_phone_number(phone: Optional[str]) -> Optional[str]:
     if not phone:
         return None
         
-    logger.debug(f"Cleaning phone number: {phone}")
+    logger.debug("Cleaning phone number: %s", phone)
     
     try:
         # Remove all non-digit characters
@@ -41,34 +42,34 @@ def clean_phone_number(phone: Optional[str]) -> Optional[str]:
         # Remove leading 1 (US country code) if present and length is 11
         if len(digits) == 11 and digits[0] == '1':
             digits = digits[1:]
-            logger.debug(f"Removed US country code, remaining: {digits}")
+            logger.debug("Removed US country code, remaining: %s", digits)
         
         # Check if we have exactly 10 digits
         if len(digits) != 10:
-            logger.debug(f"Invalid length: {len(digits)} digits (expected 10)")
+            logger.debug("Invalid length: %d digits (expected 10)", len(digits))
             return None
             
-        logger.debug(f"Cleaned phone number: {digits}")
+        logger.debug("Cleaned phone number: %s", digits)
         return digits
         
     except Exception as e:
-        logger.error(f"Error cleaning phone number '{phone}': {str(e)}")
+        logger.error("Error cleaning phone number '%s': %s", phone, e)
         return None
 
 def get_shared_contact_phones(shared_contact: Any) -> List[str]:
     """Get all valid phone numbers from a shared contact"""
-    logger.info(f"Getting phone numbers for shared contact ID {shared_contact.id}")
+    logger.debug("Getting phone numbers for shared contact ID %s", shared_contact.id)
     
     phones = []
     
     def process_phone(phone: Optional[str], field_name: str) -> Optional[str]:
         if not phone:
-            logger.debug(f"  {field_name}: No phone number")
+            logger.debug("  %s: No phone number", field_name)
             return None
             
-        logger.debug(f"  {field_name} (raw): {phone}")
+        logger.debug("  %s (raw): %s", field_name, phone)
         cleaned = clean_phone_number(phone)
-        logger.debug(f"  {field_name} (cleaned): {cleaned}")
+        logger.debug("  %s (cleaned): %s", field_name, cleaned)
         return cleaned
     
     # Process each phone number field
@@ -79,7 +80,7 @@ def get_shared_contact_phones(shared_contact: Any) -> List[str]:
     if phone := process_phone(shared_contact.mobile3, "mobile3"):
         phones.append(phone)
     
-    logger.info(f"Found {len(phones)} valid phone numbers for shared contact {shared_contact.id}")
+    logger.debug("Found %d valid phone numbers for shared contact %s", len(phones), shared_contact.id)
     return phones
 
 def find_phone_matches(db: Session, phone_numbers: List[str], target_list_id: int) -> List[Dict[str, Any]]:
@@ -90,42 +91,25 @@ def find_phone_matches(db: Session, phone_numbers: List[str], target_list_id: in
     if not phone_numbers:
         return []
         
-    logger.info(f"Searching for phone matches in list {target_list_id} for numbers: {phone_numbers}")
+    logger.debug("Searching for phone matches in list %s for numbers: %s", target_list_id, phone_numbers)
     
-    # Build OR conditions for each phone number in each phone field
-    conditions = []
-    for phone in phone_numbers:
-        # Check all possible phone number fields with the correct field names
-        phone_conditions = [
-            # Cell phone fields
-            TargetContact.cell_1 == phone,
-            TargetContact.cell_2 == phone,
-            TargetContact.cell_3 == phone,
-            # Landline fields
-            TargetContact.landline_1 == phone,
-            TargetContact.landline_2 == phone,
-            TargetContact.landline_3 == phone,
-            # Also check for phone numbers with country code
-            TargetContact.cell_1 == f'1{phone}',
-            TargetContact.cell_2 == f'1{phone}',
-            TargetContact.cell_3 == f'1{phone}',
-            TargetContact.landline_1 == f'1{phone}',
-            TargetContact.landline_2 == f'1{phone}',
-            TargetContact.landline_3 == f'1{phone}'
-        ]
-        
-        # Add all conditions with OR between them
-        conditions.append(or_(*phone_conditions))
+    # Each number, with and without the country code
+    variants = [number for phone in phone_numbers for number in (phone, f'1{phone}')]
     
-    # Create the query with list_id filter and all phone conditions
-    query = (
-        db.query(TargetContact)
-        .filter(TargetContact.list_id == target_list_id)
-        .filter(or_(*conditions))
-    )
+    # One (list_id, phone column) term per phone field, so each is a seek on
+    # that column's (list_id, column) index and the database unions the results
+    phone_columns = [
+        TargetContact.cell_1, TargetContact.cell_2, TargetContact.cell_3,
+        TargetContact.landline_1, TargetContact.landline_2, TargetContact.landline_3,
+    ]
+    query = db.query(TargetContact).filter(or_(*[
+        and_(TargetContact.list_id == target_list_id, column.in_(variants))
+        for column in phone_columns
+    ]))
     
-    # Log the SQL query for debugging
-    logger.info(f"SQL Query: {str(query.statement.compile(compile_kwargs={"literal_binds": True}))}")
+    # Rendering the SQL with its values is expensive; only when someone is reading it
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("SQL Query: %s", query.statement.compile(compile_kwargs={"literal_binds": True}))
     
     # Execute the query and convert to dictionaries immediately
     matches = []
@@ -150,14 +134,14 @@ def find_phone_matches(db: Session, phone_numbers: List[str], target_list_id: in
             }
             matches.append(match_dict)
             
-            logger.info(f"Match: ID={contact.id}, VoterID={contact.voter_id}, "
-                      f"Cells: {contact.cell_1}, {contact.cell_2}, {contact.cell_3}, "
-                      f"Landlines: {contact.landline_1}, {contact.landline_2}, {contact.landline_3}")
+            logger.debug("Match: ID=%s, VoterID=%s, Cells: %s, %s, %s, Landlines: %s, %s, %s",
+                         contact.id, contact.voter_id, contact.cell_1, contact.cell_2, contact.cell_3,
+                         contact.landline_1, contact.landline_2, contact.landline_3)
         except Exception as e:
-            logger.error(f"Error processing contact {getattr(contact, 'id', 'unknown')}: {str(e)}")
+            logger.error("Error processing contact %s: %s", getattr(contact, 'id', 'unknown'), e)
             continue
     
-    logger.info(f"Found {len(matches)} potential matches in list {target_list_id}")
+    logger.debug("Found %d potential matches in list %s", len(matches), target_list_id)
     return matches
 
 def disambiguate_by_name(contacts: List[Dict[str, Any]], first_name: str, last_name: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -168,7 +152,7 @@ def disambiguate_by_name(contacts: List[Dict[str, Any]], first_name: str, last_n
     if not contacts or len(contacts) <= 1:
         return contacts
         
-    logger.info(f"Disambiguating {len(contacts)} contacts by name. First: '{first_name}', Last: '{last_name}'")
+    logger.debug("Disambiguating %d contacts by name. First: '%s', Last: '%s'", len(contacts), first_name, last_name)
     
     # Normalize the search names
     search_first = (first_name or '').lower().strip()
@@ -176,7 +160,7 @@ def disambiguate_by_name(contacts: List[Dict[str, Any]], first_name: str, last_n
     
     # If we don't have at least a first name to match on, return all
     if not search_first:
-        logger.info("No first name provided for disambiguation, returning all matches")
+        logger.debug("No first name provided for disambiguation, returning all matches")
         return contacts
     
     # First, try to find exact matches on both first and last name
@@ -187,7 +171,7 @@ def disambiguate_by_name(contacts: List[Dict[str, Any]], first_name: str, last_n
             and (c.get('last_name', '') or '').lower() == search_last
         ]
         if exact_matches:
-            logger.info(f"Found {len(exact_matches)} exact name matches")
+            logger.debug("Found %d exact name matches", len(exact_matches))
             return exact_matches
     
     # Then try just first name matches
@@ -197,11 +181,11 @@ def disambiguate_by_name(contacts: List[Dict[str, Any]], first_name: str, last_n
     ]
     
     if first_name_matches:
-        logger.info(f"Found {len(first_name_matches)} first name matches")
+        logger.debug("Found %d first name matches", len(first_name_matches))
         return first_name_matches
     
     # If no matches found, return the original list
-    logger.info("No name matches found, returning original list")
+    logger.debug("No name matches found, returning original list")
     return contacts
 
 def match_contact_to_lists(db: Session, shared_contact_id: int, target_list_id: Optional[int] = None):
@@ -215,10 +199,10 @@ def match_contact_to_lists(db: Session, shared_contact_id: int, target_list_id:
                       If None, matches against all target lists.
         
     Returns:
-        List of ContactMatch objects created
+        List of the contact_matches rows created, as dicts
     """
-    logger.info(f"Starting match process for shared contact {shared_contact_id} "
-                f"against target list {target_list_id or 'all'}")
+    logger.debug("Starting match process for shared contact %s against target list %s",
+                 shared_contact_id, target_list_id or 'all')
     
     try:
         # Start a new transaction
@@ -226,16 +210,16 @@ def match_contact_to_lists(db: Session, shared_contact_id: int, target_list_id:
             # Get the shared contact with a fresh query in the new transaction
             shared_contact = db.query(SharedContact).get(shared_contact_id)
             if not shared_contact:
-                logger.error(f"Shared contact {shared_contact_id} not found")
+                logger.error("Shared contact %s not found", shared_contact_id)
                 return []
             
             # Get all phone numbers for the shared contact
             shared_phones = get_shared_contact_phones(shared_contact)
             if not shared_phones:
-                logger.info(f"No valid phone numbers found for shared contact {shared_contact_id}")
+                logger.debug("No valid phone numbers found for shared contact %s", shared_contact_id)
                 return []
             
-            logger.info(f"Found {len(shared_phones)} phone numbers for shared contact {shared_contact_id}: {shared_phones}")
+            logger.debug("Found %d phone numbers for shared contact %s: %s", len(shared_phones), shared_contact_id, shared_phones)
             
             # Get target lists to check
             target_lists_query = db.query(TargetList)
@@ -245,68 +229,61 @@ def match_contact_to_lists(db: Session, shared_contact_id: int, target_list_id:
             target_lists = target_lists_query.all()
             
             if not target_lists:
-                list_msg = f"target list {target_list_id}" if target_list_id else "any target lists"
-                logger.info(f"No {list_msg} found")
+                logger.info("No %s found", f"target list {target_list_id}" if target_list_id else "any target lists")
                 return []
             
-            logger.info(f"Found {len(target_lists)} target lists to check")
+            logger.debug("Found %d target lists to check", len(target_lists))
             
             matches = []
             
             for target_list in target_lists:
-                logger.info(f"Checking target list ID {target_list.id} - {target_list.name}")
+                logger.debug("Checking target list ID %s - %s", target_list.id, target_list.name)
                 
                 # Find all target contacts in this list that match any of the shared contact's phone numbers
                 matched_contacts = find_phone_matches(db, shared_phones, target_list.id)
-                logger.info(f"Found {len(matched_contacts)} potential matches in list {target_list.id}")
+                logger.debug("Found %d potential matches in list %s", len(matched_contacts), target_list.id)
                 
                 # If multiple matches, try to disambiguate by name
                 if len(matched_contacts) > 1:
-                    logger.info("Multiple matches found, attempting to disambiguate by name")
+                    logger.debug("Multiple matches found, attempting to disambiguate by name")
                     matched_contacts = disambiguate_by_name(
                         matched_contacts, 
                         shared_contact.first_name,
                         shared_contact.last_name
                     )
-                    logger.info(f"After disambiguation, {len(matched_contacts)} matches remain")
+                    logger.debug("After disambiguation, %d matches remain", len(matched_contacts))
                 
                 # If we have a single match, create a ContactMatch record
                 if len(matched_contacts) == 1:
                     target_contact_data = matched_contacts[0]
-                    logger.info(f"Creating match with target contact ID {target_contact_data['id']} in list {target_list.id}")
-                    
-                    # Get the target contact from the database to update it
-                    target_contact = db.query(TargetContact).get(target_contact_data['id'])
-                    if not target_contact:
-                        logger.error(f"Target contact {target_contact_data['id']} not found in database")
-                        continue
+                    logger.debug("Creating match with target contact ID %s in list %s", target_contact_data['id'], target_list.id)
                     
-                    match = ContactMatch(
-                        shared_contact_id=shared_contact_id,
-                        target_contact_id=target_contact.id,
-                        target_list_id=target_list.id,
-                        match_confidence='high' if len(shared_phones) == 1 else 'medium',
-                        created_at=datetime.utcnow()
-                    )
-                    matches.append(match)
-                    
-                    # Update the target contact's match status
-                    target_contact.is_matched = True
-                    target_contact.match_confidence = 'high' if len(shared_phones) == 1 else 'medium'
-                    target_contact.match_score = 1.0 if len(shared_phones) == 1 else 0.8
-                    
-                    # Explicitly add the target contact to the session
-                    db.add(target_contact)
-                    
-                    logger.info(f"Successfully matched shared contact {shared_contact_id} to target contact {target_contact.id}")
+                    matches.append({
+                        "shared_contact_id": shared_contact_id,
+                        "target_contact_id": target_contact_data['id'],
+                        "target_list_id": target_list.id,
+                        "match_confidence": 'high' if len(shared_phones) == 1 else 'medium',
+                        "created_at": datetime.utcnow(),
+                    })
             
-            # Save all matches and update status
+            # Save all matches and update status; the match rows and the target
+            # contacts' flags are each written with one bulk statement
             if matches:
                 try:
-                    db.add_all(matches)
+                    copy_rows(db, ContactMatch.__table__, matches)
+                    db.execute(
+                        update(TargetContact)
+                        .where(in_values(db, TargetContact.id, [m["target_contact_id"] for m in matches]))
+                        .values(
+                            is_matched=True,
+                            match_confidence='high' if len(shared_phones) == 1 else 'medium',
+                            match_score=1.0 if len(shared_phones) == 1 else 0.8,
+                        ),
+                        execution_options={"synchronize_session": False},
+                    )
                     shared_contact.matched = True
                     db.add(shared_contact)
-                    logger.info(f"Successfully saved {len(matches)} matches for shared contact {shared_contact_id}")
+                    logger.debug("Saved %d matches for shared contact %s", len(matches), shared_contact_id)
                     return matches
                 except Exception as e:
                     logger.error(f"Error saving matches: {str(e)}")
@@ -346,13 +323,13 @@ def match_new_shared_contacts(db: Session, shared_contact_ids: List[int], list_i
     if list_ids:
         for contact_id in shared_contact_ids:
             try:
-                logger.info(f"Matching shared contact ID: {contact_id}")
+                logger.debug("Matching shared contact ID: %s", contact_id)
                 list_matches = 0
                 
                 # Match against each specified list
                 for list_id in list_ids:
                     try:
-                        logger.debug(f"Matching contact {contact_id} against list {list_id}")
+                        logger.debug("Matching contact %s against list %s", contact_id, list_id)
                         matches = match_contact_to_lists(db, contact_id, list_id)
                         list_matches += len(matches)
                     except Exception as e:
@@ -363,7 +340,7 @@ def match_new_shared_contacts(db: Session, shared_contact_ids: List[int], list_i
                 
                 match_count += list_matches
                 processed_contacts += 1
-                logger.info(f"Matched shared contact {contact_id}: {list_matches} matches found across {len(list_ids)} lists")
+                logger.debug("Matched shared contact %s: %d matches found across %d lists", contact_id, list_matches, len(list_ids))
                 
             except Exception as e:
                 error_msg = f"Error processing shared contact {contact_id}: {str(e)}"
@@ -374,11 +351,11 @@ def match_new_shared_contacts(db: Session, shared_contact_ids: List[int], list_i
         # Original behavior - match against all lists
         for contact_id in shared_contact_ids:
             try:
-                logger.info(f"Processing shared contact ID: {contact_id}")
+                logger.debug("Processing shared contact ID: %s", contact_id)
                 matches = match_contact_to_lists(db, contact_id)
                 match_count += len(matches)
                 processed_contacts += 1
-                logger.info(f"Processed shared contact {contact_id}: {len(matches)} matches found")
+                logger.debug("Processed shared contact %s: %d matches found", contact_id, len(matches))
             except Exception as e:
                 error_msg = f"Error processing shared contact {contact_id}: {str(e)}"
                 logger.error(error_msg)
@@ -451,12 +428,12 @@ def match_new_target_list(db: Session, target_list_id: int):
             
             for contact in shared_contacts:
                 try:
-                    logger.info(f"Matching shared contact ID: {contact.id} against target list {target_list_id}")
+                    logger.debug("Matching shared contact ID: %s against target list %s", contact.id, target_list_id)
                     # Only match against the specified target list
                     matches = match_contact_to_lists(db, contact.id, target_list_id)
                     match_count += len(matches)
                     processed_contacts += 1
-                    logger.info(f"Matched shared contact {contact.id}: {len(matches)} matches found")
+                    logger.debug("Matched shared contact %s: %d matches found", contact.id, len(matches))
                 except Exception as e:
                     error_msg = f"Error matching shared contact {contact.id}: {str(e)}"
                     logger.error(error_msg)
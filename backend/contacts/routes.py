@@ -1,7 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional
-from database import get_db
+from database import get_db, get_async_db
 from auth.auth import get_current_user, get_admin_user
 from models.user import User
 from models.contact import Contact
@@ -10,10 +11,11 @@ from models.contact_match import ContactMatch
 from models.targets.target_list import TargetList
 from models.targets.target_contact import TargetContact
 from models.messages.message import Message
+from models.identification.id_answer import IdAnswer
 from sqlalchemy import Table, Column, Integer, String, DateTime, ForeignKey, MetaData
 import models
 from pydantic import BaseModel, Field
-from sqlalchemy import or_, and_, func
+from sqlalchemy import or_, and_, func, select, update
 from datetime import datetime, timedelta
 from . import matching
 from .contacts import (
@@ -239,38 +241,66 @@ class SharedContactCreateSchema(BaseModel):
 class ShareContactsRequest(BaseModel):
     contacts: List[SharedContactCreateSchema]
 
+def _save_shared_contacts(conn, user_id: int, rows: List[Dict], mark_shared: bool):
+    """
+    Writer unit: insert shared contacts that the user has not already shared.
+
+    A contact is a duplicate when the same user shared the same name with all
+    of its mobile numbers before. Returns (created count, whether the user's
+    has_shared_contacts flag was set by this call).
+    """
+    created_count = 0
+    for row in rows:
+        query = select(SharedContact.id).where(
+            SharedContact.user_id == user_id,
+            SharedContact.first_name == row["first_name"],
+            SharedContact.last_name == (row["last_name"] or ''),
+            *[
+                or_(SharedContact.mobile1 == number, SharedContact.mobile2 == number, SharedContact.mobile3 == number)
+                for number in (row["mobile1"], row["mobile2"], row["mobile3"]) if number
+            ]
+        )
+        if conn.execute(query.limit(1)).first():
+            logger.debug("Duplicate shared contact skipped: %s %s (%s)", row['first_name'], row['last_name'], row['mobile1'])
+            continue
+        conn.execute(SharedContact.__table__.insert().values(**row))
+        created_count += 1
+
+    # Sharing counts even when every contact was a duplicate
+    flag_set = False
+    if rows and mark_shared:
+        flag_set = conn.execute(
+            update(User.__table__)
+            .where(User.id == user_id, User.has_shared_contacts.is_(False))
+            .values(has_shared_contacts=True)
+        ).rowcount == 1
+    return created_count, flag_set
+
 @router.post("/share", tags=["contacts"])
 async def share_contacts_route(
     request: Request,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Get raw request body and print it for debugging
-    body_bytes = await request.body()
-    body_str = body_bytes.decode()
-    
     # Parse the JSON data
     try:
         data = await request.json()
         if 'contacts' not in data or not isinstance(data['contacts'], list):
             raise HTTPException(status_code=400, detail="No contacts provided in request")
             
-        print(f"Processing {len(data['contacts'])} contacts from user {current_user.id}")
+        logger.info("Processing %d contacts from user %s", len(data['contacts']), current_user.id)
         
     except Exception as e:
-        print(f"Error parsing request data: {e}")
+        logger.warning("Error parsing request data: %s", e)
         raise HTTPException(status_code=400, detail="Invalid request data")
     
     try:
         request_data = ShareContactsRequest(**data)
     except Exception as e:
-        print(f"Validation error: {e}")
+        logger.warning("Validation error: %s", e)
         raise HTTPException(status_code=400, detail=f"Invalid request format: {e}")
     
-    created_count = 0
-    print(f"Received {len(request_data.contacts)} contacts to share")
+    rows = []
     
-    any_contacts_processed = False
     for i, contact_data in enumerate(request_data.contacts):
         # Get the raw contact data for processing
         raw_contact = next((c for c in data['contacts'] 
@@ -278,7 +308,7 @@ async def share_contacts_route(
                           and c.get('lastName') == contact_data.lastName), None)
         # Skip if both first and last names are blank
         if not contact_data.firstName.strip() and (not contact_data.lastName or not contact_data.lastName.strip()):
-            print(f"Skipping contact with no name")
+            logger.debug("Skipping contact with no name")
             continue
             
         # Extract and clean up to 3 mobile numbers
@@ -315,7 +345,7 @@ async def share_contacts_route(
         
         # Skip if no valid phone numbers
         if not mobiles:
-            print(f"Skipping {contact_data.firstName} {contact_data.lastName} - no valid US phone numbers")
+            logger.debug("Skipping %s %s - no valid US phone numbers", contact_data.firstName, contact_data.lastName)
             continue
             
         mobile1 = mobiles[0] if len(mobiles) > 0 else None
@@ -334,45 +364,6 @@ async def share_contacts_route(
         elif hasattr(addr, 'zip') and addr.zip:
             zip_code = addr.zip
 
-        # Build a base query with the required conditions
-        query = db.query(SharedContact).filter(
-            SharedContact.user_id == current_user.id,
-            SharedContact.first_name == contact_data.firstName,
-            SharedContact.last_name == (contact_data.lastName or ''),
-            or_(
-                SharedContact.mobile1 == mobile1,
-                SharedContact.mobile2 == mobile1,
-                SharedContact.mobile3 == mobile1
-            ) if mobile1 else False
-        )
-        
-        # Add optional conditions for other fields if they exist
-        if mobile2:
-            query = query.filter(or_(
-                SharedContact.mobile1 == mobile2,
-                SharedContact.mobile2 == mobile2,
-                SharedContact.mobile3 == mobile2
-            ))
-        if mobile3:
-            query = query.filter(or_(
-                SharedContact.mobile1 == mobile3,
-                SharedContact.mobile2 == mobile3,
-                SharedContact.mobile3 == mobile3
-            ))
-            
-        # Check for duplicates
-        duplicate = query.first()
-        
-        if duplicate:
-            print(f"\n=== DUPLICATE DETECTED ===")
-            print(f"Existing: {duplicate.first_name} {duplicate.last_name}")
-            print(f"Existing phones: {duplicate.mobile1}, {duplicate.mobile2}, {duplicate.mobile3}")
-            print(f"New: {contact_data.firstName} {contact_data.lastName}")
-            print(f"New phones: {mobile1}, {mobile2}, {mobile3}")
-            print(f"Skipping insert.\n")
-            any_contacts_processed = True  # User attempted to share, even if duplicate
-            continue
-
         # Get the company from the contact data
         company = getattr(contact_data, 'company', None)
         
@@ -383,45 +374,40 @@ async def share_contacts_route(
         # Ensure company is properly set (convert empty string to None)
         company = company if company else None
         
-        # Create the contact with all fields
-        db_shared_contact = SharedContact(
-            user_id=current_user.id,
-            first_name=contact_data.firstName,
-            last_name=contact_data.lastName,
-            company=company,  # This will be None if empty/None
-            mobile1=mobile1,
-            mobile2=mobile2 if mobile2 else None,
-            mobile3=mobile3 if mobile3 else None,
-            email=contact_data.email if contact_data.email else None,
-            address=address if address else None,
-            city=city if city else None,
-            state=state if state else None,
-            zip=zip_code if zip_code else None
-        )
-        db.add(db_shared_contact)
-        created_count += 1
-        any_contacts_processed = True
-        print(f"Saving shared contact: {contact_data.firstName} {contact_data.lastName} for user {current_user.id}")
-    
-    # Commit all the new contacts at once
+        # Duplicates are detected by the writer unit, against committed rows
+        rows.append({
+            "user_id": current_user.id,
+            "first_name": contact_data.firstName,
+            "last_name": contact_data.lastName,
+            "company": company,  # This will be None if empty/None
+            "mobile1": mobile1,
+            "mobile2": mobile2 if mobile2 else None,
+            "mobile3": mobile3 if mobile3 else None,
+            "email": contact_data.email if contact_data.email else None,
+            "address": address if address else None,
+            "city": city if city else None,
+            "state": state if state else None,
+            "zip": zip_code if zip_code else None
+        })
+
+    # All new contacts are written in one unit on the shared writer
     try:
-        db.commit()
-        print(f"Successfully saved {created_count} contacts to the database")
+        created_count, flag_set = await db_writer.submit(
+            _save_shared_contacts, current_user.id, rows, not current_user.has_shared_contacts
+        )
+        logger.info("Saved %d shared contacts for user %s", created_count, current_user.id)
     except Exception as e:
-        db.rollback()
-        print(f"Error saving contacts: {e}")
+        logger.error("Error saving contacts: %s", e)
         raise HTTPException(status_code=500, detail=f"Error saving contacts: {str(e)}")
 
-    # Set has_shared_contacts = True if any contacts were processed (shared or duplicate)
-    if any_contacts_processed and not current_user.has_shared_contacts:
-        current_user.has_shared_contacts = True
-        try:
-            db.commit()
-            print(f"Set has_shared_contacts = True for user {current_user.id}")
-        except Exception as e:
-            db.rollback()
-            print(f"Error updating has_shared_contacts: {e}")
-            # Don't raise error, as sharing itself succeeded
+    if created_count:
+        await invalidate_tag('shared_contacts')
+
+    if flag_set:
+        logger.info("Set has_shared_contacts = True for user %s", current_user.id)
+        # The users list shows this flag
+        await invalidate_user(current_user.id)
+        await invalidate_tag('users')
 
     return {"message": f"{created_count} contacts shared and saved successfully."}
 
@@ -430,44 +416,40 @@ async def share_contacts_route(
 async def deduplicate_shared_contacts(db: Session = Depends(get_db), current_user: User = Depends(get_admin_user)):
     """
     Remove duplicate shared contacts for each user (same first_name, last_name, phone_number, email, address). Keeps only the newest (by created_at).
+    Answers recorded about a duplicate move to the contact that is kept.
     """
-    from sqlalchemy import func
     total_deleted = 0
+    # phone_number is mobile1; missing values count as equal
+    fields = (SharedContact.first_name, SharedContact.last_name, SharedContact.mobile1, SharedContact.email, SharedContact.address)
     users = db.query(User.id).all()
     for (user_id,) in users:
         subq = (
-            db.query(
-                SharedContact.first_name,
-                SharedContact.last_name,
-                SharedContact.phone_number,
-                SharedContact.email,
-                SharedContact.address,
-                func.max(SharedContact.created_at).label("max_created_at")
-            )
+            db.query(*fields, func.max(SharedContact.created_at).label("max_created_at"))
             .filter(SharedContact.user_id == user_id)
-            .group_by(
-                SharedContact.first_name,
-                SharedContact.last_name,
-                SharedContact.phone_number,
-                SharedContact.email,
-                SharedContact.address
-            )
+            .group_by(*fields)
             .subquery()
         )
+        same_contact = and_(*(field.is_not_distinct_from(subq.c[field.key]) for field in fields))
+        # The newest contact of each group is kept
+        kept = {
+            tuple(row[1:]): row[0]
+            for row in db.query(SharedContact.id, *fields)
+                .join(subq, same_contact & (SharedContact.created_at == subq.c.max_created_at))
+                .filter(SharedContact.user_id == user_id)
+        }
         # Find all duplicates except the newest
         dups = db.query(SharedContact).join(
-            subq,
-            (SharedContact.first_name == subq.c.first_name) &
-            (SharedContact.last_name == subq.c.last_name) &
-            (SharedContact.phone_number == subq.c.phone_number) &
-            (SharedContact.email == subq.c.email) &
-            (SharedContact.address == subq.c.address) &
-            (SharedContact.created_at < subq.c.max_created_at)
+            subq, same_contact & (SharedContact.created_at < subq.c.max_created_at)
         ).filter(SharedContact.user_id == user_id).all()
         for dup in dups:
+            kept_id = kept[tuple(getattr(dup, field.key) for field in fields)]
+            db.query(IdAnswer).filter(IdAnswer.shared_contact_id == dup.id)\
+                .update({IdAnswer.shared_contact_id: kept_id}, synchronize_session=False)
             db.delete(dup)
             total_deleted += 1
     db.commit()
+    if total_deleted:
+        await invalidate_tag('shared_contacts')
     return {"message": f"Deduplication complete. {total_deleted} duplicate shared contacts deleted."}
 
 # Pydantic model for shared contact response
@@ -502,49 +484,30 @@ class SharedContactsPageResponse(BaseModel):
 import json
 import time
 import logging
-from utils.cache import redis_cache
+from database import AsyncReadSessionLocal
+from utils.cache import get_or_set, invalidate_tag, refresh
+from utils.warmup import register_warmup
+from utils.db_writer import db_writer
+from auth.token_cache import invalidate_user
 
 logger = logging.getLogger(__name__)
 
-@router.get("/shared", response_model=SharedContactsPageResponse, tags=["contacts"])
-async def get_shared_contacts(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user),
-    search: Optional[str] = Query(None, description="Search term for name, email, or phone"),
-    user_id: Optional[int] = Query(None, description="Filter by user ID"),
-    match_status: Optional[str] = Query(None, description="Filter by match status: 'matched' or 'unmatched'"),
-    sort_by: Optional[str] = Query('created_at', description="Field to sort by"),
-    sort_order: str = Query('desc', description="Sort order (asc or desc)"),
-    skip: int = 0,
-    limit: int = 100
-):
-    """Get all shared contacts (admin only) with Redis caching for performance"""
-    start_time = time.time()
-    
-    # Enforce a hard maximum limit to prevent excessive queries
-    if limit > 1000:
-        raise HTTPException(status_code=400, detail="Maximum limit is 1000. Please use pagination.")
-    
-    # Default to a reasonable page size if not specified
-    if limit <= 0:
-        limit = 500
-    
-    # Generate cache key based on query parameters
-    cache_key = f"shared_contacts:search={search or ''}:user_id={user_id or 'all'}:match_status={match_status or 'all'}:sort_by={sort_by}:sort_order={sort_order}:skip={skip}:limit={limit}:admin={current_user.id}"
-    
-    # Try to get from cache first
-    cached_result = await redis_cache.get(cache_key)
-    if cached_result:
-        logger.info(f"Cache hit for shared contacts: {cache_key}")
-        elapsed = (time.time() - start_time) * 1000
-        logger.info(f"Shared contacts retrieved from cache in {elapsed:.2f}ms")
-        return json.loads(cached_result)
-    
-    logger.info(f"Cache miss for shared contacts: {cache_key}")
+SHARED_CONTACTS_CACHE_TTL = 60
+# Pages embed the sharing user's name and email
+SHARED_CONTACTS_CACHE_TAGS = ['shared_contacts', 'users']
+# (skip, limit) of the first pages requested by the admin screen and the mobile app
+SHARED_CONTACTS_WARM_PAGES = [(0, 10), (0, 100)]
+
+def shared_contacts_cache_key(search, user_id, match_status, sort_by, sort_order, skip, limit) -> str:
+    # Same for every admin, so one warm entry serves them all
+    return f"shared_contacts:search={search or ''}:user_id={user_id or 'all'}:match_status={match_status or 'all'}:sort_by={sort_by}:sort_order={sort_order}:skip={skip}:limit={limit}"
+
+async def load_shared_contacts_page(db: AsyncSession, search, user_id, match_status, sort_by, sort_order, skip, limit):
+    """One page of shared contacts with match data, in the cached form of GET /shared."""
     query_start = time.time()
-    
+
     # Use a more efficient query with select_from to ensure proper join ordering
-    query = db.query(
+    query = select(
         SharedContact,
         User.first_name.label('user_first_name'),
         User.last_name.label('user_last_name'),
@@ -552,28 +515,25 @@ async def get_shared_contacts(
     ).select_from(SharedContact).join(
         User, SharedContact.user_id == User.id
     )
-    
+
     # Apply user filter if provided
     if user_id is not None and user_id != 'all':
         try:
             user_id_int = int(user_id)
             logger.debug(f"Filtering by user_id: {user_id_int}")
-            query = query.filter(SharedContact.user_id == user_id_int)
+            query = query.where(SharedContact.user_id == user_id_int)
         except (ValueError, TypeError) as e:
             logger.warning(f"Invalid user_id provided: {user_id}")
             return {"contacts": [], "total": 0}
-    
-    # Log the final query
-    logger.debug(f"Final query: {str(query.statement.compile(compile_kwargs={"literal_binds": True}))}")
-    
+
     # Apply match status filter if provided
     if match_status == 'matched':
         # Filter for contacts that have at least one match
-        query = query.filter(SharedContact.matches.any())
+        query = query.where(SharedContact.matches.any())
     elif match_status == 'unmatched':
         # Filter for contacts that have no matches
-        query = query.filter(~SharedContact.matches.any())
-    
+        query = query.where(~SharedContact.matches.any())
+
     # Apply search filter if provided
     if search:
         search_term = f"%{search.lower()}%"
@@ -590,7 +550,7 @@ async def get_shared_contacts(
             User.last_name.ilike(search_term),
             User.email.ilike(search_term)
         ]
-        
+
         # Also check if the search term matches any part of the address
         if any(term in search.lower() for term in ['street', 'st', 'ave', 'avenue', 'blvd', 'road', 'rd']):
             search_conditions.extend([
@@ -599,14 +559,14 @@ async def get_shared_contacts(
                 SharedContact.state.ilike(search_term),
                 SharedContact.zip.ilike(search_term)
             ])
-        
+
         # Apply the combined search conditions
-        query = query.filter(or_(*search_conditions))
-    
+        query = query.where(or_(*search_conditions))
+
     # Handle sorting
     sort_field = None
     sort_model = SharedContact  # Default to SharedContact model
-    
+
     # Map sort fields to their corresponding model and column
     sort_mapping = {
         'id': (SharedContact, 'id'),
@@ -618,11 +578,11 @@ async def get_shared_contacts(
         'user_name': (User, 'last_name'),  # Sort by last name when sorting by user_name
         'user_email': (User, 'email')
     }
-    
+
     # Get the correct model and field for sorting
     sort_model, sort_field_name = sort_mapping.get(sort_by, (SharedContact, 'created_at'))
     sort_field = getattr(sort_model, sort_field_name, None)
-    
+
     # Apply sorting
     if sort_field is not None:
         if sort_order.lower() == 'asc':
@@ -632,31 +592,31 @@ async def get_shared_contacts(
     else:
         # Default to created_at desc if sort field is invalid
         query = query.order_by(SharedContact.created_at.desc())
-    
+
     # Create a count query that mirrors the main query's joins and filters
-    count_query = db.query(func.count(SharedContact.id))
-    
+    count_query = select(func.count(SharedContact.id))
+
     # Apply the same join as the main query
     count_query = count_query.select_from(SharedContact).join(
         User, SharedContact.user_id == User.id
     )
-    
+
     # Apply user filter to count query if provided
     if user_id is not None and user_id != 'all':
         try:
             user_id_int = int(user_id)
             logger.debug(f"Filtering count by user_id: {user_id_int}")
-            count_query = count_query.filter(SharedContact.user_id == user_id_int)
+            count_query = count_query.where(SharedContact.user_id == user_id_int)
         except (ValueError, TypeError) as e:
             logger.warning(f"Invalid user_id in count query: {user_id}")
             return 0
-    
+
     # Apply match status filter to count query if provided
     if match_status == 'matched':
-        count_query = count_query.filter(SharedContact.matches.any())
+        count_query = count_query.where(SharedContact.matches.any())
     elif match_status == 'unmatched':
-        count_query = count_query.filter(~SharedContact.matches.any())
-    
+        count_query = count_query.where(~SharedContact.matches.any())
+
     # Apply search filter to count query if provided
     if search:
         # Create the same search conditions as the main query
@@ -672,7 +632,7 @@ async def get_shared_contacts(
             User.last_name.ilike(f"%{search.lower()}%"),
             User.email.ilike(f"%{search.lower()}%")
         ]
-        
+
         # Add address search conditions if needed
         if any(term in search.lower() for term in ['street', 'st', 'ave', 'avenue', 'blvd', 'road', 'rd']):
             search_conditions.extend([
@@ -681,88 +641,89 @@ async def get_shared_contacts(
                 SharedContact.state.ilike(f"%{search.lower()}%"),
                 SharedContact.zip.ilike(f"%{search.lower()}%")
             ])
-        
-        count_query = count_query.filter(or_(*search_conditions))
-    
-    logger.debug(f"Count query after filters: {str(count_query.statement.compile(compile_kwargs={'literal_binds': True}))}")
-    total_count = count_query.scalar()
+
+        count_query = count_query.where(or_(*search_conditions))
+
+    # Rendering the SQL with its values is expensive; only when someone is reading it
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Count query after filters: %s", count_query.compile(compile_kwargs={"literal_binds": True}))
+    total_count = (await db.execute(count_query)).scalar()
     logger.debug(f"Total count after filters: {total_count}")
-    
+
     # Apply pagination and execute the main query
-    logger.debug(f"Main query after filters: {str(query.statement.compile(compile_kwargs={'literal_binds': True}))}")
-    shared_contacts = query.offset(skip).limit(limit).all()
-    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Main query after filters: %s", query.compile(compile_kwargs={"literal_binds": True}))
+    shared_contacts = (await db.execute(query.offset(skip).limit(limit))).all()
+
     # Early exit if no contacts found
     if not shared_contacts:
-        result = {"contacts": [], "total": 0}
-        await redis_cache.set(cache_key, json.dumps(result), ex=30)  # Cache empty results for 30 seconds
-        return result
-    
+        return {"contacts": [], "total": 0}
+
     # Get all contact IDs for batch processing
     contact_ids = [contact[0].id for contact in shared_contacts]
-    
+
     # Initialize dictionaries to store match data
     match_count_dict = {}
     contact_matches = {}
-    
+
     if contact_ids:  # Only run these queries if we have contacts
         # Get match counts and list names in a single query using subqueries
         from sqlalchemy.orm import aliased
-        
+
         # Create a subquery for match counts
-        match_counts_subq = db.query(
+        match_counts_subq = select(
             ContactMatch.shared_contact_id,
             func.count(ContactMatch.id).label('match_count')
         ).join(
             TargetContact, ContactMatch.target_contact_id == TargetContact.id
-        ).filter(
+        ).where(
             ContactMatch.shared_contact_id.in_(contact_ids)
         ).group_by(
             ContactMatch.shared_contact_id
         ).subquery()
-        
+
         # Create a subquery for matched list names
-        matches_subq = db.query(
+        matches_subq = select(
             ContactMatch.shared_contact_id,
             TargetList.name
         ).join(
             TargetList,
             ContactMatch.target_list_id == TargetList.id
-        ).filter(
+        ).where(
             ContactMatch.shared_contact_id.in_(contact_ids)
         ).subquery()
-        
+
         # Execute a single query to get all match data
-        all_match_data = db.query(
+        all_match_data = (await db.execute(select(
             match_counts_subq.c.shared_contact_id,
             match_counts_subq.c.match_count,
             matches_subq.c.name
         ).outerjoin(
             matches_subq,
             match_counts_subq.c.shared_contact_id == matches_subq.c.shared_contact_id
-        ).all()
-        
+        ))).all()
+
         # Process the results
         for shared_contact_id, match_count, list_name in all_match_data:
             if shared_contact_id not in match_count_dict:
                 match_count_dict[shared_contact_id] = 0
                 contact_matches[shared_contact_id] = []
-            
+
             if match_count is not None:
                 match_count_dict[shared_contact_id] = match_count
-            
+
             if list_name:
                 contact_matches[shared_contact_id].append(list_name)
-    
+
     # Format the response to match SharedContactResponse model
     result = []
     for contact, user_first_name, user_last_name, user_email in shared_contacts:
         # Create mobile_numbers list, filtering out None values
         mobile_numbers = [number for number in [contact.mobile1, contact.mobile2, contact.mobile3] if number]
-        
+
         # Get match count for this contact
         match_count = match_count_dict.get(contact.id, 0)
-        
+
         # Create contact dictionary with all fields
         contact_dict = {
             "id": contact.id,
@@ -785,7 +746,7 @@ async def get_shared_contacts(
             "matched_lists": contact_matches.get(contact.id, [])
         }
         result.append(contact_dict)
-    
+
     # Convert datetime objects to ISO format strings
     def convert_datetime(obj):
         if isinstance(obj, datetime):
@@ -795,59 +756,110 @@ async def get_shared_contacts(
         elif isinstance(obj, list):
             return [convert_datetime(item) for item in obj]
         return obj
-    
+
     # Prepare and convert response
     response = {"contacts": convert_datetime(result), "total": total_count}
+
+    query_time = (time.time() - query_start) * 1000
+    logger.info(f"Shared contacts query executed in {query_time:.2f}ms")
+    return response
+
+@register_warmup("shared_contacts", tags=SHARED_CONTACTS_CACHE_TAGS)
+async def warm_shared_contacts():
+    async with AsyncReadSessionLocal() as db:
+        for skip, limit in SHARED_CONTACTS_WARM_PAGES:
+            await refresh(
+                shared_contacts_cache_key(None, None, None, 'created_at', 'desc', skip, limit),
+                lambda: load_shared_contacts_page(db, None, None, None, 'created_at', 'desc', skip, limit),
+                ttl=SHARED_CONTACTS_CACHE_TTL,
+                tags=SHARED_CONTACTS_CACHE_TAGS
+            )
+
+@router.get("/shared", response_model=SharedContactsPageResponse, tags=["contacts"])
+async def get_shared_contacts(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_admin_user),
+    search: Optional[str] = Query(None, description="Search term for name, email, or phone"),
+    user_id: Optional[int] = Query(None, description="Filter by user ID"),
+    match_status: Optional[str] = Query(None, description="Filter by match status: 'matched' or 'unmatched'"),
+    sort_by: Optional[str] = Query('created_at', description="Field to sort by"),
+    sort_order: str = Query('desc', description="Sort order (asc or desc)"),
+    skip: int = 0,
+    limit: int = 100
+):
+    """Get all shared contacts (admin only) with Redis caching for performance"""
+    start_time = time.time()
     
-    # Cache the result for 60 seconds
-    try:
-        await redis_cache.set(cache_key, json.dumps(response), ex=60)
-    except Exception as e:
-        logger.error(f"Error caching shared contacts: {e}")
+    # Enforce a hard maximum limit to prevent excessive queries
+    if limit > 1000:
+        raise HTTPException(status_code=400, detail="Maximum limit is 1000. Please use pagination.")
     
+    # Default to a reasonable page size if not specified
+    if limit <= 0:
+        limit = 500
+    
+    # Cached for 60 seconds; concurrent misses and expiries share one load
+    response = await get_or_set(
+        shared_contacts_cache_key(search, user_id, match_status, sort_by, sort_order, skip, limit),
+        lambda: load_shared_contacts_page(db, search, user_id, match_status, sort_by, sort_order, skip, limit),
+        ttl=SHARED_CONTACTS_CACHE_TTL,
+        tags=SHARED_CONTACTS_CACHE_TAGS
+    )
+
     # Log performance metrics
-    query_time = (time.time() - query_start) * 1000
     total_time = (time.time() - start_time) * 1000
-    logger.info(f"Shared contacts query executed in {query_time:.2f}ms, total processing time: {total_time:.2f}ms")
+    logger.info(f"Shared contacts served in {total_time:.2f}ms")
     
     return response
 
 
 # Skipped Contacts API endpoints
+def _skip_contact(conn, user_id: int, shared_contact_id: int) -> bool:
+    """Writer unit: record a skip; False if it was already recorded."""
+    existing_skip = conn.execute(select(skipped_contacts.c.id).where(
+        skipped_contacts.c.user_id == user_id,
+        skipped_contacts.c.shared_contact_id == shared_contact_id
+    )).first()
+    if existing_skip:
+        return False
+    conn.execute(
+        skipped_contacts.insert().values(
+            user_id=user_id,
+            shared_contact_id=shared_contact_id,
+            created_at=datetime.now()
+        )
+    )
+    return True
+
+def _unskip_contact(conn, user_id: int, shared_contact_id: int) -> int:
+    """Writer unit: remove a skip, returning how many rows were deleted."""
+    result = conn.execute(
+        skipped_contacts.delete().where(
+            and_(
+                skipped_contacts.c.user_id == user_id,
+                skipped_contacts.c.shared_contact_id == shared_contact_id
+            )
+        )
+    )
+    return result.rowcount
+
 @router.post("/skip")
 async def skip_contact(
     shared_contact_id: int,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Skip a contact permanently for a user
     """
     try:
-        # Check if the contact is already skipped
-        existing_skip = db.query(skipped_contacts).filter(
-            skipped_contacts.c.user_id == current_user.id,
-            skipped_contacts.c.shared_contact_id == shared_contact_id
-        ).first()
-        
-        if existing_skip:
-            return {"status": "already_skipped", "message": "Contact was already skipped"}
-        
-        # Insert into skipped_contacts table
-        db.execute(
-            skipped_contacts.insert().values(
-                user_id=current_user.id,
-                shared_contact_id=shared_contact_id,
-                created_at=datetime.now()
-            )
-        )
-        db.commit()
-        
-        return {"status": "success", "message": "Contact skipped successfully"}
+        skipped = await db_writer.submit(_skip_contact, current_user.id, shared_contact_id)
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+    if not skipped:
+        return {"status": "already_skipped", "message": "Contact was already skipped"}
+    return {"status": "success", "message": "Contact skipped successfully"}
+
 
 @router.get("/skipped")
 async def get_skipped_contacts(
@@ -911,28 +923,17 @@ async def get_skipped_contacts(
 @router.delete("/skip/{shared_contact_id}")
 async def unskip_contact(
     shared_contact_id: int,
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Remove a contact from the skipped list
     """
     try:
-        # Delete from skipped_contacts table
-        result = db.execute(
-            skipped_contacts.delete().where(
-                and_(
-                    skipped_contacts.c.user_id == current_user.id,
-                    skipped_contacts.c.shared_contact_id == shared_contact_id
-                )
-            )
-        )
-        db.commit()
-        
-        if result.rowcount == 0:
-            return {"status": "not_found", "message": "Contact was not in skipped list"}
-        
-        return {"status": "success", "message": "Contact removed from skipped list"}
+        deleted = await db_writer.submit(_unskip_contact, current_user.id, shared_contact_id)
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
+
+    if deleted == 0:
+        return {"status": "not_found", "message": "Contact was not in skipped list"}
+
+    return {"status": "success", "message": "Contact removed from skipped list"}
@@ -1,12 +1,21 @@
-from sqlalchemy import create_engine, event
+from sqlalchemy import Column, MetaData, String, Table, create_engine, event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.pool import QueuePool
+from starlette.requests import Request
+import asyncio
 import os
+import re
 import time
 import logging
 from dotenv import load_dotenv
 from contextlib import contextmanager
 
+from utils.query_stats import record_query
+from utils.slow_queries import slow_query_log
+from utils.entity_versions import track_writes
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -16,51 +25,221 @@ load_dotenv()
 # Get the absolute path to the project root
 current_dir = os.path.dirname(os.path.abspath(__file__))
 db_path = os.path.join(current_dir, "campaign.db")
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{db_path}"
+# SQLite file by default; a postgresql:// URL switches every engine (and the
+# Alembic migrations) to PostgreSQL
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{db_path}")
+_url = make_url(SQLALCHEMY_DATABASE_URL)
+IS_SQLITE = _url.get_backend_name() == "sqlite"
+IS_POSTGRES = _url.get_backend_name() == "postgresql"
+if not (IS_SQLITE or IS_POSTGRES):
+    raise ValueError(f"Unsupported DATABASE_URL backend: {_url.get_backend_name()}")
+# Same database through an asyncio driver, for async route handlers
+ASYNC_DATABASE_URL = _url.set(
+    drivername="sqlite+aiosqlite" if IS_SQLITE else "postgresql+asyncpg"
+).render_as_string(hide_password=False)
 
 # Database configuration from environment variables
-DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
 DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
 DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
 DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 30 minutes
+# Read-only connections; WAL lets them run alongside the writer
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+# Connections for the legacy sync handlers that still write through Session
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "4"))
+# Connections utils.db_writer may use; SQLite has a single writer
+DB_ASYNC_WRITE_POOL_SIZE = 1 if IS_SQLITE else int(os.getenv("DB_ASYNC_WRITE_POOL_SIZE", "4"))
 
 # Only log SQL if explicitly enabled
 echo = os.getenv("SQL_ECHO", "false").lower() == "true"
 
-# Create engine with optimized connection pooling
-engine = create_engine(
+# PRAGMAs applied to every new connection, by profile. WAL lets readers
+# proceed while one connection writes; busy_timeout makes a writer wait for
+# the lock instead of failing with "database is locked".
+SQLITE_PROFILES = {
+    "balanced": {
+        "journal_mode": "WAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "synchronous": "NORMAL",  # Durable at checkpoints; a power loss can drop the last commits
+        "foreign_keys": "ON",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,  # KiB, per connection
+        "temp_store": "MEMORY",
+        "analysis_limit": 400,  # Bounds the work done by PRAGMA optimize
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "synchronous": "FULL",
+        "foreign_keys": "ON",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+        "analysis_limit": 400,
+    },
+    "low_memory": {
+        "journal_mode": "WAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "synchronous": "NORMAL",
+        "foreign_keys": "ON",
+        "mmap_size": 0,
+        "cache_size": -2000,
+        "temp_store": "DEFAULT",
+        "analysis_limit": 400,
+    },
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "balanced")
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]
+SQLITE_OPTIMIZE_INTERVAL_S = int(os.getenv("SQLITE_OPTIMIZE_INTERVAL_S", "3600"))
+
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas, read_only: bool = False):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if read_only:
+            # Set last: journal_mode may need to write the first time
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _connect_args(read_only: bool = False, is_async: bool = False) -> dict:
+    """Driver arguments; PostgreSQL readers get read-only transactions from the server."""
+    if IS_SQLITE:
+        return {} if is_async else {"check_same_thread": False}
+    if not read_only:
+        return {}
+    if is_async:
+        return {"server_settings": {"default_transaction_read_only": "on"}}
+    return {"options": "-c default_transaction_read_only=on"}
+
+
+def _configure(engine, read_only: bool = False, immediate: bool = False):
+    """
+    Apply the connection profile to every connection the engine opens.
+
+    immediate: take the write lock when the transaction begins (BEGIN IMMEDIATE),
+    so busy_timeout applies to it instead of failing when a read upgrades to a
+    write. This also makes SAVEPOINTs work, since the driver no longer issues
+    BEGIN on its own.
+
+    Only SQLite connections need this; PostgreSQL is configured by the server
+    and _connect_args.
+    """
+    if not IS_SQLITE:
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, SQLITE_PRAGMAS, read_only)
+        if immediate:
+            dbapi_connection.isolation_level = None
+
+    if immediate:
+        @event.listens_for(engine, "begin")
+        def on_begin(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    return engine
+
+
+# Pre-ping only over the network: for a local SQLite file it only costs a round trip.
+POOL_PRE_PING = not IS_SQLITE
+
+# Sync writer, used by handlers and scripts that write through Session
+engine = _configure(create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
+    connect_args=_connect_args(),
     poolclass=QueuePool,
-    pool_size=DB_POOL_SIZE,
-    max_overflow=DB_MAX_OVERFLOW,
+    pool_size=DB_WRITE_POOL_SIZE,
+    max_overflow=0 if IS_SQLITE else DB_MAX_OVERFLOW,
     pool_timeout=DB_POOL_TIMEOUT,
     pool_recycle=DB_POOL_RECYCLE,
-    pool_pre_ping=True,  # Verify connections before using them
+    pool_pre_ping=POOL_PRE_PING,
     echo=echo  # Only log SQL if explicitly enabled
-)
+))
+
+# Sync read-only engine for GET requests
+read_engine = _configure(create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args=_connect_args(read_only=True),
+    poolclass=QueuePool,
+    pool_size=DB_READ_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+    echo=echo
+), read_only=True)
 
 # Create session factory with thread safety
 SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Async engines: queries run on aiosqlite's connection threads (or asyncpg's
+# protocol) and the handler awaits them, so a slow query no longer stalls the
+# event loop.
+# SQLite has one writer at a time, so there the async writer keeps a single
+# connection; waiting for it is an await, not a blocked thread. It is used
+# by utils.db_writer, which groups many callers' writes into one commit.
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=_connect_args(is_async=True),
+    pool_size=DB_ASYNC_WRITE_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+    echo=echo
+)
+_configure(async_engine.sync_engine, immediate=True)
+
+async_read_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=_connect_args(read_only=True, is_async=True),
+    pool_size=DB_READ_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=POOL_PRE_PING,
+    echo=echo
+)
+_configure(async_read_engine.sync_engine, read_only=True)
+
+# Objects stay usable after commit; lazy loads are not available on async sessions
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Requests with these methods never write and are served from the read engines
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
 
 # Add performance monitoring to database connections
-@event.listens_for(engine, "before_cursor_execute")
 def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
     if not hasattr(conn, "query_start_time"):
         conn.query_start_time = {}
     conn.query_start_time[cursor] = time.time()
 
-@event.listens_for(engine, "after_cursor_execute")
 def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
     if hasattr(conn, "query_start_time") and cursor in conn.query_start_time:
         total_time = time.time() - conn.query_start_time[cursor]
-        # Log slow queries (>100ms)
-        if total_time > 0.1:
-            logger.warning(f"SLOW QUERY: {total_time:.2f}s - {statement[:100]}...")
+        record_query(statement, total_time * 1000)
+        if total_time * 1000 > slow_query_log.threshold_ms:
+            slow_query_log.record(conn, statement, parameters, executemany, total_time * 1000)
         del conn.query_start_time[cursor]
 
-def get_db():
-    """Dependency for getting database session"""
+for _engine in (engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine):
+    event.listen(_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(_engine, "after_cursor_execute", after_cursor_execute)
+
+# Committed writes bump their tables' versions (see utils.entity_versions); the read engines never write
+for _engine in (engine, async_engine.sync_engine):
+    track_writes(_engine)
+
+def get_db(request: Request = None):
+    """Dependency for getting database session; read-only requests get a read-only session"""
+    if request is not None and request.method in READ_ONLY_METHODS:
+        yield from get_read_db()
+        return
     db = SessionLocal()
     try:
         yield db
@@ -71,6 +250,57 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """Session on the read-only engine; any write through it fails"""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    except Exception as e:
+        logger.error(f"Database error: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+async def get_async_db(request: Request = None):
+    """Dependency for getting an async database session; read-only requests get a read-only session"""
+    session_factory = AsyncSessionLocal
+    if request is not None and request.method in READ_ONLY_METHODS:
+        session_factory = AsyncReadSessionLocal
+    async with session_factory() as db:
+        try:
+            yield db
+        except Exception as e:
+            logger.error(f"Database error: {e}")
+            await db.rollback()
+            raise
+
+def optimize_database():
+    """Let SQLite refresh the statistics that recent queries would benefit from."""
+    if not IS_SQLITE:
+        return  # PostgreSQL's autovacuum keeps its statistics current
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+
+async def optimize_periodically():
+    """Run PRAGMA optimize every SQLITE_OPTIMIZE_INTERVAL_S; started at application startup."""
+    if not IS_SQLITE:
+        return
+    while True:
+        await asyncio.sleep(SQLITE_OPTIMIZE_INTERVAL_S)
+        start_time = time.time()
+        try:
+            async with async_engine.connect() as conn:
+                await conn.exec_driver_sql("PRAGMA optimize")
+            logger.info(f"PRAGMA optimize took {(time.time() - start_time) * 1000:.2f}ms")
+        except Exception as e:
+            logger.error(f"PRAGMA optimize failed: {e}")
+
+async def get_async_read_db():
+    """Async session on the read-only engine, for handlers that write only through utils.db_writer"""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
 @contextmanager
 def get_db_context():
     """Context manager for getting database session"""
@@ -85,21 +315,82 @@ def get_db_context():
     finally:
         db.close()
 
+# Alembic revision scripts; the newest one is the schema this code expects
+MIGRATIONS_DIR = os.path.join(current_dir, "migrations", "versions")
+# "warn" logs an out-of-date schema and creates missing tables; "strict" refuses to start
+DB_SCHEMA_CHECK = os.getenv("DB_SCHEMA_CHECK", "warn").lower()
+
+# Also matches the annotated form the script template generates (revision: str = ...)
+_REVISION_RE = re.compile(r"^revision\s*(?::[^=]*)?=\s*['\"]([^'\"]+)['\"]", re.MULTILINE)
+_DOWN_REVISION_RE = re.compile(r"^down_revision\s*(?::[^=]*)?=(.*)$", re.MULTILINE)
+
+def migration_heads(directory: str = MIGRATIONS_DIR) -> set:
+    """
+    Revisions no other migration builds on.
+
+    Reads the revision ids out of the scripts instead of loading them through
+    Alembic, which would import every migration on each boot.
+    """
+    revisions, parents = set(), set()
+    for name in os.listdir(directory):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            source = f.read()
+        revision = _REVISION_RE.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = _DOWN_REVISION_RE.search(source)
+        if down_revision is not None:
+            parents.update(re.findall(r"['\"]([^'\"]+)['\"]", down_revision.group(1)))
+    return revisions - parents
+
+def _stamp(conn, revisions):
+    version_table = Table(
+        "alembic_version", MetaData(),
+        Column("version_num", String(32), primary_key=True),
+    )
+    version_table.create(conn, checkfirst=True)
+    conn.execute(version_table.delete())
+    conn.execute(version_table.insert(), [{"version_num": revision} for revision in sorted(revisions)])
+
 def init_db():
-    """Initialize the database by creating all tables."""
+    """
+    Check the database schema against the migrations.
+
+    A database at the latest revision is left alone, so a normal boot costs
+    one query instead of a create_all. An empty database gets every table and
+    is stamped with the latest revision. Anything else needs
+    `alembic upgrade head`; see DB_SCHEMA_CHECK.
+    """
+    heads = migration_heads()
+    with engine.connect() as conn:
+        tables = set(inspect(conn).get_table_names())
+        current = set()
+        if "alembic_version" in tables:
+            current = set(conn.execute(text("SELECT version_num FROM alembic_version")).scalars())
+
+    if current == heads:
+        logger.info(f"Database schema is at revision {', '.join(sorted(heads))}")
+        return
+
     # Import models to ensure they are registered with SQLAlchemy
     from models import Base
-    
-    try:
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        print("Database tables created successfully")
-        
-        # Create all tables
-        Base.metadata.create_all(bind=engine)
-        print("Database tables created successfully")
-    except Exception as e:
-        print(f"Error initializing database: {e}")
-        import traceback
-        traceback.print_exc()
-        raise
+
+    if not tables - {"alembic_version"}:
+        with engine.begin() as conn:
+            Base.metadata.create_all(bind=conn)
+            _stamp(conn, heads)
+        logger.info(f"Created database schema at revision {', '.join(sorted(heads))}")
+        return
+
+    message = (
+        f"Database schema is at {', '.join(sorted(current)) or 'no recorded revision'}, "
+        f"expected {', '.join(sorted(heads))}; run `alembic upgrade head`"
+    )
+    if DB_SCHEMA_CHECK == "strict":
+        raise RuntimeError(message)
+    logger.warning(message)
+    # Keep databases that predate the version table usable: add missing tables
+    Base.metadata.create_all(bind=engine)
@@ -42,8 +42,42 @@ def get_all_group_user_counts(db: Session = Depends(get_db)):
     return [{"group_id": gid, "user_count": count} for gid, count in results]
 
 from fastapi.encoders import jsonable_encoder
-import json
-from utils.cache import redis_cache, delete_pattern
+from database import ReadSessionLocal
+from utils.cache import get_or_set, invalidate_tag, bump_namespace, refresh
+from utils.warmup import register_warmup
+from starlette.concurrency import run_in_threadpool
+
+GROUPS_LIST_CACHE_TTL = 30
+GROUPS_LIST_CACHE_TAGS = ['groups']
+
+def groups_list_cache_key(skip, limit) -> str:
+    return f"groups_list_{skip}_{limit}"
+
+def load_groups_list(db: Session, skip, limit):
+    # Blocking; callers run it with run_in_threadpool
+    groups = db.query(Group).offset(skip).limit(limit).all()
+    group_responses = []
+    for group in groups:
+        group_responses.append({
+            "id": group.id,
+            "name": group.name,
+            "created_at": group.created_at,
+            "updated_at": group.updated_at
+        })
+    return jsonable_encoder(group_responses)
+
+@register_warmup("groups_list", tags=GROUPS_LIST_CACHE_TAGS)
+async def warm_groups_list():
+    db = ReadSessionLocal()
+    try:
+        await refresh(
+            groups_list_cache_key(0, 100),
+            lambda: run_in_threadpool(load_groups_list, db, 0, 100),
+            ttl=GROUPS_LIST_CACHE_TTL,
+            tags=GROUPS_LIST_CACHE_TAGS
+        )
+    finally:
+        db.close()
 
 @router.api_route("", methods=["GET"], response_model=List[GroupResponse])
 @router.api_route("/", methods=["GET"], response_model=List[GroupResponse])
@@ -55,22 +89,12 @@ async def get_groups(
 ):
     logger.info(f"GET /groups - Headers: {request.headers}")
     logger.info(f"GET /groups - Query Params: {request.query_params}")
-    cache_key = f"groups_list_{skip}_{limit}"
-    cached = await redis_cache.get(cache_key)
-    if cached:
-        logger.info("Returning cached groups list from Redis")
-        return json.loads(cached)
-    groups = db.query(Group).offset(skip).limit(limit).all()
-    group_responses = []
-    for group in groups:
-        group_responses.append({
-            "id": group.id,
-            "name": group.name,
-            "created_at": group.created_at,
-            "updated_at": group.updated_at
-        })
-    await redis_cache.set(cache_key, json.dumps(jsonable_encoder(group_responses)), ex=30)
-    logger.info("Cached groups list in Redis")
+    group_responses = await get_or_set(
+        groups_list_cache_key(skip, limit),
+        lambda: run_in_threadpool(load_groups_list, db, skip, limit),
+        ttl=GROUPS_LIST_CACHE_TTL,
+        tags=GROUPS_LIST_CACHE_TAGS
+    )
     return group_responses
 
 @router.api_route("", methods=["POST"], response_model=GroupResponse, status_code=201)
@@ -92,7 +116,7 @@ async def create_group(
     db.commit()
     db.refresh(db_group)
     # Invalidate groups list cache
-    await delete_pattern('groups_list*')
+    await invalidate_tag('groups')
     return db_group
 
 @router.api_route("/{group_id}", methods=["DELETE"])
@@ -113,7 +137,9 @@ async def delete_group(
     # Then delete the group
     db.delete(group)
     db.commit()
-    await delete_pattern('groups_list*')
+    await invalidate_tag('groups')
+    # Template lists embed group names
+    await bump_namespace('message_templates')
     return {"message": "Group deleted successfully"}
 
 @router.get("/{group_id}/users", response_model=List[UserResponse])
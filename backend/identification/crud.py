@@ -64,16 +64,18 @@ def delete_question(db: Session, question_id: int) -> bool:
 
 # ---------- Answer CRUD ----------
 
-def create_answer(db: Session, question: IdQuestion, user_id: int, shared_contact_id: int, data: dict) -> IdAnswer:
-    answer = IdAnswer(
-        question_id=question.id,
-        user_id=user_id,
-        shared_contact_id=shared_contact_id,
-        **data
-    )
-    db.add(answer)
-    db.commit()
-    db.refresh(answer)
+def insert_answer(conn, question_id: int, user_id: int, shared_contact_id: int, data: dict) -> IdAnswer:
+    """Writer unit (utils.db_writer) creating an answer; it comes back detached with its columns loaded."""
+    with Session(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False) as db:
+        answer = IdAnswer(
+            question_id=question_id,
+            user_id=user_id,
+            shared_contact_id=shared_contact_id,
+            **data
+        )
+        db.add(answer)
+        # Releases this session's savepoint; the writer commits the transaction
+        db.commit()
     return answer
 
 def get_answers_for_question(db: Session, question_id: int, skip: int = 0, limit: int = 100):
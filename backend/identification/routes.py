@@ -12,6 +12,7 @@ from models import User
 from . import crud, schemas
 import models
 from models.identification.id_question import IdQuestion
+from utils.db_writer import db_writer
 
 router = APIRouter(
     prefix="/api/identification",
@@ -82,12 +83,12 @@ async def submit_answer(question_id: int, request: Request, db: Session = Depend
     if not question or not question.is_active:
         raise HTTPException(status_code=404, detail="Question not found or inactive")
 
-    answer = crud.create_answer(
-        db,
-        question=question,
-        user_id=current_user.id,
-        shared_contact_id=answer_in.shared_contact_id,
-        data=answer_in.model_dump(exclude={"shared_contact_id"})
+    answer = await db_writer.submit(
+        crud.insert_answer,
+        question.id,
+        current_user.id,
+        answer_in.shared_contact_id,
+        answer_in.model_dump(exclude={"shared_contact_id"})
     )
     return answer
 
@@ -1,70 +1,38 @@
 import logging
 import sys
 from pathlib import Path
-from fastapi import FastAPI, Depends, Request, HTTPException, status, Response
+
+# Imported first so the startup profile also times the imports below
+from utils.startup import startup_profile
+
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, FileResponse, RedirectResponse
-from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
-from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.openapi.docs import get_swagger_ui_html
+from fastapi.responses import PlainTextResponse
 from fastapi.openapi.utils import get_openapi
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Optional, Dict, Any
-import uvicorn
-import os
-import json
-import logging
-import time
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from dotenv import load_dotenv
 
 # Add the parent directory to the Python path
 sys.path.append(str(Path(__file__).parent))
 
-# Configure logging
-log_dir = Path("logs")
-log_dir.mkdir(exist_ok=True)
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_dir / 'app.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Load environment variables
+load_dotenv()
+
+# Log through a background writer thread; see utils.logging
+from utils.logging import configure_logging
+configure_logging()
 
 logger = logging.getLogger(__name__)
 logger.info("Application starting...")
 
 # Import database and models first to ensure all models are registered
-from database import engine, SessionLocal, init_db
-from models import Base, User  # Import Base and User from models
-
-# Import routers
-from auth.auth import router as auth_router
-from auth.dependencies import get_current_user
-from contacts.routes import router as contacts_router
-from export.export import router as export_router
-from targets.routes import router as targets_router
-from users.routes import router as users_router
-from messages.routes import router as messages_router
-from groups.routes import router as groups_router
-from sent_messages.routes import router as sent_messages_router
-from identification.routes import router as identification_router
-from shared_contacts.routes import router as shared_contacts_router
-
-# Load environment variables
-load_dotenv()
+with startup_profile.phase("database and models"):
+    from database import init_db
+    from models import User  # Import User from models
+    from auth.dependencies import get_current_user
 
-# Initialize the database (create tables, etc.)
-init_db()
+# Check the schema revision (creates the tables on an empty database)
+with startup_profile.phase("schema check"):
+    init_db()
 
 app = FastAPI(
     title="RightImpact API",
@@ -85,9 +53,38 @@ ALLOWED_ORIGINS = [
     "http://localhost:8000",
 ]
 
-# Debug CORS configuration
-print("\n=== CORS MIDDLEWARE CONFIGURATION ===")
-print(f"Allowed origins: {ALLOWED_ORIGINS}")
+# Routers as (module, prefix, tags, path their routes live under). With
+# LAZY_ROUTERS on, each module is imported on the first request under its
+# path (see middleware.lazy_routers); otherwise all are imported here, so
+# the startup profile shows what each one costs
+from middleware.lazy_routers import LAZY_ROUTERS, LazyRouters
+ROUTERS = [
+    ("auth.auth", None, ["auth"], "/api/auth"),
+    ("contacts.routes", "/api/contacts", ["contacts"], "/api/contacts"),
+    ("targets.routes", "/api/targets", ["targets"], "/api/targets"),
+    ("users.routes", "/api/users", ["users"], "/api/users"),
+    # Message templates live under /api to match frontend expectations
+    ("messages.routes", "/api/message-templates", ["message-templates"], "/api/message-templates"),
+    ("identification.routes", None, None, "/api/identification"),
+    ("sent_messages.routes", "/api/sent_messages", ["sent-messages"], "/api/sent_messages"),
+    ("groups.routes", "/api/groups", ["groups"], "/api/groups"),
+    ("shared_contacts.routes", None, None, "/api/shared_contacts"),
+    ("admin.routes", "/api/admin", ["admin"], "/api/admin"),
+]
+
+routers = LazyRouters(app, ROUTERS)
+if LAZY_ROUTERS:
+    from middleware.lazy_routers import LazyRouterMiddleware
+    app.add_middleware(LazyRouterMiddleware, routers=routers)
+else:
+    routers.include_all()
+
+# ETags and 304s for polled endpoints; added before CORS so that replies
+# served from it still get CORS headers. See middleware.response_cache
+from middleware.response_cache import RESPONSE_CACHE_ENABLED
+if RESPONSE_CACHE_ENABLED:
+    from middleware.response_cache import ResponseCacheMiddleware
+    app.add_middleware(ResponseCacheMiddleware)
 
 # Enable CORS for all routes
 app.add_middleware(
@@ -96,61 +93,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # Wildcards are not honoured on credentialed requests, so list them
+    expose_headers=["X-Next-Cursor", "X-Has-More", "ETag"],
 )
 
-# Debug: Log all registered routes before adding new ones
-print("\n=== BEFORE ADDING ROUTES ===")
-for route in app.routes:
-    print(f"Route: {route.path} - Methods: {getattr(route, 'methods', 'N/A')}")
-
-# Include routers with proper API versioning
-app.include_router(auth_router, tags=["auth"])
-app.include_router(contacts_router, prefix="/api/contacts", tags=["contacts"])
-app.include_router(targets_router, prefix="/api/targets", tags=["targets"])
-app.include_router(users_router, prefix="/api/users", tags=["users"])
-# Include message templates router with /api prefix to match frontend expectations
-app.include_router(messages_router, prefix="/api/message-templates", tags=["message-templates"])
-
-# Register identification router
-app.include_router(identification_router)
-
-# Register sent messages router
-app.include_router(sent_messages_router, prefix="/api/sent_messages", tags=["sent-messages"])
-
-# Debug: Log before adding groups router
-print("\n=== ADDING GROUPS ROUTER ===")
-app.include_router(
-    groups_router,
-    prefix="/api/groups",
-    tags=["groups"]
-)
+# Per-request query counts and N+1 detection; see utils.query_stats
+from utils.query_stats import QUERY_STATS_ENABLED
+if QUERY_STATS_ENABLED:
+    from middleware.query_stats import QueryStatsMiddleware
+    app.add_middleware(QueryStatsMiddleware)
 
-app.include_router(shared_contacts_router)
-
-# Debug: Log all registered routes after adding all routes
-print("\n=== ALL REGISTERED ROUTES ===")
-for route in app.routes:
-    methods = getattr(route, 'methods', None)
-    if hasattr(route, 'endpoint'):
-        print(f"Route: {route.path} - Methods: {methods} - Endpoint: {route.endpoint.__name__ if route.endpoint else 'N/A'}")
-    else:
-        print(f"Route: {route.path} - Methods: {methods}")
-
-# Debug: Print CORS configuration
-print("\n=== CORS CONFIGURATION ===")
-print(f"Allowed Origins: {ALLOWED_ORIGINS}")
-print("Allowed Methods: ['*']")
-print("Allowed Headers: ['*']")
+# Per-route latency, size and status metrics, served at /metrics; added
+# last so it is outermost and times the other middleware too
+from utils.request_metrics import METRICS_ENABLED
+if METRICS_ENABLED:
+    from middleware.request_logging import RequestTimingMiddleware
+    app.add_middleware(RequestTimingMiddleware)
 
 # Configure OAuth2 for Swagger UI
 app.openapi_schema = None  # Clear the schema cache
 
 # Add security scheme
 
-# Update OpenAPI schema
-from fastapi.openapi.utils import get_openapi
-
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
@@ -186,14 +150,110 @@ def custom_openapi():
 
 app.openapi = custom_openapi
 
+@app.on_event("startup")
+async def start_cache_invalidation():
+    # Keep the in-process cache tier coherent with other workers
+    from utils.cache import redis_cache
+    redis_cache.start_invalidation_listener()
+
+@app.on_event("startup")
+async def warm_caches():
+    # Builders are registered by the router modules, so load any still pending first
+    from utils.warmup import start_warmup
+    if routers.pending:
+        routers.start_preload(then=start_warmup)
+    else:
+        start_warmup()
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    from utils.loop_monitor import LOOP_MONITOR_ENABLED, loop_monitor
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+@app.on_event("startup")
+async def start_slow_query_log():
+    from utils.slow_queries import slow_query_log
+    slow_query_log.start()
+
+@app.on_event("startup")
+async def start_db_writer():
+    # Started here so background threads can submit before any request writes
+    from utils.db_writer import db_writer
+    db_writer.start()
+
+@app.on_event("startup")
+async def start_entity_versions():
+    # Commits made outside a request (background threads, the writer task) bump versions on this loop
+    from utils.entity_versions import entity_versions
+    entity_versions.start()
+
+@app.on_event("startup")
+async def start_sqlite_optimize():
+    import asyncio
+    from database import optimize_periodically
+    app.state.optimize_task = asyncio.get_running_loop().create_task(optimize_periodically())
+
+@app.on_event("shutdown")
+async def stop_cache_invalidation():
+    from utils.cache import redis_cache
+    await redis_cache.stop_invalidation_listener()
+
+@app.on_event("shutdown")
+async def stop_password_hashing():
+    from auth import passwords
+    passwords.shutdown()
+
+@app.on_event("shutdown")
+async def flush_sent_messages():
+    # Don't drop sent events still waiting for a group commit
+    from sent_messages.ingest import sent_message_buffer
+    await sent_message_buffer.close()
+
+@app.on_event("shutdown")
+async def stop_db_writer():
+    from utils.db_writer import db_writer
+    await db_writer.close()
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    from database import async_engine, async_read_engine, optimize_database
+    app.state.optimize_task.cancel()
+    # SQLite recommends optimize before closing long-lived connections
+    optimize_database()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+@app.on_event("shutdown")
+async def stop_slow_query_log():
+    from utils.slow_queries import slow_query_log
+    await slow_query_log.stop()
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    from utils.loop_monitor import loop_monitor
+    await loop_monitor.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Campaign Messaging App API. Visit /docs for API documentation."}
 
 @app.get("/health")
 async def health_check():
+    """Liveness only; the cache, writer and event-loop details are at GET /api/admin/health."""
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Request metrics in the Prometheus text format, for METRICS_TOKEN or METRICS_ALLOWED_IPS."""
+    from utils.request_metrics import metrics_access_allowed, request_metrics
+    client_host = request.client.host if request.client else None
+    if not metrics_access_allowed(client_host, request.headers.get("authorization")):
+        raise HTTPException(status_code=403, detail="Not allowed to read metrics")
+    return PlainTextResponse(request_metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/protected")
 async def protected_route(current_user: User = Depends(get_current_user)):
     return {"message": "This is a protected route", "user": current_user.email}
+
+startup_profile.finish()
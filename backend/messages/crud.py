@@ -1,12 +1,16 @@
 from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-from sqlalchemy import select, and_, text, insert
+from sqlalchemy import select, and_, text
 from models.messages.message_template import MessageTemplate as DBMessageTemplate
 from models.messages.user_message_template import UserMessageTemplate
 from models.user import User as DBUser
 from models.targets.target_list import TargetList as ContactList
 from models.targets.target_contact import TargetContact
+from utils.bulk import insert_or_ignore
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Create
 def create_message_template(db: Session, template_data: dict, list_ids: List[int] = None, user_ids: List[int] = None, group_ids: List[int] = None):
@@ -87,7 +91,7 @@ def create_message_template(db: Session, template_data: dict, list_ids: List[int
             
             if new_group_ids:
                 db.execute(
-                    insert(message_template_groups).prefix_with("OR IGNORE"),
+                    insert_or_ignore(db, message_template_groups),
                     [{"template_id": db_template.id, "group_id": gid} for gid in new_group_ids]
                 )
                 print(f"[CRUD] Added {len(new_group_ids)} groups to template {db_template.id}")
@@ -610,28 +614,25 @@ def get_user_messages_with_matched_contacts(db: Session, user_id: int):
         )
         if not matches:
             continue
-        # Debug logging setup
-        import logging
-        logger = logging.getLogger("uvicorn.error")
-        logger.info(f"Processing template.id={template.id} ({type(template.id)}) for user_id={user_id}")
+        logger.debug("Processing template.id=%s for user_id=%s", template.id, user_id)
         # Query sent_messages to get all shared_contact_ids already sent for this user and message
         from models.sent_message import SentMessage
         sent_contact_ids = set(
-            str(row.shared_contact_id)
+            row.shared_contact_id
             for row in db.query(SentMessage.shared_contact_id)
             .filter(
                 SentMessage.user_id == user_id,
-                SentMessage.message_template_id == str(template.id)
+                SentMessage.message_template_id == template.id,
+                SentMessage.shared_contact_id.isnot(None)
             )
             .all()
         )
-        logger.info(f"sent_contact_ids for template.id={template.id}: {sent_contact_ids}")
+        logger.debug("sent_contact_ids for template.id=%s: %s", template.id, sent_contact_ids)
         # Prepare matched contacts info, excluding already sent contacts
         matched_contacts = []
         for match, shared, target in matches:
-            logger.info(f"Checking shared.id={shared.id} ({type(shared.id)}) against sent_contact_ids")
-            if str(shared.id) in sent_contact_ids:
-                logger.info(f"Excluding shared.id={shared.id} from matched_contacts (already sent)")
+            if shared.id in sent_contact_ids:
+                logger.debug("Excluding shared.id=%s from matched_contacts (already sent)", shared.id)
                 continue  # skip if already sent
             matched_contacts.append({
                 "shared_contact_id": shared.id,
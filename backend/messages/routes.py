@@ -1,9 +1,11 @@
+import logging
+
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from database import get_db
+from database import get_db, get_read_db
 from auth.dependencies import get_current_user
 from models import User
 from . import schemas, crud
@@ -11,7 +13,9 @@ from models.messages.message_template import MessageTemplate as DBMessageTemplat
 from models.messages.user_message_template import UserMessageTemplate
 from sqlalchemy import func
 
-from models import SentMessage  # <-- add import for SentMessage
+from sent_messages.counters import get_template_sent_counts
+
+logger = logging.getLogger(__name__)
 
 def format_template(template: DBMessageTemplate, db: Session = None) -> Dict[str, Any]:
     """Format a message template with its relationships for JSON response."""
@@ -79,7 +83,6 @@ def format_template(template: DBMessageTemplate, db: Session = None) -> Dict[str
             """),
             {"template_id": template.id}
         ).fetchall()
-        print(f"[DEBUG] Template {template.id} group_rows:", group_rows)
         result["groups"] = [{"id": row[0], "name": row[1]} for row in group_rows]
     elif hasattr(template, 'groups') and template.groups is not None:
         result["groups"] = [{"id": group.id, "name": group.name} for group in template.groups]
@@ -107,7 +110,7 @@ async def create_message_template(
     try:
         # Get raw request data to debug the issue
         raw_data = await request.json()
-        print(f"[DEBUG] Raw template data: {raw_data}")
+        logger.debug("Raw template data: %s", raw_data)
         
         # Manually validate the data
         template_data = {}
@@ -125,7 +128,7 @@ async def create_message_template(
         if "status" in raw_data and raw_data["status"]:
             status = str(raw_data["status"]).upper()
             if status not in ["ACTIVE", "INACTIVE", "DRAFT", "ARCHIVED"]:
-                print(f"[DEBUG] Invalid status: {status}, defaulting to DRAFT")
+                logger.debug("Invalid status %s, defaulting to DRAFT", status)
                 status = "DRAFT"
             template_data["status"] = status
         else:
@@ -136,8 +139,8 @@ async def create_message_template(
         user_ids = raw_data.get("user_ids", []) or []
         group_ids = raw_data.get("group_ids", []) or []
         
-        print(f"[DEBUG] Processed template data: {template_data}")
-        print(f"[DEBUG] Relationships - lists: {list_ids}, users: {user_ids}, groups: {group_ids}")
+        logger.debug("Processed template data: %s", template_data)
+        logger.debug("Relationships - lists: %s, users: %s, groups: %s", list_ids, user_ids, group_ids)
         
         # Create the template
         db_template = crud.create_message_template(
@@ -148,14 +151,9 @@ async def create_message_template(
             group_ids=group_ids
         )
         
-        # Force cache invalidation for all message template patterns
+        # Invalidate all cached template lists
         try:
-            print("[CACHE] Invalidating all message template cache patterns")
-            await delete_pattern('message_templates*')
-            await delete_pattern('message-templates*')
-            await delete_pattern('message_template*')
-            await delete_pattern('message-template*')
-            print("[CACHE] Cache invalidation complete")
+            await bump_namespace(TEMPLATES_NAMESPACE)
         except Exception as e:
             print(f"[CACHE] Error invalidating cache: {e}")
         
@@ -185,24 +183,30 @@ def get_user_messages(db: Session = Depends(get_db), current_user: User = Depend
     Return all messages assigned to the current user, but only if the user has at least one shared contact matched to a target list assigned to the message.
     For each message, include the matched contacts for this user and that message's target lists.
     """
-    import logging
-    logging.warning(f"[DEBUG] get_user_messages called. db: {db}, current_user: {getattr(current_user, 'id', None)}")
     from . import crud
+    logger.debug("get_user_messages for user %s", current_user.id)
     try:
-        result = crud.get_user_messages_with_matched_contacts(db, current_user.id)
-        logging.warning(f"[DEBUG] get_user_messages result: {result}")
-        return result
+        return crud.get_user_messages_with_matched_contacts(db, current_user.id)
     except Exception as e:
-        logging.error(f"[DEBUG] Exception in get_user_messages: {e}")
+        logger.error(f"Failed to load messages for user {current_user.id}: {e}")
         raise
 
 from fastapi.encoders import jsonable_encoder
-import json
 import time
-from utils.cache import redis_cache, delete_pattern
+from utils.cache import redis_cache, versioned_key, bump_namespace
 
 from starlette.concurrency import run_in_threadpool
 
+# Cache namespace for message template lists; bump it after any template write
+TEMPLATES_NAMESPACE = "message_templates"
+TEMPLATES_CACHE_TTL = 300
+
+def _apply_sent_counts(db: Session, formatted_templates: List[Dict[str, Any]]):
+    """Overlay fresh sent counts onto formatted (possibly cached) templates."""
+    sent_counts = get_template_sent_counts(db, [t["id"] for t in formatted_templates])
+    for template_data in formatted_templates:
+        template_data["sent_count"] = sent_counts.get(template_data["id"], 0)
+
 @router.get("/", response_model=List[schemas.MessageTemplate])
 async def read_message_templates(
     skip: int = 0,
@@ -213,26 +217,22 @@ async def read_message_templates(
     """
     Retrieve message templates
     """
-    start_time = time.time()
-    print(f"[Timing] read_message_templates: start")
-    # Generate cache key but don't use cache for this high-change endpoint
-    cache_key = f"message_templates_{skip}_{limit}_{int(time.time())}"
-    print(f"[CACHE] Bypassing cache for message templates list")
+    # Cache key embeds the namespace version, so writes invalidate it with one INCR
+    cache_key = await versioned_key(TEMPLATES_NAMESPACE, f"skip={skip}", f"limit={limit}")
     
-    # Force delete any existing cache entries for message templates
     try:
-        await delete_pattern('message_templates*')
-        await delete_pattern('message-templates*')
-        print(f"[CACHE] Cleared all message template cache entries")
+        cached = await redis_cache.get_obj(cache_key)
+        if cached:
+            # Copy before overlaying counts; the cached list may be shared in-process
+            formatted_templates = [dict(template) for template in cached]
+            _apply_sent_counts(db, formatted_templates)
+            return formatted_templates
     except Exception as e:
-        print(f"[CACHE] Error clearing cache: {e}")
+        print(f"[CACHE] Error reading message templates cache: {e}")
     
     try:
-        t1 = time.time()
-        print(f"[Timing] before DB call: {t1 - start_time:.3f}s")
-        
         # Create a fresh session for this operation
-        fresh_db = next(get_db())
+        fresh_db = next(get_read_db())
         try:
             templates = await run_in_threadpool(crud.get_message_templates, fresh_db, skip, limit)
             
@@ -247,28 +247,14 @@ async def read_message_templates(
         finally:
             fresh_db.close()
         
-        t2 = time.time()
-        print(f"[Timing] after DB call: {t2 - t1:.3f}s (total: {t2 - start_time:.3f}s)")
-        print(f"[Timing] Loaded {len(templates)} templates from DB")
-        # Batch fetch sent_counts
-        template_ids = [t.id for t in templates]
-        sent_counts = {}
-        if template_ids:
-            sent_counts_query = db.query(SentMessage.message_template_id, func.count(SentMessage.id)).filter(SentMessage.message_template_id.in_(template_ids)).group_by(SentMessage.message_template_id).all()
-            sent_counts = {str(tid): count for tid, count in sent_counts_query}
-        t3 = time.time()
-        print(f"[Timing] after sent_counts batch: {t3 - t2:.3f}s (total: {t3 - start_time:.3f}s)")
         formatted_templates = [format_template(t, db) for t in templates]
-        for template_data in formatted_templates:
-            template_data["sent_count"] = sent_counts.get(str(template_data["id"]), 0)
-        t4 = time.time()
-        print(f"[Timing] after formatting: {t4 - t3:.3f}s (total: {t4 - start_time:.3f}s)")
-        # Don't cache message templates list to ensure immediate updates
-        print("[Cache] Skipping cache for message templates list to ensure immediate updates")
-        t5 = time.time()
-        print(f"[Timing] after cache set: {t5 - t4:.3f}s (total: {t5 - start_time:.3f}s)")
-        elapsed = time.time() - start_time
-        print(f"[Timing] read_message_templates (db): {elapsed:.3f}s")
+        # Cache the formatted templates; sent_count changes on every send, so it is
+        # overlaid per request instead of being part of the cached payload
+        try:
+            await redis_cache.set_obj(cache_key, jsonable_encoder(formatted_templates), ex=TEMPLATES_CACHE_TTL)
+        except Exception as e:
+            print(f"[CACHE] Error caching message templates: {e}")
+        _apply_sent_counts(db, formatted_templates)
         return formatted_templates
     except Exception as e:
         print(f"[ERROR] Failed to get message templates: {e}")
@@ -381,19 +367,9 @@ async def update_message_template(
         # Refresh the template to get the latest state
         db.refresh(db_template)
         
-        # Force cache invalidation for all message template patterns
+        # Invalidate all cached template lists
         try:
-            print("[CACHE] Invalidating all message template cache patterns")
-            import asyncio
-            await asyncio.gather(
-                delete_pattern('message_templates*'),
-                delete_pattern('message-templates*'),
-                delete_pattern('message_template*'),
-                delete_pattern('message-template*'),
-                delete_pattern(f'message_template_{template_id}*'),
-                delete_pattern(f'message-template-{template_id}*')
-            )
-            print("[CACHE] Cache invalidation complete")
+            await bump_namespace(TEMPLATES_NAMESPACE)
         except Exception:
             pass
         
@@ -491,11 +467,11 @@ async def get_neighbor_messages(
     contact_limit: int = 10,
     contact_offset: int = 0
 ):
-    print(f"[DEBUG] User {current_user.id} - Zip Code: '{current_user.zip_code}'")
     """
     Retrieve 'neighbor_to_neighbor' messages for the current user's zip code,
     along with paginated target contacts within that zip code.
     """
+    logger.debug("User %s - Zip Code: %r", current_user.id, current_user.zip_code)
     if not current_user.zip_code:
         raise HTTPException(status_code=400, detail="User does not have a zip code defined.")
 
@@ -527,7 +503,7 @@ async def delete_message_template(
         success = crud.delete_message_template(db, template_id=template_id)
         if not success:
             raise HTTPException(status_code=404, detail="Message template not found")
-        await delete_pattern('message_templates*')
+        await bump_namespace(TEMPLATES_NAMESPACE)
         return None
     except HTTPException:
         # Re-raise HTTP exceptions as-is
@@ -0,0 +1,112 @@
+"""
+Lazy router loading.
+
+main.py lists its routers as (module, prefix, tags, path). With LAZY_ROUTERS
+on, `import main` does not import them: a router's module is imported, off
+the event loop, and its routes included the first time a request arrives
+under its path. Once the app has started, the routers nobody asked for yet
+load in the background, so the cache warm-up builders they register still
+run and a later first request does not pay for the import.
+
+The OpenAPI schema lists every route, so a request for it loads all routers
+first.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.startup import startup_profile
+
+logger = logging.getLogger(__name__)
+
+LAZY_ROUTERS = os.getenv("LAZY_ROUTERS", "true").lower() == "true"
+
+# (module, prefix passed to include_router, tags, path its routes live under)
+RouterSpec = Tuple[str, Optional[str], Optional[List[str]], str]
+
+
+class LazyRouters:
+    """Routers of one app that have not been included yet."""
+
+    def __init__(self, app, routers: Sequence[RouterSpec]):
+        self.app = app
+        self.pending: Dict[str, RouterSpec] = {spec[0]: spec for spec in routers}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def include(self, module_name: str, module=None):
+        spec = self.pending.pop(module_name, None)
+        if spec is None:
+            return
+        _, prefix, tags, _ = spec
+        if module is None:
+            module = importlib.import_module(module_name)
+        options = {}
+        if prefix is not None:
+            options["prefix"] = prefix
+        if tags is not None:
+            options["tags"] = tags
+        self.app.include_router(module.router, **options)
+        # Rebuilt from app.routes on the next request for it
+        self.app.openapi_schema = None
+
+    def include_all(self):
+        """Import and include every router now, timing each in the startup profile."""
+        for module_name in list(self.pending):
+            with startup_profile.phase(f"router {module_name}"):
+                self.include(module_name)
+
+    async def load(self, module_name: str):
+        """Import and include one router without blocking the event loop."""
+        if module_name not in self.pending:
+            return
+        lock = self._locks.setdefault(module_name, asyncio.Lock())
+        async with lock:
+            if module_name not in self.pending:
+                return
+            start_time = time.time()
+            module = await asyncio.to_thread(importlib.import_module, module_name)
+            self.include(module_name, module)
+            logger.info(f"Loaded router {module_name} in {(time.time() - start_time) * 1000:.2f}ms")
+
+    async def load_all(self):
+        for module_name in list(self.pending):
+            await self.load(module_name)
+
+    def for_path(self, path: str) -> List[str]:
+        """Routers that still have to be loaded before path can be routed."""
+        if path == self.app.openapi_url:
+            return list(self.pending)
+        return [
+            module_name for module_name, (_, _, _, mount) in self.pending.items()
+            if path == mount or path.startswith(mount + "/")
+        ]
+
+    def start_preload(self, then: Optional[Callable[[], None]] = None):
+        """Load the remaining routers in the background, then call then()."""
+        async def preload():
+            try:
+                await self.load_all()
+            except Exception as e:
+                logger.error(f"Failed to load routers: {e}")
+            if then is not None:
+                then()
+
+        self._task = asyncio.get_running_loop().create_task(preload())
+
+
+class LazyRouterMiddleware:
+    """Loads the routers a request needs before it is routed."""
+
+    def __init__(self, app, routers: LazyRouters):
+        self.app = app
+        self.routers = routers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.routers.pending:
+            for module_name in self.routers.for_path(scope["path"]):
+                await self.routers.load(module_name)
+        await self.app(scope, receive, send)
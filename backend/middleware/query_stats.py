@@ -0,0 +1,44 @@
+"""
+ASGI middleware collecting per-request query stats (see utils.query_stats).
+
+Requests are grouped by route template ("GET /api/users/{user_id}"), not by
+raw path. With QUERY_STATS_HEADER on, each response reports its own numbers:
+
+    X-DB-Queries: 42
+    X-DB-N-Plus-One: 1
+    Server-Timing: db;dur=12.3;desc="42 queries"
+
+Queries made after the response starts (streaming bodies, background tasks)
+still count toward the route's aggregates, but not toward the headers.
+"""
+from utils.query_stats import QUERY_STATS_HEADER, begin_request, query_stats, route_label
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app, add_headers: bool = QUERY_STATS_HEADER):
+        self.app = app
+        self.add_headers = add_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = begin_request(scope)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                repeated = queries.repeated()
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-queries", str(queries.count).encode()),
+                    (b"x-db-n-plus-one", str(len(repeated)).encode()),
+                    (b"server-timing", f'db;dur={queries.total_ms:.1f};desc="{queries.count} queries"'.encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.add_headers else send)
+        finally:
+            query_stats.observe(route_label(scope), queries)
@@ -0,0 +1,51 @@
+"""
+ASGI middleware timing every HTTP request (see utils.request_metrics).
+
+The duration runs from the request arriving to the last body chunk being
+sent, so streaming responses count in full. Requests slower than
+SLOW_REQUEST_MS are also logged with their route and status.
+"""
+import logging
+import os
+import time
+
+from utils.request_metrics import request_metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+
+
+class RequestTimingMiddleware:
+    def __init__(self, app, metrics=request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            duration = time.perf_counter() - started
+            # The router records the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.metrics.finish(scope["method"], route, status, duration, size)
+            if duration * 1000 > SLOW_REQUEST_MS:
+                logger.warning("Slow request: %s %s took %.0fms (status %s, %d bytes)",
+                               scope["method"], route, duration * 1000, status, size)
@@ -0,0 +1,213 @@
+"""
+Conditional GET and response caching for endpoints the app polls.
+
+Each path in CACHED_ROUTES lists the tables its response is built from. The
+response's ETag is a hash of:
+- the path and query string
+- the user
+- the current version of each of those tables (see utils.entity_versions)
+
+The ETag is known before the handler runs, so:
+- a request whose If-None-Match matches gets 304 Not Modified at the cost
+  of a few version lookups
+- with RESPONSE_CACHE_BODIES on, a request without a matching ETag (a new
+  client, another device) gets the serialized body cached in process, if
+  there is one for that ETag
+- anything else runs the handler, which adds the ETag to its 200 response
+
+The user is resolved the way the handlers' get_current_user does it
+(auth.token_cache.resolve_token_user), so the token is verified, or found
+in the verified-token cache with a fresh user snapshot, before any ETag is
+computed. A token that fails goes to the handler, which answers 401. The
+versions are read from Redis on every request, never from the in-process
+cache tier, and without Redis every request goes to the handler.
+
+Requests other than GET and HEAD flush their committed version bumps before
+their response starts, so the next poll after a write never gets a 304 for
+the old data.
+"""
+import hashlib
+import os
+from typing import Dict, Optional, Tuple
+
+from jose import JWTError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from auth.token_cache import resolve_token_user
+from database import ReadSessionLocal
+from utils.cache import LocalCache, redis_cache
+from utils.entity_versions import entity_versions
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+# Also keep serialized 200 bodies in process, keyed by ETag
+RESPONSE_CACHE_BODIES = os.getenv("RESPONSE_CACHE_BODIES", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+# Larger bodies are still answered with an ETag, just not kept
+RESPONSE_CACHE_MAX_BODY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BODY_BYTES", "131072"))
+# A cached body is only ever served under its own ETag; this just frees memory
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+# Path -> tables the response is read from. Every table the handler reads
+# must be listed, or a change to it will be answered with 304.
+CACHED_ROUTES: Dict[str, Tuple[str, ...]] = {
+    "/api/users/me": ("users", "groups", "user_groups"),
+    "/api/message-templates/user-messages": (
+        "users",
+        "user_groups",
+        "user_message_templates",
+        "message_template_groups",
+        "message_templates",
+        "message_template_lists",
+        "target_lists",
+        "target_contacts",
+        "shared_contacts",
+        "contact_matches",
+        "sent_messages",
+    ),
+}
+
+# Revalidate on every use, and keep per-user responses out of shared caches
+CACHE_CONTROL = b"private, no-cache"
+
+WRITE_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+response_cache_stats = {
+    "not_modified": 0,
+    "body_hits": 0,
+    "misses": 0,
+    "bypassed": 0,
+    "stored": 0,
+    "too_large": 0,
+}
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match compares weakly: W/"x" matches "x"
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def _verified_user_id(token: str) -> Optional[int]:
+    """Id of the user the token belongs to, as get_current_user would resolve it (blocking)."""
+    db = ReadSessionLocal()
+    try:
+        user = resolve_token_user(db, token)
+        return user.id if user is not None else None
+    except JWTError:
+        return None
+    finally:
+        db.close()
+
+
+class ResponseCacheMiddleware:
+    def __init__(self, app, routes: Dict[str, Tuple[str, ...]] = CACHED_ROUTES, cache_bodies: bool = RESPONSE_CACHE_BODIES):
+        self.app = app
+        self.routes = routes
+        self.bodies = LocalCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES) if cache_bodies else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] not in WRITE_SAFE_METHODS:
+            await self.app(scope, receive, self._flush_before_response(send))
+            return
+
+        tables = self.routes.get(scope["path"]) if scope["method"] == "GET" else None
+        if tables is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        token = self._bearer_token(headers)
+        user_id = await run_in_threadpool(_verified_user_id, token) if token and redis_cache.available else None
+        etag = await self._etag(scope, user_id, tables) if user_id is not None else None
+        if etag is None:
+            response_cache_stats["bypassed"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            response_cache_stats["not_modified"] += 1
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL)],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        cached = self.bodies.get(etag) if self.bodies is not None else None
+        if cached is not None:
+            response_cache_stats["body_hits"] += 1
+            response_headers, body = cached
+            await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        response_cache_stats["misses"] += 1
+        await self.app(scope, receive, self._tag_and_store(send, etag))
+
+    def _bearer_token(self, headers: Headers) -> Optional[str]:
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token.strip():
+            return None
+        return token.strip()
+
+    async def _etag(self, scope, user_id: int, tables: Tuple[str, ...]) -> Optional[str]:
+        # Commits this worker has made but not yet bumped count too
+        await entity_versions.flush()
+        versions = await entity_versions.versions(tables)
+        if versions is None:
+            return None
+        key = b"|".join([
+            scope["path"].encode(),
+            scope.get("query_string", b""),
+            str(user_id).encode(),
+            ",".join(map(str, versions)).encode(),
+        ])
+        return f'"{hashlib.blake2b(key, digest_size=16).hexdigest()}"'
+
+    def _flush_before_response(self, send):
+        async def send_after_flush(message):
+            if message["type"] == "http.response.start":
+                await entity_versions.flush()
+            await send(message)
+        return send_after_flush
+
+    def _tag_and_store(self, send, etag: str):
+        state = {"headers": None, "chunks": [], "size": 0}
+
+        async def send_tagged(message):
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    await send(message)
+                    return
+                headers = [
+                    (name, value) for name, value in message.get("headers", [])
+                    if name.lower() not in (b"etag", b"cache-control")
+                ]
+                headers += [(b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL)]
+                state["headers"] = headers
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and state["headers"] is not None and self.bodies is not None:
+                body = message.get("body", b"")
+                state["size"] += len(body)
+                if state["size"] > RESPONSE_CACHE_MAX_BODY_BYTES:
+                    response_cache_stats["too_large"] += 1
+                    state["headers"] = None
+                    state["chunks"] = []
+                else:
+                    state["chunks"].append(body)
+                    if not message.get("more_body", False):
+                        self.bodies.set(etag, (state["headers"], b"".join(state["chunks"])), RESPONSE_CACHE_TTL)
+                        response_cache_stats["stored"] += 1
+            await send(message)
+
+        return send_tagged
@@ -1,12 +1,18 @@
 """Make shared_contact_id nullable
 
 Revision ID: 20250628212500
-Revises: 
+Revises: 3456789abcde
 Create Date: 2025-06-28 21:25:00.000000
 """
 from alembic import op
 import sqlalchemy as sa
 
+# revision identifiers, used by Alembic.
+revision = '20250628212500'
+down_revision = '3456789abcde'
+branch_labels = None
+depends_on = None
+
 
 def upgrade():
     # Alter the shared_contact_id column to be nullable
@@ -0,0 +1,100 @@
+"""Convert sent_messages references to integer foreign keys
+
+Revision ID: 20251019090000
+Revises: 20250628212500
+Create Date: 2025-10-19 09:00:00.000000
+
+message_template_id, shared_contact_id and target_contact_id were stored as
+strings, so every join went through CAST and no index could be used. This
+converts them to integer foreign keys, removes duplicate sends and adds the
+composite indexes used by the sent-message lookups.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019090000'
+down_revision = '20250628212500'
+branch_labels = None
+depends_on = None
+
+REFERENCE_COLUMNS = ('message_template_id', 'shared_contact_id', 'target_contact_id')
+
+
+def _not_integer(column):
+    """SQL predicate matching values that cannot be cast to an integer."""
+    if op.get_bind().dialect.name == 'postgresql':
+        return f"{column} !~ '^[0-9]+$'"
+    return f"({column} = '' OR {column} GLOB '*[^0-9]*')"
+
+
+def upgrade():
+    # Rows without a usable template reference cannot be kept
+    op.execute(
+        "DELETE FROM sent_messages WHERE message_template_id IS NULL OR "
+        + _not_integer('message_template_id')
+    )
+    # Contact references that are not integers are dropped to NULL
+    for column in ('shared_contact_id', 'target_contact_id'):
+        op.execute(f"UPDATE sent_messages SET {column} = NULL WHERE " + _not_integer(column))
+
+    # Keep the earliest send for each (user, template, shared contact)
+    op.execute("""
+        DELETE FROM sent_messages
+        WHERE shared_contact_id IS NOT NULL
+          AND id NOT IN (
+            SELECT MIN(id) FROM sent_messages
+            WHERE shared_contact_id IS NOT NULL
+            GROUP BY user_id, message_template_id, shared_contact_id
+          )
+    """)
+
+    with op.batch_alter_table('sent_messages') as batch_op:
+        for column in REFERENCE_COLUMNS:
+            batch_op.alter_column(
+                column,
+                existing_type=sa.String(),
+                type_=sa.Integer(),
+                postgresql_using=f"{column}::integer"
+            )
+        batch_op.create_foreign_key(
+            'fk_sent_messages_message_template_id', 'message_templates',
+            ['message_template_id'], ['id'], ondelete='CASCADE'
+        )
+        batch_op.create_foreign_key(
+            'fk_sent_messages_shared_contact_id', 'shared_contacts',
+            ['shared_contact_id'], ['id'], ondelete='CASCADE'
+        )
+        batch_op.create_foreign_key(
+            'fk_sent_messages_target_contact_id', 'target_contacts',
+            ['target_contact_id'], ['id'], ondelete='CASCADE'
+        )
+        batch_op.create_unique_constraint(
+            'uq_sent_messages_user_template_shared',
+            ['user_id', 'message_template_id', 'shared_contact_id']
+        )
+
+    for column in REFERENCE_COLUMNS:
+        op.create_index(f'ix_sent_messages_{column}', 'sent_messages', [column])
+    op.create_index(
+        'ix_sent_messages_user_template_target', 'sent_messages',
+        ['user_id', 'message_template_id', 'target_contact_id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_sent_messages_user_template_target', table_name='sent_messages')
+    for column in REFERENCE_COLUMNS:
+        op.drop_index(f'ix_sent_messages_{column}', table_name='sent_messages')
+
+    with op.batch_alter_table('sent_messages') as batch_op:
+        batch_op.drop_constraint('uq_sent_messages_user_template_shared', type_='unique')
+        batch_op.drop_constraint('fk_sent_messages_target_contact_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_sent_messages_shared_contact_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_sent_messages_message_template_id', type_='foreignkey')
+        for column in REFERENCE_COLUMNS:
+            batch_op.alter_column(
+                column,
+                existing_type=sa.Integer(),
+                type_=sa.String()
+            )
@@ -0,0 +1,42 @@
+"""Add sent_counts counters table
+
+Revision ID: 20251019100000
+Revises: 20251019090000
+Create Date: 2025-10-19 10:00:00.000000
+
+Per (template, user, day) send counters, maintained alongside every
+sent_messages insert. Backfilled once from the existing rows.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019100000'
+down_revision = '20251019090000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sent_counts',
+        sa.Column('template_id', sa.Integer(), sa.ForeignKey('message_templates.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('day', sa.Date(), primary_key=True),
+        sa.Column('n', sa.Integer(), nullable=False, server_default='0'),
+    )
+    op.create_index('ix_sent_counts_user_template', 'sent_counts', ['user_id', 'template_id'])
+
+    # Backfill from existing sends
+    op.execute("""
+        INSERT INTO sent_counts (template_id, user_id, day, n)
+        SELECT message_template_id, user_id, DATE(sent_at), COUNT(*)
+        FROM sent_messages
+        WHERE sent_at IS NOT NULL
+        GROUP BY message_template_id, user_id, DATE(sent_at)
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_sent_counts_user_template', table_name='sent_counts')
+    op.drop_table('sent_counts')
@@ -0,0 +1,28 @@
+"""Add keyset pagination indexes to sent_messages
+
+Revision ID: 20251019110000
+Revises: 20251019100000
+Create Date: 2025-10-19 11:00:00.000000
+
+The sent messages listing pages on (sent_at, id), either across the whole
+table (admins) or for a single user. These indexes let each page start with
+an index seek instead of sorting the table.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019110000'
+down_revision = '20251019100000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_sent_messages_sent_at_id', 'sent_messages', ['sent_at', 'id'])
+    op.create_index('ix_sent_messages_user_sent_at_id', 'sent_messages', ['user_id', 'sent_at', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_sent_messages_user_sent_at_id', table_name='sent_messages')
+    op.drop_index('ix_sent_messages_sent_at_id', table_name='sent_messages')
@@ -0,0 +1,79 @@
+"""Add normalized users.email_lower with a unique index
+
+Revision ID: 20251019120000
+Revises: 20251019110000
+Create Date: 2025-10-19 12:00:00.000000
+
+Login looked users up with an exact email match and fell back to
+email ILIKE '%...%', a full table scan that could also match the wrong
+account. email_lower holds the trimmed, lowercased email and is the only
+column lookups use, so a case-mismatched login is one index probe.
+
+Accounts whose emails differ only by case or surrounding spaces would share
+an email_lower; the upgrade refuses to run until they are resolved.
+
+Both the duplicate check and the backfill use models.user.normalize_email,
+the function lookups normalize with. SQL LOWER(TRIM(...)) would disagree
+with it: SQLite's LOWER leaves non-ASCII letters alone and TRIM strips only
+spaces.
+"""
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.user import normalize_email
+
+# revision identifiers, used by Alembic.
+revision = '20251019120000'
+down_revision = '20251019110000'
+branch_labels = None
+depends_on = None
+
+
+def _emails(conn):
+    """email_lower -> [(id, email)] for every account with an email."""
+    accounts = defaultdict(list)
+    for user_id, email in conn.execute(sa.text("SELECT id, email FROM users WHERE email IS NOT NULL ORDER BY id")):
+        accounts[normalize_email(email)].append((user_id, email))
+    return accounts
+
+
+def _case_duplicates(accounts):
+    """(email_lower, id, email) for every account sharing its normalized email with another."""
+    return [
+        (email_lower, user_id, email)
+        for email_lower, same in sorted(accounts.items()) if len(same) > 1
+        for user_id, email in same
+    ]
+
+
+def upgrade():
+    # Emails differing only by case cannot share the unique index, and
+    # picking one of the accounts would lock the others out. Stop before
+    # changing anything so an admin can merge or rename them first.
+    conn = op.get_bind()
+    accounts = _emails(conn)
+    duplicates = _case_duplicates(accounts)
+    if duplicates:
+        listing = "\n".join(f"  {email_lower}: user {user_id} ({email})" for email_lower, user_id, email in duplicates)
+        raise RuntimeError(
+            "Cannot add users.email_lower: these accounts have emails that differ only by case or "
+            f"surrounding spaces:\n{listing}\nMerge or rename them, then run the upgrade again."
+        )
+
+    op.add_column('users', sa.Column('email_lower', sa.String(), nullable=True))
+
+    if accounts:
+        conn.execute(sa.text("UPDATE users SET email_lower = :email_lower WHERE id = :id"), [
+            {"id": user_id, "email_lower": email_lower}
+            for email_lower, ((user_id, _),) in accounts.items()
+        ])
+
+    op.create_index('ix_users_email_lower', 'users', ['email_lower'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_users_email_lower', table_name='users')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('email_lower')
@@ -0,0 +1,70 @@
+"""Add indexes for the hot filters on matches, target contacts and groups
+
+Revision ID: 20251019130000
+Revises: 20251019120000
+Create Date: 2025-10-19 13:00:00.000000
+
+Matching, neighbor contacts, voter removal, the user messages page and the
+users list all filtered on columns without an index and scanned the whole
+table on every call:
+- contact_matches gets (shared_contact_id, target_list_id) and
+  (target_list_id, shared_contact_id), so each direction is a covering
+  seek. It also gets (target_contact_id), for removing target contacts.
+- target_contacts gets (list_id, zip_code) and one (list_id, phone column)
+  index per phone field. find_phone_matches seeks each of them and unions
+  the results. These indexes are the bulk of the extra write cost on
+  import.
+- user_groups gets (user_id, group_id), which covers a user's groups.
+- user_message_templates gets (template_id, user_id). Every template load
+  fetches the template's assignments and users by template_id.
+
+sent_messages (user_id, message_template_id) and user_message_templates
+(user_id) lookups already use the leading columns of
+uq_sent_messages_user_template_shared and idx_user_template.
+
+Databases built by create_all already have these indexes, so existing ones
+are skipped. The downgrade likewise drops only the ones present.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019130000'
+down_revision = '20251019120000'
+branch_labels = None
+depends_on = None
+
+PHONE_COLUMNS = ('cell_1', 'cell_2', 'cell_3', 'landline_1', 'landline_2', 'landline_3')
+
+INDEXES = [
+    ('ix_contact_matches_shared_list', 'contact_matches', ['shared_contact_id', 'target_list_id']),
+    ('ix_contact_matches_list_shared', 'contact_matches', ['target_list_id', 'shared_contact_id']),
+    ('ix_contact_matches_target_contact', 'contact_matches', ['target_contact_id']),
+    ('ix_target_contacts_list_zip', 'target_contacts', ['list_id', 'zip_code']),
+    *((f'ix_target_contacts_list_{column}', 'target_contacts', ['list_id', column]) for column in PHONE_COLUMNS),
+    ('ix_user_groups_user_group', 'user_groups', ['user_id', 'group_id']),
+    ('ix_user_message_templates_template_user', 'user_message_templates', ['template_id', 'user_id']),
+]
+
+
+def _existing_indexes():
+    """table -> names of the indexes it has now, for every table in INDEXES."""
+    inspector = sa.inspect(op.get_bind())
+    return {
+        table: {index['name'] for index in inspector.get_indexes(table)}
+        for table in {table for _, table, _ in INDEXES}
+    }
+
+
+def upgrade():
+    existing = _existing_indexes()
+    for name, table, columns in INDEXES:
+        if name not in existing[table]:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    existing = _existing_indexes()
+    for name, table, _ in reversed(INDEXES):
+        if name in existing[table]:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,62 @@
+"""Keep sent messages when their contact is deleted
+
+Revision ID: 20251019140000
+Revises: 20251019130000
+Create Date: 2025-10-19 14:00:00.000000
+
+sent_messages.shared_contact_id and target_contact_id were created with
+ON DELETE CASCADE. Sent messages are the send history, so deleting a
+contact (deduplication, voter removal, deleting a target list) must not
+erase them. Both references become ON DELETE SET NULL; both columns are
+already nullable.
+
+Databases built by create_all on SQLite have unnamed foreign keys. Batch
+mode names them by the convention below so they can be dropped.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019140000'
+down_revision = '20251019130000'
+branch_labels = None
+depends_on = None
+
+# Column -> referenced table
+CONTACT_REFERENCES = (
+    ('shared_contact_id', 'shared_contacts'),
+    ('target_contact_id', 'target_contacts'),
+)
+
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s"}
+
+
+def _foreign_key_names(table):
+    """Column -> name of the foreign key on it, by the naming convention when unnamed."""
+    names = {}
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        column = fk['constrained_columns'][0]
+        names[column] = fk.get('name') or NAMING_CONVENTION['fk'] % {
+            'table_name': table, 'column_0_name': column
+        }
+    return names
+
+
+def _replace_contact_foreign_keys(ondelete):
+    names = _foreign_key_names('sent_messages')
+    with op.batch_alter_table('sent_messages', naming_convention=NAMING_CONVENTION) as batch_op:
+        for column, referred_table in CONTACT_REFERENCES:
+            if column in names:
+                batch_op.drop_constraint(names[column], type_='foreignkey')
+            batch_op.create_foreign_key(
+                f'fk_sent_messages_{column}', referred_table,
+                [column], ['id'], ondelete=ondelete
+            )
+
+
+def upgrade():
+    _replace_contact_foreign_keys('SET NULL')
+
+
+def downgrade():
+    _replace_contact_foreign_keys('CASCADE')
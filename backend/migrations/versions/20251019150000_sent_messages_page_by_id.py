@@ -0,0 +1,31 @@
+"""Page sent_messages on id
+
+Revision ID: 20251019150000
+Revises: 20251019140000
+Create Date: 2025-10-19 15:00:00.000000
+
+The sent messages listing now pages on id alone: sent_at used to be
+stamped before the row was committed, so a row could land behind a cursor
+already handed out. The whole-table listing walks the primary key, and a
+single user's listing needs (user_id, id) in place of (user_id, sent_at, id).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019150000'
+down_revision = '20251019140000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_sent_messages_user_id_id', 'sent_messages', ['user_id', 'id'])
+    op.drop_index('ix_sent_messages_user_sent_at_id', table_name='sent_messages')
+    op.drop_index('ix_sent_messages_sent_at_id', table_name='sent_messages')
+
+
+def downgrade():
+    op.create_index('ix_sent_messages_sent_at_id', 'sent_messages', ['sent_at', 'id'])
+    op.create_index('ix_sent_messages_user_sent_at_id', 'sent_messages', ['user_id', 'sent_at', 'id'])
+    op.drop_index('ix_sent_messages_user_id_id', table_name='sent_messages')
@@ -0,0 +1,74 @@
+"""Unique neighbor sends
+
+Revision ID: 20251019160000
+Revises: 20251019150000
+Create Date: 2025-10-19 16:00:00.000000
+
+Neighbor sends (target_contact_id set, shared_contact_id NULL) had no
+unique key, so a retried send arriving in a later batch was inserted and
+counted again. The (user_id, message_template_id, target_contact_id) index
+becomes unique for rows with a target contact. Existing duplicates are
+removed first, keeping the earliest, and taken off sent_counts.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20251019160000'
+down_revision = '20251019150000'
+branch_labels = None
+depends_on = None
+
+TARGET_SET = sa.text('target_contact_id IS NOT NULL')
+
+# Neighbor sends repeating an earlier send's (user, template, target contact)
+DUPLICATES = """
+    FROM sent_messages AS s
+    WHERE s.target_contact_id IS NOT NULL AND EXISTS (
+        SELECT 1 FROM sent_messages AS kept
+        WHERE kept.user_id = s.user_id
+          AND kept.message_template_id = s.message_template_id
+          AND kept.target_contact_id = s.target_contact_id
+          AND kept.id < s.id
+    )
+"""
+
+
+def _remove_duplicates():
+    conn = op.get_bind()
+    # Sends without a timestamp were never counted (see the sent_counts backfill)
+    counted = conn.execute(sa.text(f"""
+        SELECT s.message_template_id, s.user_id, DATE(s.sent_at), COUNT(*)
+        {DUPLICATES} AND s.sent_at IS NOT NULL
+        GROUP BY s.message_template_id, s.user_id, DATE(s.sent_at)
+    """)).all()
+    if counted:
+        conn.execute(sa.text(
+            "UPDATE sent_counts SET n = n - :n "
+            "WHERE template_id = :template_id AND user_id = :user_id AND day = :day"
+        ), [
+            {"template_id": template_id, "user_id": user_id, "day": day, "n": n}
+            for template_id, user_id, day, n in counted
+        ])
+        conn.execute(sa.text("DELETE FROM sent_counts WHERE n <= 0"))
+    ids = conn.execute(sa.text(f"SELECT s.id {DUPLICATES}")).scalars().all()
+    if ids:
+        conn.execute(sa.text("DELETE FROM sent_messages WHERE id = :id"), [{"id": id_} for id_ in ids])
+
+
+def upgrade():
+    _remove_duplicates()
+    op.create_index(
+        'uq_sent_messages_user_template_target', 'sent_messages',
+        ['user_id', 'message_template_id', 'target_contact_id'],
+        unique=True, sqlite_where=TARGET_SET, postgresql_where=TARGET_SET,
+    )
+    op.drop_index('ix_sent_messages_user_template_target', table_name='sent_messages')
+
+
+def downgrade():
+    op.create_index(
+        'ix_sent_messages_user_template_target', 'sent_messages',
+        ['user_id', 'message_template_id', 'target_contact_id']
+    )
+    op.drop_index('uq_sent_messages_user_template_target', table_name='sent_messages')
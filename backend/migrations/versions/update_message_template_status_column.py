@@ -1,7 +1,7 @@
 """Update message template status column
 
 Revision ID: 123456789abc
-Revises: fde0b719fcbe
+Revises:
 Create Date: 2025-06-26 22:15:00.000000
 
 """
@@ -10,7 +10,8 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision = '123456789abc'
-down_revision = 'fde0b719fcbe'
+# First revision kept in this tree; the scripts before it were never committed
+down_revision = None
 branch_labels = None
 depends_on = None
 
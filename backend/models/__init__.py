@@ -14,6 +14,7 @@ from .shared_contact import SharedContact
 from .contacts.campaign_contact import CampaignContact
 from .contact_match import ContactMatch
 from .sent_message import SentMessage
+from .sent_count import SentCount
 from .identification.id_question import IdQuestion
 from .identification.id_answer import IdAnswer
 # ContactList model has been removed, using TargetList instead
@@ -44,6 +45,7 @@ __all__ = [
     'Group',
     'UserGroup',
     'SentMessage',
+    'SentCount',
     'IdQuestion',
     'IdAnswer',
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Index
 from sqlalchemy.sql import func
 from datetime import datetime
 
@@ -15,3 +15,12 @@ class ContactMatch(Base):
     match_score = Column(Float, nullable=True)
     match_confidence = Column(String(20), nullable=False)  # 'high', 'medium', 'low'
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # A shared contact's matches, optionally within some lists
+        Index("ix_contact_matches_shared_list", "shared_contact_id", "target_list_id"),
+        # Which shared contacts a list already matched
+        Index("ix_contact_matches_list_shared", "target_list_id", "shared_contact_id"),
+        # Removing target contacts removes their matches
+        Index("ix_contact_matches_target_contact", "target_contact_id"),
+    )
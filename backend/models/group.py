@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -36,7 +36,8 @@ class UserGroup(Base):
     user = relationship("User", back_populates="user_groups")
     group = relationship("Group", back_populates="user_groups")
     
-    # Add a unique constraint on the combination of user_id and group_id
     __table_args__ = (
+        # A user's groups; group_id makes it covering
+        Index('ix_user_groups_user_group', 'user_id', 'group_id'),
         {'sqlite_autoincrement': True},
     )
@@ -16,6 +16,8 @@ class UserMessageTemplate(Base):
     # Add a unique constraint on user_id and template_id
     __table_args__ = (
         Index('idx_user_template', 'user_id', 'template_id', unique=True),
+        # Loading a template's assignments and users goes the other way
+        Index('ix_user_message_templates_template_user', 'template_id', 'user_id'),
         {'extend_existing': True}
     )
     
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, Index
+
+from models.base import Base
+
+class SentCount(Base):
+    """
+    Number of messages a user sent for a template on a given day.
+
+    Maintained in the same transaction as each sent_messages insert, so
+    template totals, leaderboards and progress views never have to scan
+    sent_messages.
+    """
+    __tablename__ = "sent_counts"
+
+    template_id = Column(Integer, ForeignKey("message_templates.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    n = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Per-user progress; per-template totals use the primary key prefix
+        Index("ix_sent_counts_user_template", "user_id", "template_id"),
+    )
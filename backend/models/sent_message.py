@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
@@ -7,26 +7,38 @@ class SentMessage(Base):
     __tablename__ = "sent_messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    message_template_id = Column(String, nullable=False)
-    shared_contact_id = Column(String, nullable=True)  # Changed to nullable for neighbor messages
-    target_contact_id = Column(String, nullable=True)  # New field for neighbor messages
+    message_template_id = Column(Integer, ForeignKey("message_templates.id", ondelete="CASCADE"), nullable=False, index=True)
+    shared_contact_id = Column(Integer, ForeignKey("shared_contacts.id", ondelete="SET NULL"), nullable=True, index=True)  # Nullable for neighbor messages
+    target_contact_id = Column(Integer, ForeignKey("target_contacts.id", ondelete="SET NULL"), nullable=True, index=True)  # Set for neighbor messages
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     sent_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # A user sends a given template to a given shared contact at most once.
+        # Also serves (user_id) and (user_id, message_template_id) lookups as a prefix.
+        UniqueConstraint("user_id", "message_template_id", "shared_contact_id", name="uq_sent_messages_user_template_shared"),
+        # Likewise for neighbor sends to a target contact. Partial, since shared
+        # contact sends leave target_contact_id NULL.
+        Index(
+            "uq_sent_messages_user_template_target", "user_id", "message_template_id", "target_contact_id",
+            unique=True,
+            sqlite_where=text("target_contact_id IS NOT NULL"),
+            postgresql_where=text("target_contact_id IS NOT NULL"),
+        ),
+        # Keyset pagination of one user's sent messages on id; the admin
+        # listing pages on the primary key
+        Index("ix_sent_messages_user_id_id", "user_id", "id"),
+    )
+
     # Relationship to User
     user = relationship("User", backref="sent_messages")
 
-    from sqlalchemy import cast, Integer, ForeignKey
     shared_contact = relationship(
         "SharedContact",
-        primaryjoin="cast(SentMessage.shared_contact_id, Integer)==SharedContact.id",
-        foreign_keys=[shared_contact_id],
         back_populates="sent_messages"
     )
 
     target_contact = relationship(
         "TargetContact",
-        primaryjoin="cast(SentMessage.target_contact_id, Integer)==TargetContact.id",
-        foreign_keys=[target_contact_id]
-        # Removed back_populates since we'll define it in TargetContact
+        back_populates="sent_messages"
     )
@@ -27,12 +27,10 @@ class SharedContact(Base):
 
     # Relationship with CampaignContact
     campaign_contacts = relationship("CampaignContact", back_populates="matched_shared_contact")
-    from models.sent_message import SentMessage
     sent_messages = relationship(
         "SentMessage",
         back_populates="shared_contact",
-        primaryjoin="SharedContact.id==cast(SentMessage.shared_contact_id, Integer)",
-        foreign_keys=[SentMessage.shared_contact_id]
+        passive_deletes=True
     )
 
     @property
@@ -1,9 +1,11 @@
-from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, ForeignKey, Float
+from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from models.base import Base
 
+PHONE_COLUMNS = ("cell_1", "cell_2", "cell_3", "landline_1", "landline_2", "landline_3")
+
 class TargetContact(Base):
     __tablename__ = "target_contacts"
     __allow_unmapped__ = True
@@ -43,10 +45,17 @@ class TargetContact(Base):
     is_matched = Column(Boolean, default=False)
     match_confidence = Column(String(20), nullable=True)  # 'high', 'medium', 'low'
     match_score = Column(Float, nullable=True)
-    
+
+    __table_args__ = (
+        # Neighbor contacts: a message's lists within the sender's zip code
+        Index("ix_target_contacts_list_zip", "list_id", "zip_code"),
+        # Phone matching seeks each phone column within one list
+        *(Index(f"ix_target_contacts_list_{column}", "list_id", column) for column in PHONE_COLUMNS),
+    )
+
     # Relationship to SentMessage
     sent_messages = relationship(
         "SentMessage",
-        primaryjoin="cast(TargetContact.id, String)==SentMessage.target_contact_id",
-        foreign_keys="[SentMessage.target_contact_id]"
+        back_populates="target_contact",
+        passive_deletes=True
     )
@@ -1,15 +1,23 @@
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 
 from models.base import Base
 
+
+def normalize_email(email):
+    """Canonical form used for email lookups: trimmed and lowercased."""
+    return email.strip().lower() if email is not None else None
+
+
 class User(Base):
     __tablename__ = "users"
     __allow_unmapped__ = True
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
+    # Kept in sync with email; all lookups by email go through this column
+    email_lower = Column(String, unique=True, index=True)
     password_hash = Column(String)
     first_name = Column(String)
     last_name = Column(String)
@@ -30,3 +38,8 @@ class User(Base):
     # Many-to-many relationship with Group through UserGroup
     groups = relationship("Group", secondary="user_groups", back_populates="users", viewonly=True)
     user_groups = relationship("UserGroup", back_populates="user", cascade="all, delete-orphan")
+
+    @validates("email")
+    def _sync_email_lower(self, key, value):
+        self.email_lower = normalize_email(value)
+        return value
@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 # Add the parent directory to the path so we can import our models
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.base import Base
-from models.user import User
+from models.user import User, normalize_email
 from database import get_db
 
 # Load environment variables
@@ -26,7 +26,7 @@ def update_admin_role(email: str):
     
     try:
         # Find the user by email
-        user = db.query(User).filter(User.email == email).first()
+        user = db.query(User).filter(User.email_lower == normalize_email(email)).first()
         
         if not user:
             print(f"Error: User with email {email} not found")
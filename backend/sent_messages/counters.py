@@ -0,0 +1,155 @@
+"""
+Incrementally maintained sent-message counters.
+
+sent_counts holds one row per (template_id, user_id, day). Every code path
+that inserts into sent_messages calls increment_sent_counts with the same
+connection or session, inside the same transaction, and every code path
+that deletes sends goes through delete_sent_messages, so the counters always
+agree with the rows they summarize. Readers aggregate this small table
+instead of running GROUP BY over sent_messages.
+
+Rows the database removes by itself need nothing: deleting a template or a
+user cascades to its counters as well as to its sends.
+"""
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, bindparam, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models.sent_count import SentCount
+from models.sent_message import SentMessage
+
+CountKey = Tuple[int, int, date]  # (template_id, user_id, day)
+
+_dialect_inserts = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def increment_sent_counts(conn, sends: Iterable[Tuple[int, int, datetime]]):
+    """
+    Add newly inserted sends to the counters.
+
+    Args:
+        conn: Connection or Session already inside the insert's transaction
+        sends: (template_id, user_id, sent_at) for each row actually inserted
+    """
+    increments = Counter(
+        (template_id, user_id, sent_at.date())
+        for template_id, user_id, sent_at in sends
+    )
+    if not increments:
+        return
+
+    table = SentCount.__table__
+    dialect = conn.get_bind().dialect if isinstance(conn, Session) else conn.dialect
+    stmt = _dialect_inserts[dialect.name](table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.template_id, table.c.user_id, table.c.day],
+        set_={"n": table.c.n + stmt.excluded.n},
+    )
+    conn.execute(stmt, [
+        {"template_id": template_id, "user_id": user_id, "day": day, "n": n}
+        for (template_id, user_id, day), n in increments.items()
+    ])
+
+
+def decrement_sent_counts(conn, sends: Iterable[Tuple[int, int, Optional[datetime]]]):
+    """
+    Take deleted sends off the counters, dropping counters that reach zero.
+
+    Args:
+        conn: Connection or Session already inside the delete's transaction
+        sends: (template_id, user_id, sent_at) for each row actually deleted
+    """
+    # Sends without a timestamp were never counted (see the backfill)
+    decrements = Counter(
+        (template_id, user_id, sent_at.date())
+        for template_id, user_id, sent_at in sends
+        if sent_at is not None
+    )
+    if not decrements:
+        return
+
+    table = SentCount.__table__
+    key = and_(
+        table.c.template_id == bindparam("k_template_id"),
+        table.c.user_id == bindparam("k_user_id"),
+        table.c.day == bindparam("k_day"),
+    )
+    params = [
+        {"k_template_id": template_id, "k_user_id": user_id, "k_day": day, "k_n": n}
+        for (template_id, user_id, day), n in decrements.items()
+    ]
+    conn.execute(table.update().where(key).values(n=table.c.n - bindparam("k_n")), params)
+    conn.execute(table.delete().where(key).where(table.c.n <= 0), params)
+
+
+def delete_sent_messages(conn, *criteria) -> int:
+    """
+    Delete the sends matching criteria and take them off the counters.
+
+    Runs in the caller's transaction; the caller commits. Returns the number
+    of sends deleted.
+    """
+    sends = conn.execute(
+        select(SentMessage.message_template_id, SentMessage.user_id, SentMessage.sent_at).where(*criteria)
+    ).all()
+    if not sends:
+        return 0
+    conn.execute(delete(SentMessage).where(*criteria))
+    decrement_sent_counts(conn, sends)
+    return len(sends)
+
+
+def get_template_sent_counts(db: Session, template_ids: List[int]) -> Dict[int, int]:
+    """Total sends per template, read from the counters."""
+    if not template_ids:
+        return {}
+    rows = db.query(SentCount.template_id, func.sum(SentCount.n))\
+        .filter(SentCount.template_id.in_(template_ids))\
+        .group_by(SentCount.template_id)\
+        .all()
+    return {template_id: int(total) for template_id, total in rows}
+
+
+GROUP_COLUMNS = {
+    "template": SentCount.template_id,
+    "user": SentCount.user_id,
+    "day": SentCount.day,
+}
+
+
+def query_sent_counts(
+    db: Session,
+    group_by: List[str],
+    template_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> List[Dict]:
+    """
+    Aggregate the counters for dashboards (leaderboards, progress by day).
+
+    group_by is any combination of "template", "user" and "day".
+    """
+    columns = [GROUP_COLUMNS[name].label(f"{name}_id" if name != "day" else "day") for name in group_by]
+    query = db.query(*columns, func.sum(SentCount.n).label("sent_count"))
+    if template_id is not None:
+        query = query.filter(SentCount.template_id == template_id)
+    if user_id is not None:
+        query = query.filter(SentCount.user_id == user_id)
+    if since is not None:
+        query = query.filter(SentCount.day >= since)
+    if until is not None:
+        query = query.filter(SentCount.day <= until)
+    if columns:
+        query = query.group_by(*columns).order_by(func.sum(SentCount.n).desc())
+    return [
+        {**row._asdict(), "sent_count": int(row.sent_count or 0)}
+        for row in query.all()
+    ]
@@ -0,0 +1,235 @@
+"""
+Write-behind ingestion for sent-message events.
+
+During a push hundreds of volunteers mark messages as sent at the same time.
+Committing each event on its own means one fsync per tap against SQLite's
+single writer. Instead, events are buffered and flushed together: every
+FLUSH_INTERVAL_MS, or as soon as BATCH_SIZE events are waiting, whichever
+comes first. Each flush is one unit of insert-or-ignore statements on the
+shared writer (utils.db_writer) against the (user_id, message_template_id,
+shared_contact_id) unique key, so the commit cost is shared by the whole
+batch and duplicates are dropped by the database. Neighbor sends carry a
+target_contact_id instead of a shared contact and go through the same
+batches, against the partial (user_id, message_template_id,
+target_contact_id) unique key.
+
+Callers await the flush of their event, so a send is only acknowledged once
+it is durable. Identical events submitted before the flush share the same
+pending write.
+
+Batches commit one after another, and a batch draws its ids and stamps
+sent_at only once the previous one has committed, so both the ids and sent_at
+become visible in increasing order and the listing can page on them. On
+SQLite that order comes from the database-wide write lock the writer takes
+with BEGIN IMMEDIATE, across every process. On PostgreSQL the writer applies
+several groups at once and every worker process has its own buffer, so each
+batch first takes a transaction-level advisory lock, held until its group
+commits. The guarantee covers only rows inserted by _insert_events.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from utils.bulk import insert_or_ignore
+from utils.db_writer import db_writer
+from models.sent_message import SentMessage
+from .counters import increment_sent_counts
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL_MS = int(os.getenv("SENT_MESSAGE_FLUSH_INTERVAL_MS", "5"))
+BATCH_SIZE = int(os.getenv("SENT_MESSAGE_BATCH_SIZE", "100"))
+
+# pg_advisory_xact_lock key serializing sent-message batches across connections and processes
+SENT_MESSAGES_LOCK_KEY = 7_204_311_001
+
+# (user_id, message_template_id, shared_contact_id, target_contact_id)
+EventKey = Tuple[int, int, Optional[int], Optional[int]]
+
+
+class UnknownReference(Exception):
+    """The event points at a template or contact that does not exist."""
+
+
+class SentMessageBuffer:
+    """Buffers sent-message events and writes them in group-committed batches."""
+
+    def __init__(self, flush_interval_ms: int = FLUSH_INTERVAL_MS, batch_size: int = BATCH_SIZE):
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.stats = {"events": 0, "coalesced": 0, "batches": 0, "inserted": 0, "ignored": 0, "rejected": 0, "errors": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._events: List[EventKey] = []
+        self._pending: Dict[EventKey, asyncio.Future] = {}
+        self._has_events: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+
+    def _ensure_started(self):
+        """Start the flush task on the running loop (restarting it if the loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._events = []
+        self._pending = {}
+        self._has_events = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    async def submit(
+        self,
+        user_id: int,
+        message_template_id: int,
+        shared_contact_id: Optional[int] = None,
+        target_contact_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Queue a sent event and wait until its batch is committed.
+
+        Returns a dict with "inserted" set to False when the send was already
+        recorded (in the database or by a concurrent identical request).
+        """
+        self._ensure_started()
+        self.stats["events"] += 1
+        key = (user_id, message_template_id, shared_contact_id, target_contact_id)
+
+        future = self._pending.get(key)
+        if future is not None:
+            # Same event is already waiting for the next flush
+            self.stats["coalesced"] += 1
+            result = await asyncio.shield(future)
+            return {**result, "inserted": False}
+
+        future = self._loop.create_future()
+        self._pending[key] = future
+        self._events.append(key)
+        self._has_events.set()
+        if len(self._events) >= self.batch_size:
+            self._batch_full.set()
+        return await asyncio.shield(future)
+
+    async def _run(self):
+        while True:
+            await self._has_events.wait()
+            if len(self._events) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Sent message flush loop error: {e}")
+
+    async def flush(self):
+        """Write up to one batch of buffered events in a single transaction."""
+        batch = self._events[:self.batch_size]
+        self._events = self._events[self.batch_size:]
+        if not self._events:
+            self._has_events.clear()
+        if len(self._events) < self.batch_size:
+            self._batch_full.clear()
+        if not batch:
+            return
+
+        start_time = time.time()
+        try:
+            results = await _write_batch(batch)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Failed to flush {len(batch)} sent messages: {e}")
+            for key in batch:
+                future = self._pending.pop(key, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        inserted = sum(1 for result in results if result["inserted"])
+        rejected = sum(1 for result in results if result.get("error"))
+        self.stats["batches"] += 1
+        self.stats["inserted"] += inserted
+        self.stats["rejected"] += rejected
+        self.stats["ignored"] += len(results) - inserted - rejected
+        for key, result in zip(batch, results):
+            future = self._pending.pop(key, None)
+            if future is not None and not future.done():
+                if result.get("error"):
+                    future.set_exception(UnknownReference(result["error"]))
+                else:
+                    future.set_result(result)
+
+        elapsed = (time.time() - start_time) * 1000
+        logger.debug(f"Flushed {len(batch)} sent messages ({inserted} new) in {elapsed:.2f}ms")
+
+    async def close(self):
+        """Flush everything still buffered and stop the flush task."""
+        if self._task is None:
+            return
+        while self._events:
+            await self.flush()
+        self._task.cancel()
+        self._task = None
+
+
+async def _write_batch(batch: List[EventKey]) -> List[Dict[str, Any]]:
+    """Insert a batch of events in one transaction, reporting which were new."""
+    return await db_writer.submit(_insert_events, batch)
+
+
+def _insert_events(conn, batch: List[EventKey]) -> List[Dict[str, Any]]:
+    if conn.dialect.name == "postgresql":
+        # Wait for batches of other groups and workers to commit first; the
+        # lock is released only when this group commits
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SENT_MESSAGES_LOCK_KEY})
+        # Stamped after the lock, from the server's clock shared by every worker
+        sent_at = conn.execute(text("SELECT CAST(clock_timestamp() AT TIME ZONE 'UTC' AS timestamp)")).scalar()
+    else:
+        sent_at = datetime.utcnow()
+    # RETURNING yields the new id, or no row when the event was a duplicate
+    stmt = insert_or_ignore(conn, SentMessage.__table__).returning(SentMessage.__table__.c.id)
+    # SQLite undoes only a failed statement; PostgreSQL aborts the transaction
+    # unless the statement ran in its own savepoint
+    per_row_savepoint = conn.dialect.name != "sqlite"
+    results = []
+    for user_id, message_template_id, shared_contact_id, target_contact_id in batch:
+        try:
+            with conn.begin_nested() if per_row_savepoint else nullcontext():
+                new_id = conn.execute(stmt, {
+                    "user_id": user_id,
+                    "message_template_id": message_template_id,
+                    "shared_contact_id": shared_contact_id,
+                    "target_contact_id": target_contact_id,
+                    "sent_at": sent_at,
+                }).scalar()
+        except IntegrityError as e:
+            # Foreign key violation; only this row is undone, the rest of the batch commits
+            results.append({"inserted": False, "error": str(e.orig)})
+            continue
+        inserted = new_id is not None
+        results.append({
+            "id": new_id,
+            "message_template_id": message_template_id,
+            "shared_contact_id": shared_contact_id,
+            "target_contact_id": target_contact_id,
+            "user_id": user_id,
+            "sent_at": sent_at,
+            "inserted": inserted,
+        })
+    # Counters are updated in the same transaction as the inserts
+    increment_sent_counts(conn, [
+        (result["message_template_id"], result["user_id"], result["sent_at"])
+        for result in results if result["inserted"]
+    ])
+    return results
+
+
+# Process-wide buffer used by the sent messages routes
+sent_message_buffer = SentMessageBuffer()
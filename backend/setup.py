@@ -7,7 +7,8 @@ setup(
     install_requires=[
         "fastapi",
         "uvicorn",
-        "sqlalchemy",
+        "sqlalchemy[asyncio]",
+        "aiosqlite",
         "pydantic",
         "python-jose[cryptography]",
         "passlib[bcrypt]",
@@ -16,4 +17,7 @@ setup(
         "alembic",
         "bcrypt"
     ],
+    extras_require={
+        "postgres": ["psycopg[binary]", "asyncpg"],
+    },
 )
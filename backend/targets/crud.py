@@ -1,6 +1,7 @@
 import logging
 from datetime import datetime
 from typing import List, Optional, Dict, Any
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 # Set up logging
@@ -10,6 +11,7 @@ logger = logging.getLogger(__name__)
 from . import schemas
 from models.targets.target_list import TargetList
 from models.targets.target_contact import TargetContact
+from utils.bulk import copy_rows, in_values
 
 # Alias models for backward compatibility
 models = type('models', (), {
@@ -151,15 +153,27 @@ def create_target_contact(
     db.add(db_contact)
     return db_contact
 
-def bulk_create_target_contacts(
-    db: Session, 
-    contacts: List[Dict[str, Any]], 
-    list_id: int
+def update_target_list_columns(conn, list_id: int, values: Dict[str, Any]) -> None:
+    """Writer unit: update columns of one target list (import status and progress)."""
+    conn.execute(
+        update(models.TargetList.__table__)
+        .where(models.TargetList.id == list_id)
+        .values(**values)
+    )
+
+def insert_target_contacts(
+    conn,
+    contacts: List[Dict[str, Any]],
+    list_id: int,
+    progress: Dict[str, Any]
 ) -> None:
-    db.bulk_insert_mappings(
-        models.TargetContact,
+    """Writer unit: insert one import batch and record the list's progress in the same commit."""
+    copy_rows(
+        conn,
+        models.TargetContact.__table__,
         [{"list_id": list_id, **contact} for contact in contacts]
     )
+    update_target_list_columns(conn, list_id, progress)
 
 def get_target_contacts(
     db: Session,
@@ -251,12 +265,12 @@ def delete_contacts_by_voter_ids(
     if not voter_ids:
         return 0
 
-    # Query contacts to delete
-    q = db.query(models.TargetContact).filter(models.TargetContact.voter_id.in_(voter_ids))
+    # Query contacts to delete; only the keys are needed, not whole rows
+    q = db.query(models.TargetContact).filter(in_values(db, models.TargetContact.voter_id, voter_ids))
     if list_id is not None:
         q = q.filter(models.TargetContact.list_id == list_id)
 
-    contacts_to_delete = q.all()
+    contacts_to_delete = q.with_entities(models.TargetContact.id, models.TargetContact.list_id).all()
     if not contacts_to_delete:
         return 0
 
@@ -268,14 +282,18 @@ def delete_contacts_by_voter_ids(
     from models.shared_contact import SharedContact  # type: ignore
 
     shared_contact_ids = [row.shared_contact_id for row in db.query(ContactMatch.shared_contact_id)
-                          .filter(ContactMatch.target_contact_id.in_(target_contact_ids))
+                          .filter(in_values(db, ContactMatch.target_contact_id, target_contact_ids))
                           .distinct()]
 
     # Delete any ContactMatch rows linked to these target contacts
-    db.query(ContactMatch).filter(ContactMatch.target_contact_id.in_(target_contact_ids)).delete(synchronize_session=False)
+    db.query(ContactMatch).filter(
+        in_values(db, ContactMatch.target_contact_id, target_contact_ids)
+    ).delete(synchronize_session=False)
 
     # Perform bulk delete of the target contacts
-    q.delete(synchronize_session=False)
+    db.query(models.TargetContact).filter(
+        in_values(db, models.TargetContact.id, target_contact_ids)
+    ).delete(synchronize_session=False)
 
     # Update stats for affected lists
     for tl_id in affected_list_ids:
@@ -288,13 +306,13 @@ def delete_contacts_by_voter_ids(
     # Update SharedContact.matched flags
     if shared_contact_ids:
         still_matched_ids = [row.shared_contact_id for row in db.query(ContactMatch.shared_contact_id)
-                             .filter(ContactMatch.shared_contact_id.in_(shared_contact_ids))
+                             .filter(in_values(db, ContactMatch.shared_contact_id, shared_contact_ids))
                              .distinct()]
-        for sc_id in shared_contact_ids:
-            if sc_id not in still_matched_ids:
-                sc = db.query(SharedContact).get(sc_id)
-                if sc:
-                    sc.matched = False
+        unmatched_ids = set(shared_contact_ids) - set(still_matched_ids)
+        if unmatched_ids:
+            db.query(SharedContact).filter(
+                in_values(db, SharedContact.id, list(unmatched_ids))
+            ).update({SharedContact.matched: False}, synchronize_session=False)
 
     db.commit()
     return len(target_contact_ids)
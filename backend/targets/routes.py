@@ -9,6 +9,7 @@ from datetime import datetime
 # Third-party imports
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, status, BackgroundTasks, File, Form
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 # Application imports
 from database import get_db
@@ -21,6 +22,8 @@ logger = logging.getLogger(__name__)
 
 # Local imports
 from . import crud, schemas
+from utils.db_writer import db_writer
+from utils.cache import bump_namespace
 
 router = APIRouter(
     prefix="",  # Removed "/targets" prefix since it's included in main.py
@@ -56,10 +59,11 @@ def process_csv_import(
         
         print(f"Processing target list: {db_list.name} (ID: {db_list.id})")
         
-        # Update list status to processing
-        db_list.status = schemas.ImportStatus.PROCESSING
-        db.commit()
-        db.refresh(db_list)
+        # Import writes go through the shared writer so they don't hold the
+        # write lock against request traffic for the length of the import
+        db_writer.submit_from_thread(
+            crud.update_target_list_columns, list_id, {"status": schemas.ImportStatus.PROCESSING}
+        )
         print("Set list status to PROCESSING")
         
         # Read and process the CSV file
@@ -97,9 +101,10 @@ def process_csv_import(
             if missing_fields:
                 error_msg = f"Missing required field mappings: {', '.join(missing_fields)}. The Phone 1 field is required for all imports."
                 print(f"Error: {error_msg}")
-                db_list.status = schemas.ImportStatus.FAILED
-                db_list.error_message = error_msg
-                db.commit()
+                db_writer.submit_from_thread(
+                    crud.update_target_list_columns, list_id,
+                    {"status": schemas.ImportStatus.FAILED, "error_message": error_msg}
+                )
                 return
             
             # Process contacts in batches
@@ -154,14 +159,13 @@ def process_csv_import(
                     # Insert batch when it reaches the batch size
                     if len(batch) >= batch_size:
                         print(f"Inserting batch of {len(batch)} contacts...")
-                        crud.bulk_create_target_contacts(db, batch, list_id)
                         total_imported += len(batch)
+                        # Batch and progress are committed together
+                        db_writer.submit_from_thread(
+                            crud.insert_target_contacts, batch, list_id,
+                            {"imported_contacts": total_imported, "failed_contacts": total_failed}
+                        )
                         batch = []
-                        
-                        # Update progress
-                        db_list.imported_contacts = total_imported
-                        db_list.failed_contacts = total_failed
-                        db.commit()
                         print(f"Progress: {total_imported} imported, {total_failed} failed")
                         
                 except Exception as e:
@@ -169,21 +173,22 @@ def process_csv_import(
                     print(f"Error processing row {i}: {str(e)}")
                     continue
             
-            # Insert any remaining contacts
-            if batch:
-                print(f"Inserting final batch of {len(batch)} contacts...")
-                crud.bulk_create_target_contacts(db, batch, list_id)
-                total_imported += len(batch)
-            
-            # Update list status and counts
-            db_list.status = schemas.ImportStatus.COMPLETED
-            db_list.imported_contacts = total_imported
-            db_list.failed_contacts = total_failed
-            db_list.total_contacts = total_imported + total_failed
+            # Insert any remaining contacts along with the final status and counts
+            total_imported += len(batch)
+            final_values = {
+                "status": schemas.ImportStatus.COMPLETED,
+                "imported_contacts": total_imported,
+                "failed_contacts": total_failed,
+                "total_contacts": total_imported + total_failed,
+            }
             # Ensure removed_contacts is not modified during import
             if hasattr(db_list, 'removed_contacts'):
-                db_list.removed_contacts = max(0, getattr(db_list, 'removed_contacts', 0))
-            db.commit()
+                final_values["removed_contacts"] = max(0, getattr(db_list, 'removed_contacts', 0) or 0)
+            if batch:
+                print(f"Inserting final batch of {len(batch)} contacts...")
+                db_writer.submit_from_thread(crud.insert_target_contacts, batch, list_id, final_values)
+            else:
+                db_writer.submit_from_thread(crud.update_target_list_columns, list_id, final_values)
             
             print(f"Import completed successfully. Imported: {total_imported}, Failed: {total_failed}")
             
@@ -200,10 +205,12 @@ def process_csv_import(
         try:
             db.rollback()
             if 'db_list' in locals():
-                db_list.status = schemas.ImportStatus.FAILED
-                db_list.error_message = str(e)[:500]  # Truncate error message if too long
-                db.commit()
-                print(f"Updated list status to FAILED with error: {db_list.error_message}")
+                error_message = str(e)[:500]  # Truncate error message if too long
+                db_writer.submit_from_thread(
+                    crud.update_target_list_columns, list_id,
+                    {"status": schemas.ImportStatus.FAILED, "error_message": error_message}
+                )
+                print(f"Updated list status to FAILED with error: {error_message}")
         except Exception as db_error:
             print(f"Error updating database with error status: {str(db_error)}")
             
@@ -496,13 +503,29 @@ def get_contact(
         raise HTTPException(status_code=404, detail="Contact not found")
     return contact
 
+@router.put("/lists/{list_id}", response_model=schemas.TargetList)
+async def update_list(
+    list_id: int,
+    target_list: schemas.TargetListUpdate,
+    db: Session = Depends(get_db)
+):
+    db_list = await run_in_threadpool(crud.get_target_list, db, list_id)
+    if not db_list:
+        raise HTTPException(status_code=404, detail="Target list not found")
+    db_list = await run_in_threadpool(crud.update_target_list, db, db_list, target_list)
+    # Cached template lists embed list names
+    await bump_namespace('message_templates')
+    return db_list
+
 @router.delete("/lists/{list_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_list(
+async def delete_list(
     list_id: int,
     db: Session = Depends(get_db)
 ):
-    if not crud.delete_target_list(db, list_id):
+    if not await run_in_threadpool(crud.delete_target_list, db, list_id):
         raise HTTPException(status_code=404, detail="Target list not found")
+    # Cached template lists embed the lists assigned to each template
+    await bump_namespace('message_templates')
     return None
 
 @router.delete("/contacts/{contact_id}", status_code=status.HTTP_204_NO_CONTENT)
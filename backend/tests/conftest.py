@@ -0,0 +1,75 @@
+import pytest
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    Point the process-wide cache at an in-memory Redis, with an empty L1 and
+    the circuit breaker closed. Yields the fakeredis server; clients made on
+    it see the same data as the cache.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    from utils.cache import LocalCache, redis_cache
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_cache, "client", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(redis_cache, "binary_client", fakeredis.aioredis.FakeRedis(server=server))
+    monkeypatch.setattr(redis_cache, "local", LocalCache())
+    monkeypatch.setattr(redis_cache, "stats", dict.fromkeys(redis_cache.stats, 0))
+    monkeypatch.setattr(redis_cache, "breaker_open", False)
+    monkeypatch.setattr(redis_cache, "_failures", 0)
+    monkeypatch.setattr(redis_cache, "_probe_task", None)
+    monkeypatch.setattr(redis_cache, "missed_invalidations", {"keys": set(), "tags": set(), "namespaces": set()})
+    yield server
+
+
+@pytest.fixture
+def concurrent_writer_groups():
+    """
+    Apply two sent-message writer groups on separate connections, as two
+    workers would, holding the first group's commit open until the second has
+    started. Checks that the second waits and that nothing new is visible
+    meanwhile; returns the ids each group inserted.
+    """
+    import threading
+    import time
+
+    from sqlalchemy import func, select
+
+    from models.sent_message import SentMessage
+    from sent_messages.ingest import _insert_events
+    from utils.db_writer import _apply_units
+
+    def run(writer_engine, read_engine, first, second):
+        count = select(func.count()).select_from(SentMessage)
+        with read_engine.connect() as conn:
+            visible = conn.execute(count).scalar()
+        inserted, release, results = threading.Event(), threading.Event(), {}
+
+        def hold(conn):
+            inserted.set()
+            release.wait(5)
+
+        def apply(name, units):
+            with writer_engine.connect() as conn:
+                results[name] = _apply_units(conn, units)
+
+        threads = [
+            threading.Thread(target=apply, args=("first", [(_insert_events, (first,)), (hold, ())])),
+            threading.Thread(target=apply, args=("second", [(_insert_events, (second,))])),
+        ]
+        threads[0].start()
+        assert inserted.wait(5)
+        threads[1].start()
+        time.sleep(0.2)
+        try:
+            assert threads[1].is_alive()
+            with read_engine.connect() as conn:
+                assert conn.execute(count).scalar() == visible
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join(10)
+        return [[result["id"] for result in results[name][0][1]] for name in ("first", "second")]
+
+    return run
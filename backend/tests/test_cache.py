@@ -0,0 +1,464 @@
+"""
+Redis cache: the in-process LRU/TTL tier (L1) in front of Redis, tag
+invalidation, stampede control in get_or_set, the binary frames cached
+objects are stored as, and the circuit breaker that keeps the app serving
+from L1 while Redis is down.
+
+Redis is fakeredis (see the fake_redis fixture in conftest.py).
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from utils import cache
+from utils.cache import LocalCache, redis_cache
+
+
+def test_local_cache_evicts_least_recently_used():
+    local = LocalCache(max_entries=2)
+    local.set("a", 1, 60)
+    local.set("b", 2, 60)
+    assert local.get("a") == 1  # a is now the most recent
+    local.set("c", 3, 60)
+
+    assert local.get("b") is None
+    assert (local.get("a"), local.get("c")) == (1, 3)
+    assert len(local) == 2
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    local = LocalCache()
+    local.set("a", 1, 10)
+    local.set("never", 1, 0)  # A zero TTL is not kept at all
+
+    now[0] += 9.9
+    assert local.get("a") == 1
+    now[0] += 0.2
+    assert local.get("a") is None
+    assert local.get("never") is None
+    assert len(local) == 0
+
+
+def test_reads_fill_l1_no_longer_than_the_redis_ttl(fake_redis, monkeypatch):
+    async def run():
+        await redis_cache.client.set("short", "x", ex=5)
+        await redis_cache.client.set("forever", "y")
+        ttls = []
+        monkeypatch.setattr(redis_cache.local, "set", lambda key, value, ttl: ttls.append((key, ttl)))
+        await redis_cache.get("short")
+        await redis_cache.get("forever")
+        return ttls
+
+    ttls = asyncio.run(run())
+    assert ttls[0][0] == "short" and 0 < ttls[0][1] <= 5
+    assert ttls[1] == ("forever", cache.L1_MAX_TTL)
+
+
+def test_l1_serves_repeat_reads_without_redis(fake_redis):
+    async def run():
+        await redis_cache.set("k", "v", ex=60)
+        redis_cache.local.clear()
+        first = await redis_cache.get("k")
+        # A change behind the cache's back is not seen until L1 lets go
+        await redis_cache.client.set("k", "changed")
+        second = await redis_cache.get("k")
+        return first, second
+
+    assert asyncio.run(run()) == ("v", "v")
+    assert redis_cache.stats["l2_hits"] == 1
+    assert redis_cache.stats["l1_hits"] == 1
+
+
+def test_writes_and_deletes_keep_l1_in_step(fake_redis):
+    async def run():
+        await redis_cache.set("k", "v1", ex=60)
+        await redis_cache.set("k", "v2", ex=60)
+        updated = await redis_cache.get("k")
+        await redis_cache.delete("k")
+        return updated, await redis_cache.get("k"), await redis_cache.client.get("k")
+
+    assert asyncio.run(run()) == ("v2", None, None)
+
+
+def test_remote_invalidations_drop_l1_entries(fake_redis):
+    seen = []
+    redis_cache.local.set("k", "stale", 60)
+    redis_cache.local.set("other", "kept", 60)
+    redis_cache.remote_key_hooks.append(seen.append)
+    try:
+        redis_cache._apply_invalidation(json.dumps({"origin": "another-worker", "keys": ["k"]}))
+        # Our own invalidations come back over pub/sub too, and are ignored
+        redis_cache._apply_invalidation(json.dumps({"origin": redis_cache.origin, "keys": ["other"]}))
+        redis_cache._apply_invalidation("not json")
+    finally:
+        redis_cache.remote_key_hooks.remove(seen.append)
+
+    assert redis_cache.local.get("k") is None
+    assert redis_cache.local.get("other") == "kept"
+    assert seen == ["k"]
+    assert redis_cache.stats["invalidations_received"] == 1
+
+
+def test_writes_publish_invalidations_for_other_workers(fake_redis):
+    async def run():
+        pubsub = redis_cache.client.pubsub()
+        await pubsub.subscribe(cache.INVALIDATION_CHANNEL)
+        await pubsub.get_message(timeout=1)  # Subscription confirmation
+        await redis_cache.set("k", "v")
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+        await pubsub.aclose()
+        return json.loads(message["data"])
+
+    message = asyncio.run(run())
+    assert message == {"origin": redis_cache.origin, "keys": ["k"]}
+
+
+def test_invalidate_tag_deletes_only_tagged_keys(fake_redis):
+    hooked = []
+
+    async def run():
+        await redis_cache.set("users:1", "a", ex=60, tags=["users"])
+        await redis_cache.set_obj("users:list", [1, 2], ex=60, tags=["users", "lists"])
+        await redis_cache.set("groups:1", "b", ex=60, tags=["groups"])
+        deleted = await cache.invalidate_tag("users")
+        return deleted, [await redis_cache.client.exists(key) for key in ("users:1", "users:list", "groups:1")]
+
+    cache.add_invalidation_hook(hooked.append)
+    try:
+        deleted, exists = asyncio.run(run())
+    finally:
+        cache._invalidation_hooks.remove(hooked.append)
+
+    assert deleted == 2
+    assert exists == [0, 0, 1]
+    assert redis_cache.local.get("users:1") is None
+    assert redis_cache.local.get("groups:1") == "b"
+    assert hooked == ["users"]
+
+
+def test_invalidate_tag_drops_the_tag_set(fake_redis):
+    async def run():
+        await redis_cache.set("k", "v", ex=60, tags=["t"])
+        ttl = await redis_cache.client.ttl("tag:t")
+        first = await cache.invalidate_tag("t")
+        # Re-tagging after an invalidation starts a fresh set
+        await redis_cache.set("k2", "v", ex=60, tags=["t"])
+        members = await redis_cache.client.smembers("tag:t")
+        return ttl, first, members, await cache.invalidate_tag("missing")
+
+    ttl, first, members, missing = asyncio.run(run())
+    assert 0 < ttl <= cache.TAG_TTL
+    assert first == 1
+    assert members == {"k2"}
+    assert missing == 0
+
+
+def test_invalidate_tag_while_redis_is_down_clears_l1_and_is_replayed(fake_redis):
+    async def run():
+        await redis_cache.set("k", "v", ex=60, tags=["t"])
+        redis_cache.breaker_open = True
+        assert await cache.invalidate_tag("t") == 0
+        assert len(redis_cache.local) == 0
+        assert redis_cache.missed_invalidations["tags"] == {"t"}
+
+        redis_cache.breaker_open = False
+        await cache._replay_missed_invalidations()
+        return await redis_cache.client.exists("k")
+
+    assert asyncio.run(run()) == 0
+
+
+@pytest.fixture
+def stampede_stats(monkeypatch):
+    stats = dict.fromkeys(cache.stampede_stats, 0)
+    monkeypatch.setattr(cache, "stampede_stats", stats)
+    return stats
+
+
+class _Loader:
+    """Counts its calls and takes a little while, like a database query."""
+
+    def __init__(self, value="fresh", delay=0.02):
+        self.calls = 0
+        self.value = value
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+def test_concurrent_misses_share_one_load(fake_redis, stampede_stats, monkeypatch):
+    loader = _Loader()
+    acquire_lease = cache._acquire_lease
+
+    async def slow_acquire_lease(key):
+        # A real Redis round trip, during which the other callers arrive
+        await asyncio.sleep(0.01)
+        return await acquire_lease(key)
+
+    monkeypatch.setattr(cache, "_acquire_lease", slow_acquire_lease)
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_set("k", loader, ttl=60) for _ in range(20)))
+
+    assert asyncio.run(run()) == ["fresh"] * 20
+    assert loader.calls == 1
+    # All but the first caller joined the in-flight load, none polled Redis
+    assert stampede_stats["coalesced"] == 19
+    assert stampede_stats["lease_waits"] == 0
+
+
+def test_lease_held_by_another_worker_waits_for_its_value(fake_redis, stampede_stats):
+    loader = _Loader("ours")
+
+    async def other_worker():
+        await asyncio.sleep(0.1)
+        entry = {"v": "theirs", "fresh_until": time.time() + 60, "delta": 0.1}
+        await redis_cache.binary_client.set("k", cache.encode_value(entry))
+
+    async def run():
+        await redis_cache.client.set(f"{cache.LEASE_PREFIX}:k", "someone-else", px=5000)
+        value, _ = await asyncio.gather(cache.get_or_set("k", loader, ttl=60), other_worker())
+        return value
+
+    assert asyncio.run(run()) == "theirs"
+    assert loader.calls == 0
+    assert stampede_stats["lease_waits"] == 1
+
+
+def test_lease_released_without_a_value_loads_it_here(fake_redis, stampede_stats):
+    loader = _Loader()
+
+    async def run():
+        await redis_cache.client.set(f"{cache.LEASE_PREFIX}:k", "someone-else", px=100)
+        return await cache.get_or_set("k", loader, ttl=60)
+
+    assert asyncio.run(run()) == "fresh"
+    assert loader.calls == 1
+    assert stampede_stats["loads"] == 1
+
+
+def test_stale_value_is_served_while_one_caller_refreshes(fake_redis, stampede_stats):
+    loader = _Loader()
+
+    async def run():
+        stale = {"v": "stale", "fresh_until": time.time() - 1, "delta": 0.01}
+        await redis_cache.set_obj("k", stale, ex=60)
+        results = await asyncio.gather(*(cache.get_or_set("k", loader, ttl=60) for _ in range(5)))
+        return results, await cache.get_or_set("k", loader, ttl=60)
+
+    results, after = asyncio.run(run())
+    assert results.count("fresh") == 1 and results.count("stale") == 4
+    assert after == "fresh"
+    assert loader.calls == 1
+    assert stampede_stats["stale_served"] == 4
+
+
+def test_stale_value_is_served_while_another_worker_refreshes(fake_redis, stampede_stats):
+    loader = _Loader()
+
+    async def run():
+        await redis_cache.set_obj("k", {"v": "stale", "fresh_until": time.time() - 1, "delta": 0.01}, ex=60)
+        await redis_cache.client.set(f"{cache.LEASE_PREFIX}:k", "someone-else", px=5000)
+        return await cache.get_or_set("k", loader, ttl=60)
+
+    assert asyncio.run(run()) == "stale"
+    assert loader.calls == 0
+
+
+def test_xfetch_refreshes_slow_values_early(monkeypatch, stampede_stats):
+    now = time.time()
+    fresh_for_a_second = {"v": 1, "fresh_until": now + 1, "delta": 0}
+    assert not cache._needs_refresh(fresh_for_a_second)
+
+    # -log(U) for U = e**-3 is 3: a 0.5s load refreshes 1.5s before expiry
+    monkeypatch.setattr(cache.random, "random", lambda: 0.049787068)
+    assert cache._needs_refresh({**fresh_for_a_second, "delta": 0.5})
+    assert not cache._needs_refresh({**fresh_for_a_second, "delta": 0.2})
+    assert stampede_stats["early_refreshes"] == 1
+
+
+def test_failed_load_reaches_every_waiter_and_releases_the_lease(fake_redis):
+    async def broken():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("database down")
+
+    async def run():
+        results = await asyncio.gather(*(cache.get_or_set("k", broken) for _ in range(3)), return_exceptions=True)
+        return results, await redis_cache.client.exists(f"{cache.LEASE_PREFIX}:k")
+
+    results, lease = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert lease == 0
+    assert "k" not in cache._inflight
+
+
+def test_refresh_skips_a_key_already_loading_here(fake_redis):
+    loader = _Loader()
+
+    async def run():
+        loading = asyncio.ensure_future(cache.get_or_set("k", loader, ttl=60))
+        while "k" not in cache._inflight:
+            await asyncio.sleep(0)
+        skipped = await cache.refresh("k", loader, ttl=60)
+        await loading
+        refreshed = await cache.refresh("k", _Loader("newer"), ttl=60)
+        return skipped, refreshed, await cache.get_or_set("k", loader, ttl=60)
+
+    assert asyncio.run(run()) == (False, True, "newer")
+    assert loader.calls == 1
+
+
+@pytest.mark.parametrize("serializer", sorted(code for code in cache._SERIALIZERS))
+@pytest.mark.parametrize("compressor", sorted(code for code in cache._COMPRESSORS))
+def test_every_codec_round_trips(monkeypatch, serializer, compressor):
+    monkeypatch.setattr(cache, "_serializer_code", serializer)
+    monkeypatch.setattr(cache, "_compressor_code", compressor)
+    value = {"name": "Template ü", "ids": list(range(500)), "nested": [{"a": None, "b": 1.5, "c": True}]}
+
+    frame = cache.encode_value(value)
+
+    assert frame[0] == cache.FRAME_MAGIC
+    assert frame[1] >> 4 == serializer
+    # Large enough to compress, and it does shrink
+    assert frame[1] & 0x0F == compressor
+    assert cache.decode_value(frame) == value
+
+
+def test_small_values_are_not_compressed(monkeypatch):
+    monkeypatch.setattr(cache, "_compressor_code", 1)
+    frame = cache.encode_value({"a": 1})
+    assert frame[1] & 0x0F == 0
+    assert cache.decode_value(frame) == {"a": 1}
+
+
+def test_frames_decode_whatever_the_current_settings(monkeypatch):
+    monkeypatch.setattr(cache, "_serializer_code", 1)
+    monkeypatch.setattr(cache, "_compressor_code", 1)
+    frame = cache.encode_value(list(range(1000)))
+
+    monkeypatch.setattr(cache, "_serializer_code", max(cache._SERIALIZERS))
+    monkeypatch.setattr(cache, "_compressor_code", 0)
+    assert cache.decode_value(frame) == list(range(1000))
+
+
+def test_anything_but_a_frame_decodes_to_none(monkeypatch):
+    stats = dict.fromkeys(cache.codec_stats, 0)
+    monkeypatch.setattr(cache, "codec_stats", stats)
+
+    assert cache.decode_value(None) is None
+    assert cache.decode_value('{"a": 1}') is None
+    assert cache.decode_value(b'{"a": 1}') is None
+    assert stats["decode_errors"] == 0
+
+    # Unknown serializer, and a corrupt payload
+    assert cache.decode_value(bytes((cache.FRAME_MAGIC, 0xF0)) + b"{}") is None
+    assert cache.decode_value(bytes((cache.FRAME_MAGIC, 0x11)) + b"not zlib") is None
+    assert stats["decode_errors"] == 2
+
+
+def test_unknown_codec_setting_falls_back_to_auto():
+    table = {1: ("json", None, None), 2: ("orjson", None, None)}
+    assert cache._pick_codec(table, "msgpack", ("orjson", "json")) == 2
+    assert cache._pick_codec(table, "json", ("orjson", "json")) == 1
+
+
+def test_objects_are_stored_as_frames(fake_redis):
+    async def run():
+        await redis_cache.set_obj("k", {"a": [1, 2]}, ex=60)
+        raw = await redis_cache.binary_client.get("k")
+        redis_cache.local.clear()
+        return raw, await redis_cache.get_obj("k")
+
+    raw, value = asyncio.run(run())
+    assert raw[0] == cache.FRAME_MAGIC
+    assert value == {"a": [1, 2]}
+
+
+def test_values_that_cannot_be_encoded_are_not_cached(fake_redis):
+    async def run():
+        stored = await redis_cache.set_obj("k", {"when": object()})
+        return stored, await redis_cache.client.exists("k")
+
+    assert asyncio.run(run()) == (False, 0)
+
+
+def test_breaker_opens_after_repeated_failures_and_serves_locally(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache, "BREAKER_PROBE_INTERVAL", 60)
+
+    async def run():
+        await redis_cache.set("cached", "v", ex=60)
+        redis_cache.local.clear()
+        fake_redis.connected = False
+        for _ in range(cache.BREAKER_FAILURE_THRESHOLD):
+            assert await redis_cache.get("cached") is None
+        assert redis_cache.breaker_open and not redis_cache.available
+
+        # Open: writes land in L1 only and are remembered for later
+        assert await redis_cache.set("k", "local", ex=60)
+        assert await redis_cache.get("k") == "local"
+        assert await redis_cache.get("cached", "default") == "default"
+        await redis_cache.stop_invalidation_listener()
+
+    asyncio.run(run())
+    assert redis_cache.stats["breaker_trips"] == 1
+    assert redis_cache.stats["fallback_writes"] == 1
+    assert redis_cache.stats["fallback_reads"] == 1
+    assert redis_cache.missed_invalidations["keys"] == {"k"}
+
+
+def test_a_success_resets_the_failure_count(fake_redis):
+    async def run():
+        fake_redis.connected = False
+        for _ in range(cache.BREAKER_FAILURE_THRESHOLD - 1):
+            await redis_cache.get("k")
+        fake_redis.connected = True
+        await redis_cache.get("k")
+        fake_redis.connected = False
+        await redis_cache.get("k")
+
+    asyncio.run(run())
+    assert not redis_cache.breaker_open
+
+
+def test_probe_closes_the_breaker_and_replays_missed_invalidations(fake_redis, monkeypatch):
+    monkeypatch.setattr(cache, "BREAKER_PROBE_INTERVAL", 0.01)
+
+    async def run():
+        await redis_cache.set("k", "old", ex=60, tags=["t"])
+        await redis_cache.set("tagged", "old", ex=60, tags=["t"])
+        version = await cache.get_namespace_version("ns")
+
+        fake_redis.connected = False
+        for _ in range(cache.BREAKER_FAILURE_THRESHOLD):
+            await redis_cache.delete("k")
+        await cache.invalidate_tag("t")
+        local_version = await cache.bump_namespace("ns")
+
+        fake_redis.connected = True
+        for _ in range(100):
+            if not redis_cache.breaker_open:
+                break
+            await asyncio.sleep(0.01)
+        await redis_cache.stop_invalidation_listener()
+        return (
+            version,
+            local_version,
+            await redis_cache.client.exists("k", "tagged"),
+            await redis_cache.client.get("ns_version:ns"),
+        )
+
+    version, local_version, remaining, stored_version = asyncio.run(run())
+    assert not redis_cache.breaker_open
+    assert redis_cache.stats["breaker_recoveries"] == 1
+    assert remaining == 0
+    # The namespace moved on while Redis was down, and moved in Redis afterwards
+    assert local_version == version + 1
+    assert int(stored_version) >= 1
+    assert redis_cache.missed_invalidations == {"keys": set(), "tags": set(), "namespaces": set()}
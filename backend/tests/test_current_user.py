@@ -0,0 +1,76 @@
+"""
+The get_current_user dependencies resolve the token off the event loop.
+"""
+import threading
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import auth.auth
+import auth.dependencies
+from auth import token_cache
+from auth.token_cache import VerifiedTokenCache
+from database import get_db
+from models import Base
+from models.user import User
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(token_cache, "verified_tokens", VerifiedTokenCache())
+    engine = create_engine(f"sqlite:///{tmp_path / 'me.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add(User(email="me@example.com", email_lower="me@example.com", first_name="M", last_name="E",
+                    password_hash="x", role="user"))
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def _token(sub="1"):
+    claims = {"sub": sub, "aud": token_cache.AUDIENCE, "exp": int(time.time()) + 600}
+    return jwt.encode(claims, token_cache.SECRET_KEY, algorithm=token_cache.ALGORITHM)
+
+
+@pytest.mark.parametrize("dependency", [auth.auth.get_current_user, auth.dependencies.get_current_user])
+def test_token_is_resolved_in_the_threadpool(sessions, monkeypatch, dependency):
+    resolved_on = []
+    resolve = token_cache.resolve_token_user
+
+    def recording_resolve(db, token):
+        resolved_on.append(threading.get_ident())
+        return resolve(db, token)
+
+    for module in (auth.auth, auth.dependencies):
+        monkeypatch.setattr(module, "resolve_token_user", recording_resolve)
+
+    app = FastAPI()
+
+    def get_test_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+
+    @app.get("/whoami")
+    async def whoami(user=Depends(dependency)):
+        return {"email": user.email, "thread": threading.get_ident()}
+
+    with TestClient(app) as client:
+        response = client.get("/whoami", headers={"Authorization": f"Bearer {_token()}"})
+        assert response.status_code == 200
+        assert response.json()["email"] == "me@example.com"
+        assert resolved_on and resolved_on[0] != response.json()["thread"]
+
+        assert client.get("/whoami", headers={"Authorization": f"Bearer {_token('99')}"}).status_code == 401
+        assert client.get("/whoami", headers={"Authorization": "Bearer not-a-token"}).status_code == 401
@@ -0,0 +1,164 @@
+"""
+Serialized group-commit writer, run against a SQLite file with the same
+connection setup (BEGIN IMMEDIATE, savepoints) as the real async writer.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, event, insert, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import database
+from utils import db_writer
+from utils.db_writer import WriteQueue
+
+metadata = MetaData()
+notes = Table(
+    "notes", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("text", String, unique=True, nullable=False),
+)
+
+
+@pytest.fixture
+def engines(tmp_path, monkeypatch):
+    """Point the writer at a fresh database; yields (sync engine, commit log)."""
+    url = f"sqlite:///{tmp_path / 'writer.db'}"
+    sync_engine = create_engine(url)
+    metadata.create_all(sync_engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    database._configure(async_engine.sync_engine, immediate=True)
+    commits = []
+    event.listen(async_engine.sync_engine, "commit", lambda conn: commits.append(conn))
+    monkeypatch.setattr(db_writer, "async_engine", async_engine)
+    monkeypatch.setattr(db_writer, "engine", sync_engine)
+    yield sync_engine, commits
+    sync_engine.dispose()
+    asyncio.run(async_engine.dispose())
+
+
+def _add(conn, text):
+    return conn.execute(insert(notes).values(text=text)).inserted_primary_key[0]
+
+
+def _add_then_fail(conn, text):
+    _add(conn, text)
+    raise ValueError(f"rejected {text}")
+
+
+def _texts(sync_engine):
+    with sync_engine.connect() as conn:
+        return sorted(conn.scalars(select(notes.c.text)))
+
+
+def test_concurrent_writes_share_one_commit(engines):
+    sync_engine, commits = engines
+    writer = WriteQueue(batch_size=50, linger_ms=20)
+
+    async def run():
+        ids = await asyncio.gather(*(writer.submit(_add, f"note {n}") for n in range(20)))
+        await writer.close()
+        return ids
+
+    ids = asyncio.run(run())
+    assert sorted(ids) == list(range(1, 21))
+    assert len(_texts(sync_engine)) == 20
+    assert len(commits) == 1
+    assert writer.stats["batches"] == 1 and writer.stats["max_batch"] == 20
+
+
+def test_batches_are_capped_at_the_batch_size(engines):
+    sync_engine, commits = engines
+    writer = WriteQueue(batch_size=4, linger_ms=20)
+
+    async def run():
+        await asyncio.gather(*(writer.submit(_add, f"note {n}") for n in range(10)))
+        await writer.close()
+
+    asyncio.run(run())
+    assert len(_texts(sync_engine)) == 10
+    assert writer.stats["max_batch"] == 4
+    assert writer.stats["batches"] == len(commits) == 3
+
+
+def test_a_failing_unit_is_rolled_back_alone(engines):
+    sync_engine, commits = engines
+    writer = WriteQueue(batch_size=50, linger_ms=20)
+
+    async def run():
+        results = await asyncio.gather(
+            writer.submit(_add, "first"),
+            writer.submit(_add_then_fail, "rejected"),
+            writer.submit(_add, "first"),  # Unique violation
+            writer.submit(_add, "last"),
+            return_exceptions=True,
+        )
+        await writer.close()
+        return results
+
+    first, rejected, duplicate, last = asyncio.run(run())
+    assert isinstance(rejected, ValueError) and str(rejected) == "rejected rejected"
+    assert "UNIQUE" in str(duplicate)
+    assert isinstance(first, int) and isinstance(last, int)
+    # The failed units' rows were undone; the rest of the group still committed together
+    assert _texts(sync_engine) == ["first", "last"]
+    assert len(commits) == 1
+    assert writer.stats["failed_units"] == 2 and writer.stats["units"] == 4
+
+
+def test_a_failed_commit_fails_every_caller_in_the_group(engines, monkeypatch):
+    sync_engine, _ = engines
+    writer = WriteQueue(batch_size=50, linger_ms=20)
+
+    def broken_apply(conn, units):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(db_writer, "_apply_units", broken_apply)
+
+    async def run():
+        results = await asyncio.gather(*(writer.submit(_add, f"note {n}") for n in range(3)), return_exceptions=True)
+        await writer.close()
+        return results
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+    assert writer.stats["batch_failures"] == 1
+    assert _texts(sync_engine) == []
+
+
+def test_close_applies_what_is_still_queued(engines):
+    sync_engine, _ = engines
+    writer = WriteQueue(batch_size=50, linger_ms=1000)
+
+    async def run():
+        pending = [asyncio.ensure_future(writer.submit(_add, f"note {n}")) for n in range(3)]
+        await asyncio.sleep(0)
+        await writer.close()
+        return await asyncio.gather(*pending)
+
+    assert len(asyncio.run(run())) == 3
+    assert len(_texts(sync_engine)) == 3
+
+
+def test_submit_from_thread_goes_through_the_running_writer(engines):
+    sync_engine, commits = engines
+    writer = WriteQueue(batch_size=50, linger_ms=20)
+
+    async def run():
+        writer.start()
+        ids = await asyncio.gather(*(asyncio.to_thread(writer.submit_from_thread, _add, f"note {n}") for n in range(3)))
+        await writer.close()
+        return ids
+
+    assert sorted(asyncio.run(run())) == [1, 2, 3]
+    assert len(commits) >= 1
+
+
+def test_submit_from_thread_without_a_writer_uses_its_own_transaction(engines):
+    sync_engine, commits = engines
+    writer = WriteQueue()
+
+    assert writer.submit_from_thread(_add, "script") == 1
+    with pytest.raises(ValueError):
+        writer.submit_from_thread(_add_then_fail, "rolled back")
+    assert _texts(sync_engine) == ["script"]
+    assert commits == []
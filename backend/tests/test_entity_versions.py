@@ -0,0 +1,61 @@
+"""
+Per-table version counters: which commits bump which tables, against
+fakeredis and a SQLite file.
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, insert
+
+from utils import bulk
+from utils.bulk import copy_rows
+from utils.cache import read_namespace_versions
+from utils.entity_versions import entity_versions, namespace, track_writes
+
+metadata = MetaData()
+notes = Table(
+    "notes", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("text", String, nullable=False),
+)
+
+
+@pytest.fixture
+def engine(tmp_path, fake_redis):
+    engine = create_engine(f"sqlite:///{tmp_path / 'versions.db'}")
+    metadata.create_all(engine)
+    track_writes(engine)
+    yield engine
+    engine.dispose()
+
+
+def _versions(*tables):
+    async def read():
+        await entity_versions.flush()
+        return await read_namespace_versions([namespace(table) for table in tables])
+    return asyncio.run(read())
+
+
+def test_committed_writes_bump_their_table(engine):
+    with engine.begin() as conn:
+        conn.execute(insert(notes).values(text="a"))
+    with engine.connect() as conn:
+        conn.execute(insert(notes).values(text="rolled back"))
+        conn.rollback()
+
+    assert _versions("notes") == [1]
+
+
+def test_a_copy_only_commit_bumps_its_table(engine, monkeypatch):
+    def raw_copy(conn, table, columns, records):
+        # Like COPY, straight on the DBAPI cursor where no statement hook sees it
+        cursor = conn.connection.cursor()
+        cursor.executemany(f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES (?)", records)
+        cursor.close()
+
+    monkeypatch.setattr(bulk, "_copy", raw_copy)
+    monkeypatch.setattr(engine.dialect, "name", "postgresql")
+    with engine.begin() as conn:
+        assert copy_rows(conn, notes, [{"text": "a"}, {"text": "b"}]) == 2
+
+    assert _versions("notes") == [1]
@@ -0,0 +1,245 @@
+"""
+Delete paths with foreign keys enforced.
+
+The application turns on SQLite's foreign_keys pragma, so every delete has
+to either remove or reassign the rows referencing it, or rely on the
+reference's ON DELETE action. These tests run the real delete paths on a
+seeded SQLite database with the pragma on.
+"""
+import asyncio
+import importlib.util
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base
+from models.contact import Contact
+from models.contact_match import ContactMatch
+from models.group import Group, UserGroup
+from models.identification.id_answer import IdAnswer
+from models.identification.id_question import IdQuestion
+from models.messages.message import Message
+from models.messages.message_template import MessageTemplate
+from models.messages.user_message_template import UserMessageTemplate
+from models.sent_count import SentCount
+from models.sent_message import SentMessage
+from models.shared_contact import SharedContact
+from models.targets.target_contact import TargetContact
+from models.targets.target_list import TargetList
+from models.user import User
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations", "versions")
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fks.db'}")
+    event.listen(engine, "connect", _enable_foreign_keys)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _user(db, email="fk@example.com"):
+    user = User(email=email, email_lower=email, first_name="F", last_name="K", password_hash="x", role="user")
+    db.add(user)
+    db.flush()
+    return user
+
+
+def _sent(db, user):
+    """A template sent by user to one shared contact and one target contact."""
+    target_list = TargetList(name="fks")
+    template = MessageTemplate(name="fks", content="hi", message_type="friend_to_friend", status="ACTIVE")
+    db.add_all([target_list, template])
+    db.flush()
+    target = TargetContact(list_id=target_list.id, voter_id="v1", first_name="T", last_name="C", zip_code="12345")
+    shared = SharedContact(user_id=user.id, first_name="S", last_name="C", mobile1="5550000001")
+    db.add_all([target, shared])
+    db.flush()
+    sent = SentMessage(user_id=user.id, message_template_id=template.id,
+                       shared_contact_id=shared.id, target_contact_id=target.id)
+    db.add(sent)
+    db.commit()
+    return sent
+
+
+def _load_migration(filename):
+    spec = importlib.util.spec_from_file_location(filename[:-3], os.path.join(MIGRATIONS, filename))
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+def _run_migration(engine, step):
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    with engine.begin() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            step()
+
+
+def _ondelete(engine, table, column):
+    for fk in inspect(engine).get_foreign_keys(table):
+        if fk["constrained_columns"] == [column]:
+            return fk["options"].get("ondelete")
+    raise AssertionError(f"no foreign key on {table}.{column}")
+
+
+def test_deleting_a_shared_contact_keeps_its_sends(db):
+    sent = _sent(db, _user(db))
+    db.delete(db.get(SharedContact, sent.shared_contact_id))
+    db.commit()
+
+    db.expire_all()
+    assert db.get(SentMessage, sent.id).shared_contact_id is None
+
+
+def test_deleting_a_target_list_keeps_its_sends(db):
+    from targets.crud import delete_target_list
+
+    sent = _sent(db, _user(db))
+    list_id = db.get(TargetContact, sent.target_contact_id).list_id
+    assert delete_target_list(db, list_id)
+
+    db.expire_all()
+    kept = db.get(SentMessage, sent.id)
+    assert kept.target_contact_id is None
+    assert kept.shared_contact_id is not None
+
+
+def test_removing_voters_keeps_their_sends(db):
+    from targets.crud import delete_contacts_by_voter_ids
+
+    sent = _sent(db, _user(db))
+    assert delete_contacts_by_voter_ids(db, ["v1"]) == 1
+
+    db.expire_all()
+    assert db.get(SentMessage, sent.id).target_contact_id is None
+
+
+def test_keep_history_migration(engine):
+    migration = _load_migration("20251019140000_sent_messages_keep_history.py")
+
+    _run_migration(engine, migration.downgrade)
+    assert _ondelete(engine, "sent_messages", "shared_contact_id") == "CASCADE"
+    _run_migration(engine, migration.upgrade)
+    for column in ("shared_contact_id", "target_contact_id"):
+        assert _ondelete(engine, "sent_messages", column) == "SET NULL"
+
+
+ADMIN = SimpleNamespace(id=0, email="admin@example.com", role="admin")
+
+
+@pytest.fixture
+def no_cache(monkeypatch):
+    """The delete handlers' cache invalidations, as no-ops."""
+    async def nothing(*args, **kwargs):
+        return 0
+
+    import contacts.routes
+    import users.routes
+
+    for module, names in ((users.routes, ("invalidate_user", "invalidate_tag", "bump_namespace")),
+                          (contacts.routes, ("invalidate_tag",))):
+        for name in names:
+            monkeypatch.setattr(module, name, nothing)
+
+
+def _question(db):
+    question = IdQuestion(title="Q", question_text="Q?", response_type="TEXT")
+    db.add(question)
+    db.flush()
+    return question
+
+
+def test_deleting_a_user_removes_or_detaches_everything_referencing_them(db, no_cache):
+    from users.routes import delete_user
+    from sent_messages.counters import increment_sent_counts
+
+    user, other = _user(db), _user(db, "other@example.com")
+    sent = _sent(db, user)
+    increment_sent_counts(db, [(sent.message_template_id, user.id, sent.sent_at)])
+    group = Group(name="g")
+    db.add(group)
+    db.flush()
+    question = _question(db)
+    # Someone else's answer about one of this user's shared contacts
+    db.add_all([
+        UserGroup(user_id=user.id, group_id=group.id),
+        UserMessageTemplate(user_id=user.id, template_id=sent.message_template_id),
+        IdAnswer(question_id=question.id, user_id=user.id, shared_contact_id=sent.shared_contact_id),
+        IdAnswer(question_id=question.id, user_id=other.id, shared_contact_id=sent.shared_contact_id),
+        Contact(first_name="C", assigned_to_id=user.id, is_unassigned=False),
+        Message(message_text="m", sender_id=user.id),
+    ])
+    db.commit()
+    user_id = user.id
+
+    asyncio.run(delete_user(user_id, db=db, current_user=ADMIN))
+
+    db.expire_all()
+    assert db.get(User, user_id) is None
+    assert db.get(User, other.id) is not None
+    for model, column in ((SentMessage, SentMessage.user_id), (SentCount, SentCount.user_id),
+                          (UserGroup, UserGroup.user_id), (UserMessageTemplate, UserMessageTemplate.user_id),
+                          (SharedContact, SharedContact.user_id)):
+        assert db.execute(select(model).where(column == user_id)).first() is None, model.__tablename__
+    assert db.execute(select(IdAnswer)).first() is None
+    contact = db.execute(select(Contact)).scalar_one()
+    assert contact.assigned_to_id is None and contact.is_unassigned
+    assert db.execute(select(Message.sender_id)).scalar_one() is None
+    assert db.get(Group, group.id) is not None
+
+
+def test_deduplicating_moves_answers_to_the_kept_contact(db, no_cache):
+    from contacts.routes import deduplicate_shared_contacts
+
+    user = _user(db)
+    sent = _sent(db, user)
+    older = db.get(SharedContact, sent.shared_contact_id)
+    older.created_at = datetime(2025, 1, 1)
+    newer = SharedContact(user_id=user.id, first_name="S", last_name="C", mobile1="5550000001",
+                          created_at=datetime(2025, 1, 1) + timedelta(days=1))
+    different = SharedContact(user_id=user.id, first_name="S", last_name="C", mobile1="5550000002",
+                              created_at=datetime(2025, 1, 1))
+    db.add_all([newer, different])
+    db.flush()
+    question = _question(db)
+    target_id = sent.target_contact_id
+    target_list_id = db.get(TargetContact, target_id).list_id
+    db.add_all([
+        IdAnswer(question_id=question.id, user_id=user.id, shared_contact_id=older.id, text_answer="yes"),
+        ContactMatch(shared_contact_id=older.id, target_contact_id=target_id, target_list_id=target_list_id,
+                     match_confidence="high"),
+    ])
+    db.commit()
+    older_id, newer_id, different_id = older.id, newer.id, different.id
+
+    result = asyncio.run(deduplicate_shared_contacts(db=db, current_user=ADMIN))
+
+    db.expire_all()
+    assert result["message"].startswith("Deduplication complete. 1 duplicate")
+    assert db.get(SharedContact, older_id) is None
+    assert db.get(SharedContact, different_id) is not None
+    assert db.execute(select(IdAnswer.shared_contact_id, IdAnswer.text_answer)).all() == [(newer_id, "yes")]
+    assert db.execute(select(ContactMatch)).first() is None
+    assert db.get(SentMessage, sent.id).shared_contact_id is None
@@ -0,0 +1,124 @@
+"""
+Password hashing on the bounded bcrypt pool.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from auth import passwords
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A fresh two-worker pool with cheap hashes and zeroed stats."""
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_CONCURRENCY", 2)
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_EXECUTOR", "thread")
+    monkeypatch.setattr(passwords, "hash_stats", dict.fromkeys(passwords.hash_stats, 0))
+    monkeypatch.setattr(passwords, "_executor", None)
+    yield passwords.hash_stats
+    passwords.shutdown()
+
+
+def test_hash_and_verify_round_trip(pool):
+    async def run():
+        hashed = await passwords.hash_password_async("s3cret")
+        return hashed, await passwords.verify_password_async("s3cret", hashed), \
+            await passwords.verify_password_async("wrong", hashed)
+
+    hashed, right, wrong = asyncio.run(run())
+    assert hashed.startswith("$2b$04$")
+    assert (right, wrong) == (True, False)
+    assert (pool["hashes"], pool["verifies"]) == (1, 2)
+    assert pool["in_flight"] == 0
+
+
+def test_malformed_or_missing_hashes_never_match():
+    assert not passwords.check_password("pw", "not a bcrypt hash")
+    assert not passwords.check_password("pw", None)
+    assert not passwords.check_password("", passwords.hash_password("", rounds=4))
+    # Stray whitespace around a stored hash is tolerated
+    assert passwords.check_password("pw", f"  {passwords.hash_password('pw', rounds=4)}\n")
+
+
+def test_needs_rehash_compares_the_cost(monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 5)
+    assert passwords.needs_rehash(passwords.hash_password("pw", rounds=4))
+    assert not passwords.needs_rehash(passwords.hash_password("pw", rounds=5))
+    assert not passwords.needs_rehash("garbage")
+    assert not passwords.needs_rehash(None)
+
+
+def test_callers_beyond_the_pool_size_queue(pool, monkeypatch):
+    def slow_hash(password, rounds):
+        started_at = time.time()
+        time.sleep(0.05)
+        return password, started_at
+
+    monkeypatch.setattr(passwords, "_timed_hash", slow_hash)
+
+    async def run():
+        return await asyncio.gather(*(passwords.hash_password_async(str(n)) for n in range(6)))
+
+    started = time.monotonic()
+    assert asyncio.run(run()) == [str(n) for n in range(6)]
+    # Six 50ms hashes on two workers take three rounds
+    assert time.monotonic() - started >= 0.14
+    assert pool["max_queue_depth"] == 4
+    assert pool["queue_depth"] == 0 and pool["in_flight"] == 0
+    assert pool["max_queue_wait_ms"] >= 90
+
+
+def test_hashing_does_not_block_the_event_loop(pool, monkeypatch):
+    monkeypatch.setattr(passwords, "BCRYPT_ROUNDS", 10)
+    ticks = []
+
+    async def ticker(stop):
+        while not stop.is_set():
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.005)
+
+    async def run():
+        stop = asyncio.Event()
+        ticking = asyncio.ensure_future(ticker(stop))
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        await asyncio.gather(*(passwords.hash_password_async("pw") for _ in range(2)))
+        elapsed = time.monotonic() - started
+        stop.set()
+        await ticking
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    gaps = [later - earlier for earlier, later in zip(ticks, ticks[1:])]
+    assert elapsed > 0.02
+    assert max(gaps) < elapsed
+
+
+def test_login_rehashes_outdated_hashes(pool, monkeypatch, fake_redis):
+    from auth import auth
+
+    user = SimpleNamespace(id=7, email_lower="old@example.com", password_hash=passwords.hash_password("pw", rounds=5))
+    writes = []
+
+    async def get_user(db, email):
+        return user
+
+    async def submit(unit, *args):
+        writes.append(args)
+
+    monkeypatch.setattr(auth, "get_user", get_user)
+    monkeypatch.setattr(auth.db_writer, "submit", submit)
+    monkeypatch.setattr(auth, "PASSWORD_REHASH_ON_LOGIN", True)
+    monkeypatch.setattr(auth, "BCRYPT_ROUNDS", 4)
+    monkeypatch.setattr(auth, "hash_stats", pool)
+
+    assert asyncio.run(auth.authenticate_user(None, "old@example.com", "wrong")) is False
+    assert writes == []
+
+    assert asyncio.run(auth.authenticate_user(None, "old@example.com", "pw")) is user
+    assert user.password_hash.startswith("$2b$04$")
+    assert writes == [(7, {"password_hash": user.password_hash})]
+    assert pool["rehashes"] == 1
@@ -0,0 +1,177 @@
+"""
+PostgreSQL mode against a local server.
+
+Skipped unless TEST_DATABASE_URL points at a disposable PostgreSQL database:
+
+    docker run --rm -p 5432:5432 -e POSTGRES_PASSWORD=pw postgres:16
+    TEST_DATABASE_URL=postgresql+psycopg://postgres:pw@localhost/postgres pytest tests/test_postgres.py
+
+The tables are created from the models and dropped again afterwards.
+"""
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from models import Base
+from models.sent_message import SentMessage
+from models.targets.target_contact import TargetContact
+from models.targets.target_list import TargetList
+from models.user import User
+from models.messages.message_template import MessageTemplate
+from models.shared_contact import SharedContact
+from utils.bulk import copy_rows, in_values, insert_or_ignore
+from utils.cache import read_namespace_versions
+from utils.entity_versions import entity_versions, namespace, track_writes
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL.startswith("postgresql"),
+    reason="TEST_DATABASE_URL is not a PostgreSQL URL",
+)
+
+
+@pytest.fixture(scope="module")
+def pg_engine():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def target_list_id(pg_engine):
+    with pg_engine.begin() as conn:
+        return conn.execute(
+            TargetList.__table__.insert().values(name="pg").returning(TargetList.id)
+        ).scalar_one()
+
+
+def test_copy_rows_fills_python_defaults(pg_engine, target_list_id):
+    rows = [
+        {"list_id": target_list_id, "voter_id": f"v{i}", "first_name": "A\tB", "last_name": "C\\D",
+         "zip_code": "12345", "city": None, "age": i}
+        for i in range(500)
+    ]
+    with pg_engine.begin() as conn:
+        assert copy_rows(conn, TargetContact.__table__, rows) == 500
+
+    with pg_engine.connect() as conn:
+        stored = conn.execute(
+            select(TargetContact).where(TargetContact.list_id == target_list_id).order_by(TargetContact.age)
+        ).all()
+    assert len(stored) == 500
+    assert stored[1].first_name == "A\tB" and stored[1].last_name == "C\\D"
+    assert stored[1].city is None
+    assert stored[1].is_matched is False
+    assert stored[1].created_at is not None
+
+
+def test_copy_rows_uses_unnest_on_asyncpg(pg_engine, target_list_id):
+    url = make_url(TEST_DATABASE_URL).set(drivername="postgresql+asyncpg")
+    rows = [
+        {"list_id": target_list_id, "voter_id": f"a{i}", "first_name": "a", "last_name": "b", "zip_code": "1"}
+        for i in range(300)
+    ]
+
+    async def insert_rows():
+        engine = create_async_engine(url)
+        try:
+            async with engine.begin() as conn:
+                savepoint = await conn.begin_nested()
+                await conn.run_sync(copy_rows, TargetContact.__table__, rows)
+                await savepoint.rollback()
+                await conn.run_sync(copy_rows, TargetContact.__table__, rows[:10])
+        finally:
+            await engine.dispose()
+
+    asyncio.run(insert_rows())
+    with pg_engine.connect() as conn:
+        stored = conn.execute(
+            select(TargetContact.created_at).where(TargetContact.voter_id.like("a%"))
+        ).scalars().all()
+    # The rolled-back rows stayed inside the savepoint
+    assert len(stored) == 10 and all(stored)
+
+
+def test_in_values_uses_one_array_parameter(pg_engine, target_list_id):
+    with pg_engine.begin() as conn:
+        copy_rows(conn, TargetContact.__table__, [
+            {"list_id": target_list_id, "voter_id": f"x{i}", "first_name": "a", "last_name": "b", "zip_code": "1"}
+            for i in range(3)
+        ])
+        stmt = select(TargetContact.voter_id).where(
+            in_values(conn, TargetContact.voter_id, [f"x{i}" for i in range(40000)])
+        )
+        assert "ANY" in str(stmt.compile(conn))
+        assert sorted(conn.execute(stmt).scalars()) == ["x0", "x1", "x2"]
+
+
+def test_insert_or_ignore_skips_duplicates(pg_engine):
+    with pg_engine.begin() as conn:
+        user_id = conn.execute(
+            User.__table__.insert().values(email="pg@example.com", email_lower="pg@example.com",
+                                           password_hash="x").returning(User.id)
+        ).scalar_one()
+        template_id = conn.execute(
+            MessageTemplate.__table__.insert().values(name="t", message_type="friend_to_friend", content="c").returning(MessageTemplate.id)
+        ).scalar_one()
+        contact_id = conn.execute(
+            SharedContact.__table__.insert().values(user_id=user_id, first_name="s").returning(SharedContact.id)
+        ).scalar_one()
+        event = {"user_id": user_id, "message_template_id": template_id,
+                 "shared_contact_id": contact_id, "sent_at": datetime.utcnow()}
+        stmt = insert_or_ignore(conn, SentMessage.__table__).returning(SentMessage.id)
+        assert conn.execute(stmt, event).scalar() is not None
+        assert conn.execute(stmt, event).scalar() is None
+
+
+def test_concurrent_sent_message_groups_commit_ids_in_order(pg_engine, concurrent_writer_groups):
+    with pg_engine.begin() as conn:
+        user_id = conn.execute(
+            User.__table__.insert().values(email="order@example.com", email_lower="order@example.com",
+                                           password_hash="x").returning(User.id)
+        ).scalar_one()
+        template_id = conn.execute(
+            MessageTemplate.__table__.insert().values(name="o", message_type="friend_to_friend", content="c").returning(MessageTemplate.id)
+        ).scalar_one()
+        contacts = conn.execute(
+            SharedContact.__table__.insert().returning(SharedContact.id),
+            [{"user_id": user_id, "first_name": "a"}, {"user_id": user_id, "first_name": "b"}],
+        ).scalars().all()
+
+    # Without the advisory lock the second group would draw its ids and commit
+    # while the first still held lower ones uncommitted
+    first, second = concurrent_writer_groups(
+        pg_engine, pg_engine, [(user_id, template_id, contacts[0], None)], [(user_id, template_id, contacts[1], None)]
+    )
+    assert max(first) < min(second)
+    with pg_engine.connect() as conn:
+        sent_at = conn.execute(
+            select(SentMessage.sent_at).where(SentMessage.user_id == user_id).order_by(SentMessage.id)
+        ).scalars().all()
+    assert sent_at[0] < sent_at[1]
+
+
+def test_copy_bumps_the_version_of_its_table(pg_engine, target_list_id, fake_redis):
+    engine = create_engine(TEST_DATABASE_URL)
+    track_writes(engine)
+    try:
+        with engine.begin() as conn:
+            copy_rows(conn, TargetContact.__table__, [
+                {"list_id": target_list_id, "voter_id": "copied", "first_name": "a", "last_name": "b", "zip_code": "1"}
+            ])
+    finally:
+        engine.dispose()
+
+    async def versions():
+        await entity_versions.flush()
+        return await read_namespace_versions([namespace("target_contacts")])
+
+    assert asyncio.run(versions()) == [1]
@@ -0,0 +1,190 @@
+"""
+Query-plan regression tests for the hot paths.
+
+Each test runs the real query functions against a seeded SQLite database,
+captures the statements they execute and runs EXPLAIN QUERY PLAN on each.
+A plan that falls back to a full scan of one of the large tables fails the
+test, so a dropped index or a rewritten filter shows up here rather than in
+production latency.
+"""
+import importlib.util
+import os
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from models import Base
+from models.contact_match import ContactMatch
+from models.group import Group, UserGroup
+from models.messages.message_template import MessageTemplate
+from models.messages.user_message_template import UserMessageTemplate
+from models.sent_message import SentMessage
+from models.shared_contact import SharedContact
+from models.targets.target_contact import TargetContact
+from models.targets.target_list import TargetList
+from models.user import User
+
+# Tables big enough that a full scan on a request path is a bug
+HOT_TABLES = ("contact_matches", "target_contacts", "sent_messages", "user_message_templates", "user_groups")
+
+MIGRATION = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "migrations", "versions", "20251019130000_hot_query_indexes.py",
+)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        _seed(session)
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _seed(db):
+    user = User(email="plans@example.com", email_lower="plans@example.com", first_name="Plan",
+                last_name="Test", zip_code="12345", password_hash="x", role="user")
+    group = Group(name="plans")
+    target_list = TargetList(name="plans")
+    db.add_all([user, group, target_list])
+    db.flush()
+    template = MessageTemplate(name="plans", content="hi", message_type="neighbor_to_neighbor",
+                               status="ACTIVE")
+    template.lists.append(target_list)
+    db.add(template)
+    db.add(UserGroup(user_id=user.id, group_id=group.id))
+    db.flush()
+    db.add(UserMessageTemplate(user_id=user.id, template_id=template.id))
+    db.execute(MessageTemplate.groups.property.secondary.insert().values(template_id=template.id, group_id=group.id))
+    contacts = [
+        TargetContact(list_id=target_list.id, voter_id=f"v{i}", first_name="T", last_name=str(i),
+                      zip_code="12345" if i % 2 else "54321", cell_1=f"555000{i:04d}", landline_1=f"555900{i:04d}")
+        for i in range(50)
+    ]
+    shared = SharedContact(user_id=user.id, first_name="S", last_name="C", mobile1="5550000001")
+    db.add_all(contacts + [shared])
+    db.flush()
+    db.add(ContactMatch(shared_contact_id=shared.id, target_contact_id=contacts[1].id,
+                        target_list_id=target_list.id, match_confidence="high"))
+    db.add(SentMessage(user_id=user.id, message_template_id=template.id, shared_contact_id=shared.id))
+    # No ANALYZE: with stats for a few dozen rows SQLite rightly prefers scans.
+    # Its default estimates assume large tables, which is what production has.
+    db.commit()
+
+
+class _Captured:
+    """Statements executed on the session's engine while the block runs."""
+
+    def __init__(self, db):
+        self.engine = db.get_bind()
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE")):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+def _full_scans(db, statements):
+    scans = []
+    raw = db.connection().connection.dbapi_connection
+    for statement, parameters in statements:
+        for row in raw.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall():
+            detail = row[3]
+            words = detail.split()
+            # "SCAN target_contacts" or "SCAN tc" for an aliased table; covering
+            # and index scans ("SCAN t USING INDEX ...") still read every row
+            if words[0] == "SCAN" and _table_of(statement, words[1]) in HOT_TABLES:
+                scans.append(f"{detail}\n    in: {' '.join(statement.split())}")
+    return scans
+
+
+def _table_of(statement, name):
+    """Resolve a plan's table name or alias back to the table."""
+    if name in HOT_TABLES:
+        return name
+    words = statement.replace(",", " ").split()
+    for i, word in enumerate(words[1:], 1):
+        if word == name:
+            previous = words[i - 1]
+            return words[i - 2] if previous.upper() == "AS" else previous
+    return name
+
+
+def _assert_no_full_scans(db, captured):
+    assert captured.statements, "no statements were captured"
+    scans = _full_scans(db, captured.statements)
+    assert not scans, "full table scans on hot tables:\n" + "\n".join(scans)
+
+
+def test_phone_matching_seeks_phone_indexes(db):
+    from contacts.matching import find_phone_matches
+
+    list_id = db.query(TargetList.id).scalar()
+    with _Captured(db) as captured:
+        matches = find_phone_matches(db, ["5550000001", "5559000002"], list_id)
+    assert {m["voter_id"] for m in matches} == {"v1", "v2"}
+    _assert_no_full_scans(db, captured)
+
+
+def test_neighbor_contacts_seek_list_and_zip(db):
+    from messages.crud import get_contacts_for_message
+
+    template_id = db.query(MessageTemplate.id).scalar()
+    with _Captured(db) as captured:
+        result = get_contacts_for_message(db, template_id, "12345", 0, 10)
+    assert result["total_contacts"] == 25
+    _assert_no_full_scans(db, captured)
+
+
+def test_user_messages_page(db):
+    from messages.crud import get_user_messages_with_matched_contacts
+
+    user_id = db.query(User.id).scalar()
+    with _Captured(db) as captured:
+        get_user_messages_with_matched_contacts(db, user_id)
+    _assert_no_full_scans(db, captured)
+
+
+def test_users_list_groups(db):
+    from users.routes import load_users_list
+
+    with _Captured(db) as captured:
+        users = load_users_list(db, 0, 100)
+    assert users[0]["groups"] == [{"id": db.query(Group.id).scalar(), "name": "plans"}]
+    _assert_no_full_scans(db, captured)
+
+
+def test_voter_removal(db):
+    from targets.crud import delete_contacts_by_voter_ids
+
+    with _Captured(db) as captured:
+        deleted = delete_contacts_by_voter_ids(db, ["v1", "v3"])
+    assert deleted == 2
+    _assert_no_full_scans(db, captured)
+
+
+def test_migration_matches_models():
+    spec = importlib.util.spec_from_file_location("hot_query_indexes", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    model_indexes = {
+        index.name: (table.name, [column.name for column in index.columns])
+        for table in Base.metadata.tables.values()
+        for index in table.indexes
+    }
+    for name, table, columns in migration.INDEXES:
+        assert model_indexes.get(name) == (table, columns), name
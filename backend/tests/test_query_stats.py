@@ -0,0 +1,107 @@
+"""
+Per-request query counts and N+1 detection, fed by the same cursor hooks
+the application engines use.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, text
+
+import database
+import middleware.query_stats
+from middleware.query_stats import QueryStatsMiddleware
+from utils.query_stats import RequestQueries, RouteQueryStats, fingerprint
+from utils.slow_queries import SlowQueryLog
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    routes = RouteQueryStats()
+    monkeypatch.setattr(middleware.query_stats, "query_stats", routes)
+    monkeypatch.setattr(database, "slow_query_log", SlowQueryLog(path="", threshold_ms=10_000))
+    return routes
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queries.db'}", connect_args={"check_same_thread": False})
+    event.listen(engine, "before_cursor_execute", database.before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", database.after_cursor_execute)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO items (name) VALUES (:name)"), [{"name": name} for name in "abcdefghijkl"])
+    yield engine
+    engine.dispose()
+
+
+def _app(engine, add_headers=False):
+    app = FastAPI()
+    app.add_middleware(QueryStatsMiddleware, add_headers=add_headers)
+
+    @app.get("/items/{count}")
+    def one_by_one(count: int):
+        with engine.connect() as conn:
+            return [conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": n}).scalar() for n in range(1, count + 1)]
+
+    @app.get("/batch")
+    async def batch():
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT name FROM items WHERE id IN (1, 2, 3)")).scalars().all()
+
+    return app
+
+
+def test_fingerprints_ignore_literals_and_list_lengths():
+    assert fingerprint("SELECT * FROM t WHERE id = 5 AND name = 'it''s'") == "SELECT * FROM t WHERE id = ? AND name = ?"
+    assert fingerprint("SELECT * FROM t WHERE id = :id_1") == fingerprint("SELECT  *\n FROM t WHERE id = ?")
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == fingerprint("SELECT * FROM t WHERE id IN (__[POSTCOMPILE_id_1])")
+    assert fingerprint("SELECT * FROM t WHERE id IN (1, 2)") == "SELECT * FROM t WHERE id IN (?)"
+
+
+def test_queries_are_counted_per_route(engine, stats):
+    with TestClient(_app(engine)) as client:
+        assert client.get("/items/2").json() == ["a", "b"]
+        assert client.get("/items/4").status_code == 200
+        assert client.get("/batch").status_code == 200
+
+    routes = {route["route"]: route for route in stats.snapshot()}
+    assert routes["GET /items/{count}"]["requests"] == 2
+    assert routes["GET /items/{count}"]["queries"] == 6
+    assert routes["GET /items/{count}"]["max_queries"] == 4
+    assert routes["GET /items/{count}"]["avg_queries"] == 3
+    assert routes["GET /batch"]["queries"] == 1
+    assert routes["GET /items/{count}"]["n_plus_one_requests"] == 0
+
+
+def test_repeated_queries_are_flagged_as_n_plus_one(engine, stats, caplog):
+    with TestClient(_app(engine)) as client:
+        client.get("/items/12")
+        client.get("/items/3")
+
+    route = {route["route"]: route for route in stats.snapshot()}["GET /items/{count}"]
+    assert route["n_plus_one_requests"] == 1
+    assert route["suspects"] == [{"fingerprint": "SELECT name FROM items WHERE id = ?", "requests": 1, "max_repeats": 12}]
+    assert "Possible N+1 on GET /items/{count}: 12x" in caplog.text
+
+
+def test_headers_report_the_request_s_own_queries(engine, stats):
+    with TestClient(_app(engine, add_headers=True)) as client:
+        response = client.get("/items/10")
+
+    assert response.headers["x-db-queries"] == "10"
+    assert response.headers["x-db-n-plus-one"] == "1"
+    assert response.headers["server-timing"].startswith("db;dur=")
+
+
+def test_queries_after_the_request_is_answered_are_ignored():
+    queries = RequestQueries()
+    queries.record("SELECT 1", 1.0)
+    RouteQueryStats().observe("GET /x", queries)
+    queries.record("SELECT 1", 1.0)
+    assert queries.count == 1
+
+
+def test_queries_outside_a_request_are_not_counted(engine, stats):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert stats.snapshot() == []
@@ -0,0 +1,147 @@
+"""
+Per-route request metrics: fixed-bucket histograms, the Prometheus
+rendering, the timing middleware and who may read /metrics.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from middleware.request_logging import RequestTimingMiddleware
+from utils import request_metrics as metrics_module
+from utils.request_metrics import Histogram, RequestMetrics, metrics_access_allowed
+
+
+def test_observations_land_in_the_first_bucket_that_holds_them():
+    histogram = Histogram((0.1, 0.5, 1.0))
+    for value in (0.05, 0.1, 0.2, 1.0, 3.0):
+        histogram.observe(value)
+
+    # Bounds are inclusive, like Prometheus' le
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.cumulative() == [("0.1", 2), ("0.5", 3), ("1.0", 4), ("+Inf", 5)]
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(4.35)
+
+
+def test_quantiles_interpolate_inside_a_bucket():
+    histogram = Histogram((0.1, 0.2, 0.4))
+    for _ in range(10):
+        histogram.observe(0.15)
+    for _ in range(10):
+        histogram.observe(0.3)
+
+    assert histogram.quantile(0.25) == pytest.approx(0.15)
+    assert histogram.quantile(0.5) == pytest.approx(0.2)
+    assert histogram.quantile(0.75) == pytest.approx(0.3)
+    assert Histogram((1.0,)).quantile(0.5) == 0.0
+
+
+def test_quantiles_past_the_last_bound_report_the_bound():
+    histogram = Histogram((0.1, 1.0))
+    histogram.observe(0.05)
+    for _ in range(9):
+        histogram.observe(30.0)
+    assert histogram.quantile(0.99) == 1.0
+
+
+def test_snapshot_caps_percentiles_at_the_slowest_request():
+    metrics = RequestMetrics()
+    for duration in (0.011, 0.012, 0.013):
+        metrics.start()
+        metrics.finish("GET", "/api/users", 200, duration, 2_000)
+
+    route, = metrics.snapshot()
+    assert route["route"] == "GET /api/users"
+    assert route["requests"] == 3
+    # The 10-25ms bucket alone would put p99 near 25ms
+    assert route["p99_ms"] == route["max_ms"] == 13.0
+    assert route["avg_bytes"] == 2_000
+    assert route["statuses"] == {"200": 3}
+    assert metrics.in_flight == 0 and metrics.max_in_flight == 1
+
+
+def test_prometheus_rendering():
+    metrics = RequestMetrics()
+    metrics.start()
+    metrics.finish("GET", '/api/odd"route', 200, 0.02, 500)
+    metrics.start()
+    metrics.finish("GET", '/api/odd"route', 404, 0.2, 50)
+
+    text = metrics.render_prometheus()
+    labels = 'method="GET",route="/api/odd\\"route"'
+    assert "http_requests_in_flight 0" in text
+    assert f'http_requests_total{{{labels},status="200"}} 1' in text
+    assert f'http_requests_total{{{labels},status="404"}} 1' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.025"}} 1' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="0.25"}} 2' in text
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"http_request_duration_seconds_count{{{labels}}} 2" in text
+    assert f'http_response_size_bytes_bucket{{{labels},le="100"}} 1' in text
+    assert f"http_response_size_bytes_sum{{{labels}}} 550" in text
+    assert text.count("# TYPE") == 4 and text.endswith("\n")
+
+
+def test_middleware_records_route_templates_statuses_and_sizes():
+    metrics = RequestMetrics()
+    app = FastAPI()
+    app.add_middleware(RequestTimingMiddleware, metrics=metrics)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    @app.get("/stream")
+    async def stream():
+        return StreamingResponse(iter([b"x" * 300, b"y" * 300]))
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    with TestClient(app, raise_server_exceptions=False) as client:
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/stream")
+        client.get("/boom")
+        client.get("/nowhere")
+
+    routes = {route["route"]: route for route in metrics.snapshot()}
+    assert routes["GET /items/{item_id}"]["requests"] == 2
+    assert routes["GET /items/{item_id}"]["statuses"] == {"200": 2}
+    assert routes["GET /stream"]["avg_bytes"] == 600
+    assert routes["GET /boom"]["statuses"] == {"500": 1}
+    assert routes["GET unmatched"]["statuses"] == {"404": 1}
+    assert metrics.in_flight == 0
+
+
+@pytest.fixture
+def access(monkeypatch):
+    def configure(token="", networks=()):
+        monkeypatch.setattr(metrics_module, "METRICS_TOKEN", token)
+        monkeypatch.setattr(metrics_module, "METRICS_ALLOWED_IPS", [metrics_module.ip_network(n) for n in networks])
+    return configure
+
+
+def test_metrics_are_refused_until_access_is_configured(access):
+    access()
+    assert not metrics_access_allowed("127.0.0.1", None)
+    assert not metrics_access_allowed("10.0.0.5", "Bearer ")
+
+
+def test_metrics_token(access):
+    access(token="s3cret")
+    assert metrics_access_allowed("203.0.113.9", "Bearer s3cret")
+    assert metrics_access_allowed(None, "bearer s3cret")
+    assert not metrics_access_allowed("203.0.113.9", "Bearer wrong")
+    assert not metrics_access_allowed("203.0.113.9", "s3cret")
+    assert not metrics_access_allowed("203.0.113.9", None)
+
+
+def test_metrics_allowlist(access):
+    access(networks=["10.0.0.0/8", "::1"])
+    assert metrics_access_allowed("10.1.2.3", None)
+    assert metrics_access_allowed("::1", None)
+    assert not metrics_access_allowed("192.168.1.1", None)
+    assert not metrics_access_allowed("testclient", None)
+    assert not metrics_access_allowed(None, None)
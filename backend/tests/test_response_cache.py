@@ -0,0 +1,169 @@
+"""
+ETags and 304s for polled endpoints, against fakeredis for the version
+counters and a SQLite file for the users tokens resolve to.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from auth import token_cache
+from auth.dependencies import get_current_user
+from auth.token_cache import VerifiedTokenCache
+from database import get_db
+from middleware import response_cache
+from middleware.response_cache import ResponseCacheMiddleware
+from models import Base
+from models.user import User
+from utils.cache import redis_cache
+from utils.entity_versions import entity_versions, namespace
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch, fake_redis):
+    monkeypatch.setattr(token_cache, "verified_tokens", VerifiedTokenCache())
+    monkeypatch.setattr(response_cache, "response_cache_stats", dict.fromkeys(response_cache.response_cache_stats, 0))
+    engine = create_engine(f"sqlite:///{tmp_path / 'etags.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        for n in (1, 2):
+            db.add(User(email=f"u{n}@example.com", email_lower=f"u{n}@example.com", first_name="U", last_name=str(n),
+                        password_hash="x", role="user"))
+        db.commit()
+    monkeypatch.setattr(response_cache, "ReadSessionLocal", Session)
+    yield Session
+    engine.dispose()
+
+
+@pytest.fixture
+def client(sessions):
+    app = FastAPI()
+    app.add_middleware(ResponseCacheMiddleware, routes={"/notes": ("notes",)})
+    app.state.calls = []
+    notes = {1: "first note", 2: "second note"}
+
+    def get_test_db():
+        db = sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = get_test_db
+
+    @app.get("/notes")
+    def read_notes(user=Depends(get_current_user)):
+        app.state.calls.append(user.id)
+        return {"user": user.id, "note": notes[user.id]}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def _headers(sub, etag=None, secret=token_cache.SECRET_KEY):
+    claims = {"sub": str(sub), "aud": token_cache.AUDIENCE, "exp": int(time.time()) + 600}
+    headers = {"Authorization": f"Bearer {jwt.encode(claims, secret, algorithm=token_cache.ALGORITHM)}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    return headers
+
+
+def test_unchanged_data_is_answered_with_304(client):
+    first = client.get("/notes", headers=_headers(1))
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    again = client.get("/notes", headers=_headers(1, etag))
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert client.app.state.calls == [1]
+    assert response_cache.response_cache_stats["not_modified"] == 1
+
+
+def test_a_write_to_a_listed_table_changes_the_etag(client):
+    etag = client.get("/notes", headers=_headers(1)).headers["etag"]
+
+    async def write():
+        entity_versions.changed({"notes"})
+        await entity_versions.flush()
+
+    asyncio.run(write())
+    response = client.get("/notes", headers=_headers(1, etag))
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert client.app.state.calls == [1, 1]
+
+
+def test_a_bump_on_another_worker_is_seen_despite_the_local_tier(client):
+    etag = client.get("/notes", headers=_headers(1)).headers["etag"]
+    # Another worker bumps the counter; its invalidation message has not arrived here
+    redis_cache.local.set(f"ns_version:{namespace('notes')}", "0", 60)
+    asyncio.run(redis_cache.client.incr(f"ns_version:{namespace('notes')}"))
+
+    assert client.get("/notes", headers=_headers(1, etag)).status_code == 200
+
+
+def test_etags_are_per_user(client):
+    etag = client.get("/notes", headers=_headers(1)).headers["etag"]
+
+    other = client.get("/notes", headers=_headers(2, etag))
+    assert other.status_code == 200
+    assert other.json() == {"user": 2, "note": "second note"}
+    assert other.headers["etag"] != etag
+    # User 2's body came from the handler, not from user 1's cached body
+    assert client.app.state.calls == [1, 2]
+
+
+def test_a_forged_token_never_gets_a_304(client):
+    etag = client.get("/notes", headers=_headers(1)).headers["etag"]
+
+    forged = client.get("/notes", headers=_headers(1, etag, secret="not-the-secret"))
+    assert forged.status_code == 401
+    assert "etag" not in forged.headers
+    assert client.get("/notes", headers={"If-None-Match": etag}).status_code == 401
+    assert response_cache.response_cache_stats["not_modified"] == 0
+
+
+def test_a_deleted_user_never_gets_a_304(client, sessions, monkeypatch):
+    etag = client.get("/notes", headers=_headers(2)).headers["etag"]
+    with sessions() as db:
+        db.query(User).filter(User.id == 2).delete()
+        db.commit()
+    monkeypatch.setattr(token_cache, "USER_SNAPSHOT_TTL", -1)
+
+    assert client.get("/notes", headers=_headers(2, etag)).status_code == 401
+
+
+def test_without_redis_every_request_reaches_the_handler(client, fake_redis):
+    etag = client.get("/notes", headers=_headers(1)).headers["etag"]
+    fake_redis.connected = False
+
+    response = client.get("/notes", headers=_headers(1, etag))
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert client.app.state.calls == [1, 1]
+    assert response_cache.response_cache_stats["bypassed"] == 1
+
+
+def test_a_cached_body_serves_a_new_client_of_the_same_user(client):
+    first = client.get("/notes", headers=_headers(1))
+    second = client.get("/notes", headers=_headers(1))
+
+    assert second.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["etag"] == first.headers["etag"]
+    assert client.app.state.calls == [1]
+    assert response_cache.response_cache_stats["body_hits"] == 1
+
+
+def test_other_methods_pass_through(client):
+    response = client.post("/notes", headers=_headers(1))
+    assert response.status_code == 405
+    assert response_cache.response_cache_stats == dict.fromkeys(response_cache.response_cache_stats, 0)
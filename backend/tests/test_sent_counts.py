@@ -0,0 +1,203 @@
+"""
+Sent-message counters (sent_counts).
+
+The counters must always agree with sent_messages: inserts add to them,
+deletes take away from them, and the migration that introduced them
+backfills them from the existing sends.
+"""
+import asyncio
+import importlib.util
+import os
+from datetime import date, datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.orm import sessionmaker
+
+from models import Base
+from models.messages.message_template import MessageTemplate
+from models.sent_count import SentCount
+from models.sent_message import SentMessage
+from models.user import User
+from sent_messages.counters import (
+    delete_sent_messages,
+    get_template_sent_counts,
+    increment_sent_counts,
+    query_sent_counts,
+)
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations", "versions")
+
+MORNING = datetime(2025, 10, 18, 9, 0)
+EVENING = datetime(2025, 10, 18, 21, 0)
+NEXT_DAY = datetime(2025, 10, 19, 9, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'counts.db'}")
+    event.listen(engine, "connect", lambda dbapi_connection, _: dbapi_connection.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    for n in (1, 2):
+        session.add(User(email=f"c{n}@example.com", email_lower=f"c{n}@example.com", first_name="C", last_name=str(n),
+                         password_hash="x", role="user"))
+        session.add(MessageTemplate(name=f"t{n}", content="hi", message_type="friend_to_friend", status="ACTIVE"))
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _send(db, template_id, user_id, sent_at):
+    """Insert a send and count it, the way the writer does."""
+    db.add(SentMessage(message_template_id=template_id, user_id=user_id, sent_at=sent_at))
+    increment_sent_counts(db, [(template_id, user_id, sent_at)])
+
+
+def _counters(db):
+    return {
+        (row.template_id, row.user_id, row.day): row.n
+        for row in db.execute(select(SentCount)).scalars()
+    }
+
+
+def test_increment_upserts_per_template_user_and_day(db):
+    increment_sent_counts(db, [(1, 1, MORNING), (1, 1, EVENING), (1, 1, NEXT_DAY), (2, 1, MORNING)])
+    increment_sent_counts(db, [(1, 1, MORNING)])
+    db.commit()
+
+    assert _counters(db) == {
+        (1, 1, date(2025, 10, 18)): 3,
+        (1, 1, date(2025, 10, 19)): 1,
+        (2, 1, date(2025, 10, 18)): 1,
+    }
+
+
+def test_delete_sent_messages_decrements_and_drops_empty_counters(db):
+    _send(db, 1, 1, MORNING)
+    _send(db, 1, 1, EVENING)
+    _send(db, 1, 2, NEXT_DAY)
+    db.commit()
+
+    deleted = delete_sent_messages(db, SentMessage.sent_at == MORNING)
+    assert deleted == 1
+    assert _counters(db) == {(1, 1, date(2025, 10, 18)): 1, (1, 2, date(2025, 10, 19)): 1}
+
+    assert delete_sent_messages(db, SentMessage.user_id == 2) == 1
+    db.commit()
+    assert _counters(db) == {(1, 1, date(2025, 10, 18)): 1}
+    assert delete_sent_messages(db, SentMessage.user_id == 2) == 0
+
+
+def test_deleting_a_template_drops_its_counters(db):
+    _send(db, 1, 1, MORNING)
+    _send(db, 2, 1, MORNING)
+    db.commit()
+
+    db.execute(text("DELETE FROM message_templates WHERE id = 1"))
+    db.commit()
+
+    assert _counters(db) == {(2, 1, date(2025, 10, 18)): 1}
+    assert db.execute(select(SentMessage.message_template_id)).scalars().all() == [2]
+
+
+def test_counters_agree_with_sends_after_deleting_a_user(db):
+    from users.routes import delete_user
+
+    _send(db, 1, 1, MORNING)
+    _send(db, 1, 2, MORNING)
+    _send(db, 2, 2, NEXT_DAY)
+    db.commit()
+
+    admin = SimpleNamespace(email="admin@example.com", role="admin")
+    with pytest.raises(HTTPException) as not_allowed:
+        # Only admins may delete; nothing is touched otherwise
+        asyncio.run(delete_user(2, db=db, current_user=SimpleNamespace(email="c1@example.com", role="user")))
+    assert not_allowed.value.status_code == 403
+
+    asyncio.run(delete_user(2, db=db, current_user=admin))
+
+    db.expire_all()
+    assert _counters(db) == {(1, 1, date(2025, 10, 18)): 1}
+    assert get_template_sent_counts(db, [1, 2]) == {1: 1}
+    assert db.execute(select(SentMessage.user_id)).scalars().all() == [1]
+
+
+def test_query_sent_counts_groups_and_filters(db):
+    for template_id, user_id, sent_at in [(1, 1, MORNING), (1, 1, EVENING), (1, 2, NEXT_DAY), (2, 2, NEXT_DAY)]:
+        _send(db, template_id, user_id, sent_at)
+    db.commit()
+
+    assert query_sent_counts(db, ["template"]) == [
+        {"template_id": 1, "sent_count": 3},
+        {"template_id": 2, "sent_count": 1},
+    ]
+    assert query_sent_counts(db, ["user", "day"], template_id=1) == [
+        {"user_id": 1, "day": date(2025, 10, 18), "sent_count": 2},
+        {"user_id": 2, "day": date(2025, 10, 19), "sent_count": 1},
+    ]
+    assert query_sent_counts(db, ["user"], since=date(2025, 10, 19)) == [{"user_id": 2, "sent_count": 2}]
+    assert query_sent_counts(db, []) == [{"sent_count": 4}]
+
+
+def test_counts_endpoint_scopes_non_admins_to_their_own_sends(db):
+    from sent_messages.routes import get_sent_counts
+
+    _send(db, 1, 1, MORNING)
+    _send(db, 1, 2, MORNING)
+    _send(db, 1, 2, NEXT_DAY)
+    db.commit()
+
+    def counts(user, **params):
+        params = {"group_by": ["user"], "template_id": None, "user_id": None, "since": None, "until": None, **params}
+        return asyncio.run(get_sent_counts(db=db, current_user=user, **params))
+
+    admin = SimpleNamespace(id=99, role="admin")
+    assert counts(admin) == [{"user_id": 2, "sent_count": 2}, {"user_id": 1, "sent_count": 1}]
+    assert counts(admin, user_id=1) == [{"user_id": 1, "sent_count": 1}]
+    # A user asking for someone else's counts gets their own
+    assert counts(SimpleNamespace(id=1, role="user"), user_id=2) == [{"user_id": 1, "sent_count": 1}]
+
+    with pytest.raises(HTTPException) as invalid:
+        counts(admin, group_by=["week"])
+    assert invalid.value.status_code == 400
+
+
+def _load_migration(filename):
+    spec = importlib.util.spec_from_file_location(filename[:-3], os.path.join(MIGRATIONS, filename))
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    return migration
+
+
+def test_migration_backfills_counters_from_existing_sends(engine, db):
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    migration = _load_migration("20251019100000_add_sent_counts.py")
+    for template_id, user_id, sent_at in [(1, 1, MORNING), (1, 1, EVENING), (1, 1, NEXT_DAY), (2, 2, MORNING)]:
+        db.add(SentMessage(message_template_id=template_id, user_id=user_id, sent_at=sent_at))
+    db.commit()
+    # Rows without a timestamp have no day to count under
+    db.execute(text("UPDATE sent_messages SET sent_at = NULL WHERE user_id = 2"))
+    db.commit()
+    db.close()
+
+    with engine.begin() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            migration.downgrade()
+            migration.upgrade()
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT template_id, user_id, day, n FROM sent_counts ORDER BY day")).all()
+    assert [tuple(row) for row in rows] == [(1, 1, "2025-10-18", 2), (1, 1, "2025-10-19", 1)]
@@ -0,0 +1,242 @@
+"""
+Sent-message write-behind buffer.
+
+The batching tests replace the database write with a recorder, so they
+check only when the buffer flushes and what each caller gets back. The
+insert tests run the real writer unit on a SQLite connection with foreign
+keys on.
+"""
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+
+import database
+from models import Base
+from models.messages.message_template import MessageTemplate
+from models.sent_count import SentCount
+from models.sent_message import SentMessage
+from models.shared_contact import SharedContact
+from models.targets.target_contact import TargetContact
+from models.targets.target_list import TargetList
+from models.user import User
+from sent_messages import ingest
+from sent_messages.ingest import SentMessageBuffer, UnknownReference
+
+
+class _Recorder:
+    """Stands in for the database write and records each batch."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def __call__(self, batch):
+        self.batches.append(list(batch))
+        return [
+            {"id": len(self.batches) * 1000 + i, "user_id": key[0], "message_template_id": key[1],
+             "shared_contact_id": key[2], "target_contact_id": key[3], "sent_at": datetime.utcnow(), "inserted": True}
+            for i, key in enumerate(batch)
+        ]
+
+
+@pytest.fixture
+def written(monkeypatch):
+    recorder = _Recorder()
+    monkeypatch.setattr(ingest, "_write_batch", recorder)
+    return recorder
+
+
+def test_full_batch_flushes_without_waiting(written):
+    buffer = SentMessageBuffer(flush_interval_ms=10_000, batch_size=3)
+
+    async def run():
+        started = time.monotonic()
+        results = await asyncio.gather(*(buffer.submit(1, 1, contact) for contact in range(3)))
+        elapsed = time.monotonic() - started
+        await buffer.close()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    assert elapsed < 5
+    assert written.batches == [[(1, 1, 0, None), (1, 1, 1, None), (1, 1, 2, None)]]
+    assert all(result["inserted"] for result in results)
+
+
+def test_partial_batch_flushes_after_interval(written):
+    buffer = SentMessageBuffer(flush_interval_ms=20, batch_size=100)
+
+    async def run():
+        result = await buffer.submit(1, 1, 7)
+        await buffer.close()
+        return result
+
+    result = asyncio.run(run())
+    assert written.batches == [[(1, 1, 7, None)]]
+    assert result["shared_contact_id"] == 7
+    assert buffer.stats["batches"] == 1
+
+
+def test_close_drains_buffered_events(written):
+    buffer = SentMessageBuffer(flush_interval_ms=10_000, batch_size=2)
+
+    async def run():
+        tasks = [asyncio.ensure_future(buffer.submit(1, 1, contact)) for contact in range(5)]
+        # Let every submit queue its event
+        await asyncio.sleep(0)
+        await buffer.close()
+        return await asyncio.gather(*tasks)
+
+    results = asyncio.run(run())
+    assert sorted(key for batch in written.batches for key in batch) == [(1, 1, c, None) for c in range(5)]
+    assert len(results) == 5
+
+
+def test_identical_pending_events_share_one_write(written):
+    buffer = SentMessageBuffer(flush_interval_ms=20, batch_size=100)
+
+    async def run():
+        results = await asyncio.gather(buffer.submit(1, 1, 5), buffer.submit(1, 1, 5), buffer.submit(1, 1, None, 9))
+        await buffer.close()
+        return results
+
+    first, second, neighbor = asyncio.run(run())
+    assert written.batches == [[(1, 1, 5, None), (1, 1, None, 9)]]
+    assert first["inserted"] and not second["inserted"]
+    assert first["id"] == second["id"]
+    assert neighbor["target_contact_id"] == 9
+    assert buffer.stats["coalesced"] == 1
+
+
+def test_failed_batch_fails_its_callers(monkeypatch):
+    async def broken(batch):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(ingest, "_write_batch", broken)
+    buffer = SentMessageBuffer(flush_interval_ms=5, batch_size=100)
+
+    async def run():
+        try:
+            with pytest.raises(RuntimeError):
+                await buffer.submit(1, 1, 1)
+        finally:
+            await buffer.close()
+
+    asyncio.run(run())
+    assert buffer.stats["errors"] == 1
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'sent.db'}")
+    event.listen(engine, "connect", lambda dbapi_connection, _: dbapi_connection.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    user = User(email="buf@example.com", email_lower="buf@example.com", first_name="B", last_name="F",
+                password_hash="x", role="user")
+    target_list = TargetList(name="buf")
+    template = MessageTemplate(name="buf", content="hi", message_type="friend_to_friend", status="ACTIVE")
+    session.add_all([user, target_list, template])
+    session.flush()
+    session.add_all([
+        SharedContact(user_id=user.id, first_name="S", last_name="C", mobile1="5550000001"),
+        TargetContact(list_id=target_list.id, voter_id="v1", first_name="T", last_name="C", zip_code="12345"),
+    ])
+    session.commit()
+    session.close()
+    yield engine
+    engine.dispose()
+
+
+def _apply(engine, events):
+    with engine.begin() as conn:
+        return ingest._insert_events(conn, events)
+
+
+def test_insert_ignores_duplicates_and_counts_new_rows(engine):
+    first = _apply(engine, [(1, 1, 1, None), (1, 1, None, 1)])
+    again = _apply(engine, [(1, 1, 1, None), (1, 1, None, 1)])
+
+    assert [result["inserted"] for result in first] == [True, True]
+    assert [result["inserted"] for result in again] == [False, False]
+    assert again[0]["id"] is None and again[1]["id"] is None
+    with engine.connect() as conn:
+        assert conn.execute(select(SentMessage.id).order_by(SentMessage.id)).all() == [(1,), (2,)]
+        assert conn.execute(select(SentCount.n)).scalar() == 2
+
+
+def test_a_retried_neighbor_send_in_a_later_flush_is_ignored(monkeypatch, engine):
+    async def write(batch):
+        with engine.begin() as conn:
+            return ingest._insert_events(conn, batch)
+
+    monkeypatch.setattr(ingest, "_write_batch", write)
+    buffer = SentMessageBuffer(flush_interval_ms=5, batch_size=100)
+
+    async def run():
+        try:
+            first = await buffer.submit(1, 1, None, 1)
+            retry = await buffer.submit(1, 1, None, 1)
+        finally:
+            await buffer.close()
+        return first, retry
+
+    first, retry = asyncio.run(run())
+    assert first["inserted"] and not retry["inserted"]
+    assert buffer.stats["batches"] == 2 and buffer.stats["ignored"] == 1
+    with engine.connect() as conn:
+        assert conn.execute(select(SentMessage.target_contact_id)).scalars().all() == [1]
+        assert conn.execute(select(SentCount.n)).scalars().all() == [1]
+
+
+def test_unknown_reference_rejects_only_its_event(engine):
+    results = _apply(engine, [(1, 999, 1, None), (1, 1, 1, None)])
+
+    assert "error" in results[0]
+    assert results[1]["inserted"]
+    with engine.connect() as conn:
+        assert conn.execute(select(SentMessage.message_template_id)).scalars().all() == [1]
+
+
+def test_unknown_reference_raises_for_the_caller(monkeypatch, engine):
+    async def write(batch):
+        with engine.begin() as conn:
+            return ingest._insert_events(conn, batch)
+
+    monkeypatch.setattr(ingest, "_write_batch", write)
+    buffer = SentMessageBuffer(flush_interval_ms=5, batch_size=100)
+
+    async def run():
+        try:
+            with pytest.raises(UnknownReference):
+                await buffer.submit(1, 1, None, 999)
+        finally:
+            await buffer.close()
+
+    asyncio.run(run())
+
+
+def test_sent_at_is_stamped_when_the_batch_is_written(engine):
+    before = datetime.utcnow()
+    results = _apply(engine, [(1, 1, 1, None), (1, 1, None, 1)])
+
+    assert all(result["sent_at"] >= before for result in results)
+    with engine.connect() as conn:
+        assert all(sent_at >= before for sent_at in conn.execute(select(SentMessage.sent_at)).scalars())
+
+
+def test_concurrent_groups_commit_ids_in_order(engine, concurrent_writer_groups):
+    writer_engine = database._configure(create_engine(engine.url), immediate=True)
+    try:
+        first, second = concurrent_writer_groups(writer_engine, engine, [(1, 1, 1, None)], [(1, 1, None, 1)])
+    finally:
+        writer_engine.dispose()
+
+    # The batch that commits later never draws an id below one already visible
+    assert max(first) < min(second)
+    with engine.connect() as conn:
+        rows = conn.execute(select(SentMessage.id, SentMessage.sent_at).order_by(SentMessage.id)).all()
+    assert [row.id for row in rows] == first + second
+    assert rows[0].sent_at < rows[1].sent_at
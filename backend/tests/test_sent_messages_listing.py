@@ -0,0 +1,92 @@
+"""
+Sent messages listing: id-keyed cursor pagination.
+"""
+import asyncio
+import base64
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base
+from models.messages.message_template import MessageTemplate
+from models.sent_message import SentMessage
+from models.user import User
+from sent_messages.routes import get_sent_messages
+
+ADMIN = SimpleNamespace(id=0, role="admin")
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'listing.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for n in (1, 2):
+        session.add(User(email=f"l{n}@example.com", email_lower=f"l{n}@example.com", first_name="L", last_name=str(n),
+                         password_hash="x", role="user"))
+    session.add(MessageTemplate(name="t", content="hi", message_type="friend_to_friend", status="ACTIVE"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _page(db, current_user=ADMIN, **params):
+    response = Response()
+    params = {"contact_id": None, "user_id": None, "limit": 2, "cursor": None, "updated_since": None, **params}
+    rows = asyncio.run(get_sent_messages(response, db=db, current_user=current_user, **params))
+    return [row["id"] for row in rows], response.headers
+
+
+def _send(db, user_id, sent_at):
+    sent = SentMessage(user_id=user_id, message_template_id=1, sent_at=sent_at)
+    db.add(sent)
+    db.commit()
+    return sent.id
+
+
+def test_pages_follow_id_not_sent_at(db):
+    # The later row carries the earlier timestamp, as when it was stamped
+    # before a slower commit; paging on sent_at would skip it
+    first = _send(db, 1, datetime(2025, 10, 19, 12, 0, 5))
+    ids, headers = _page(db)
+    assert ids == [first] and headers["X-Has-More"] == "false"
+
+    late = _send(db, 1, datetime(2025, 10, 19, 12, 0, 1))
+    ids, headers = _page(db, cursor=headers["X-Next-Cursor"])
+    assert ids == [late]
+
+
+def test_cursor_walks_every_row_once(db):
+    sent = [_send(db, 1 + n % 2, datetime(2025, 10, 19, 12, n)) for n in range(5)]
+    seen, cursor, has_more = [], None, "true"
+    while has_more == "true":
+        ids, headers = _page(db, cursor=cursor)
+        seen += ids
+        cursor, has_more = headers["X-Next-Cursor"], headers["X-Has-More"]
+    assert seen == sent
+
+    # Nothing new: the same cursor comes back
+    ids, headers = _page(db, cursor=cursor)
+    assert ids == [] and headers["X-Next-Cursor"] == cursor
+
+
+def test_non_admins_page_through_their_own_sends(db):
+    sent = [_send(db, 1 + n % 2, datetime(2025, 10, 19, 12, n)) for n in range(4)]
+    ids, _ = _page(db, current_user=SimpleNamespace(id=2, role="user"), limit=10, user_id=None)
+    assert ids == sent[1::2]
+
+
+def test_old_sent_at_cursors_still_resume_after_their_id(db):
+    sent = [_send(db, 1, datetime(2025, 10, 19, 12, n)) for n in range(3)]
+    old = base64.urlsafe_b64encode(f"2025-10-19T12:00:00|{sent[0]}".encode()).decode().rstrip("=")
+    ids, _ = _page(db, cursor=old)
+    assert ids == sent[1:]
+
+    with pytest.raises(HTTPException) as invalid:
+        _page(db, cursor="not-a-cursor")
+    assert invalid.value.status_code == 400
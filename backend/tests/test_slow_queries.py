@@ -0,0 +1,105 @@
+"""
+Slow-query log: statements over the threshold are kept with their route,
+a hash of their parameters and, the first time, their query plan.
+"""
+import contextvars
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine, event, text
+
+import database
+from utils import slow_queries
+from utils.query_stats import begin_request
+from utils.slow_queries import SlowQueryLog
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    event.listen(engine, "before_cursor_execute", database.before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", database.after_cursor_execute)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, owner_id INTEGER, name TEXT)"))
+        conn.execute(text("CREATE INDEX ix_items_owner_id ON items (owner_id)"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    """A log that treats every statement as slow, persisting to a temp side file."""
+    log = SlowQueryLog(path=str(tmp_path / "slow.db"), threshold_ms=-1)
+    monkeypatch.setattr(database, "slow_query_log", log)
+    return log
+
+
+def test_slow_statements_are_recorded_with_their_route_and_plan(engine, log):
+    def serve_request():
+        begin_request({"method": "GET", "route": SimpleNamespace(path="/items/{owner}")})
+        with engine.connect() as conn:
+            for owner in (1, 2, 3):
+                conn.execute(text("SELECT name FROM items WHERE owner_id = :owner"), {"owner": owner})
+            conn.execute(text("SELECT name FROM items WHERE name = 'secret'"))
+
+    contextvars.copy_context().run(serve_request)
+
+    lookups = [event for event in log.recent if "owner_id" in event["fingerprint"]]
+    assert len(lookups) == 3
+    assert lookups[0]["route"] == "GET /items/{owner}"
+    assert lookups[0]["fingerprint"] == "SELECT name FROM items WHERE owner_id = ?"
+    # Parameters are hashed, never stored
+    assert len({event["params_hash"] for event in lookups}) == 3
+    assert all("secret" not in str(event) for event in log.recent)
+
+    top = {row["fingerprint"]: row for row in log.top()}
+    assert top["SELECT name FROM items WHERE owner_id = ?"]["calls"] == 3
+    assert "USING INDEX ix_items_owner_id" in top["SELECT name FROM items WHERE owner_id = ?"]["plan"]
+    assert "SCAN items" in top["SELECT name FROM items WHERE name = ?"]["plan"]
+
+
+def test_the_plan_is_captured_once_per_statement(engine, log, monkeypatch):
+    explained = []
+    explain = slow_queries.explain_query_plan
+
+    def recording_explain(dbapi_connection, statement, parameters):
+        explained.append(statement)
+        return explain(dbapi_connection, statement, parameters)
+
+    monkeypatch.setattr(slow_queries, "explain_query_plan", recording_explain)
+    with engine.connect() as conn:
+        for owner in range(5):
+            conn.execute(text("SELECT name FROM items WHERE owner_id = :owner"), {"owner": owner})
+
+    assert explained == ["SELECT name FROM items WHERE owner_id = ?"]
+
+
+def test_totals_survive_a_restart(engine, log):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT name FROM items WHERE owner_id = 1"))
+    log.flush()
+
+    restarted = SlowQueryLog(path=log.path, threshold_ms=-1)
+    with sqlite3.connect(log.path) as db:
+        assert db.execute("SELECT calls FROM slow_queries").fetchall() == [(1,)]
+    assert restarted.top()[0]["fingerprint"] == "SELECT name FROM items WHERE owner_id = ?"
+    assert restarted.top()[0]["avg_ms"] >= 0
+
+
+def test_fast_statements_are_not_recorded(engine, monkeypatch):
+    log = SlowQueryLog(path="", threshold_ms=10_000)
+    monkeypatch.setattr(database, "slow_query_log", log)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert list(log.recent) == [] and log.top() == []
+
+
+def test_without_a_side_file_totals_stay_in_memory(engine, monkeypatch):
+    log = SlowQueryLog(path="", threshold_ms=-1)
+    monkeypatch.setattr(database, "slow_query_log", log)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT name FROM items"))
+        conn.execute(text("SELECT name FROM items"))
+
+    assert [(row["fingerprint"], row["calls"]) for row in log.top()] == [("SELECT name FROM items", 2)]
@@ -0,0 +1,113 @@
+"""
+Startup benchmark.
+
+Boots the application in a fresh interpreter, the way a new worker starts,
+and fails if building the app takes longer than STARTUP_BUDGET_S. Each test
+uses its own SQLite file, so the first boot creates and stamps the schema
+and the ones after it only check the revision.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Wall-clock seconds for `import main`, interpreter start included
+STARTUP_BUDGET_S = float(os.getenv("STARTUP_BUDGET_S", "4.0"))
+
+
+def _boot(tmp_path, code="import main", **env):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env={
+            **os.environ,
+            "PYTHONPATH": BACKEND_DIR,
+            "DATABASE_URL": f"sqlite:///{tmp_path / 'startup.db'}",
+            "SLOW_QUERY_DB_PATH": "",
+            **env,
+        },
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    return time.perf_counter() - started, result
+
+
+@pytest.fixture
+def booted(tmp_path):
+    _, result = _boot(tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert "Created database schema at revision" in result.stdout
+    return tmp_path
+
+
+def test_startup_within_budget(booted):
+    timings = []
+    for _ in range(3):
+        elapsed, result = _boot(booted)
+        assert result.returncode == 0, result.stderr
+        timings.append(elapsed)
+    assert "Database schema is at revision" in result.stdout
+    assert "ALL REGISTERED ROUTES" not in result.stdout
+    assert min(timings) < STARTUP_BUDGET_S, f"startup took {min(timings):.2f}s, budget {STARTUP_BUDGET_S}s"
+
+
+def test_profile_reports_imports(booted):
+    _, result = _boot(booted, STARTUP_PROFILE="true", LAZY_ROUTERS="false")
+    assert result.returncode == 0, result.stderr
+    assert "router users.routes" in result.stdout
+    assert "Slowest of" in result.stdout
+    assert "fastapi" in result.stdout
+
+
+def test_routers_load_on_first_use(booted):
+    code = """
+import sys
+from fastapi.testclient import TestClient
+import main
+
+assert "users.routes" not in sys.modules and "contacts.routes" not in sys.modules
+client = TestClient(main.app)
+assert client.get("/api/users/").status_code == 401
+assert "users.routes" in sys.modules and "contacts.routes" not in sys.modules
+paths = client.get("/api/openapi.json").json()["paths"]
+assert "/api/contacts/shared" in paths and "/api/admin/startup" in paths
+assert not main.routers.pending
+print("lazy ok")
+"""
+    _, result = _boot(booted, code=code)
+    assert result.returncode == 0, result.stderr
+    assert "lazy ok" in result.stdout
+
+
+def test_routers_pending_at_startup_load_in_the_background(booted):
+    code = """
+import time
+from fastapi.testclient import TestClient
+import main
+
+with TestClient(main.app):
+    deadline = time.monotonic() + 30
+    while main.routers.pending and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not main.routers.pending
+    from utils.warmup import _builders
+    assert "users_list" in _builders
+print("preload ok")
+"""
+    _, result = _boot(booted, code=code)
+    assert result.returncode == 0, result.stderr
+    assert "preload ok" in result.stdout
+
+
+def test_strict_check_refuses_old_schema(booted):
+    with sqlite3.connect(booted / "startup.db") as db:
+        db.execute("UPDATE alembic_version SET version_num = '20251019120000'")
+    _, result = _boot(booted, DB_SCHEMA_CHECK="strict")
+    assert result.returncode != 0
+    assert "run `alembic upgrade head`" in result.stderr
@@ -0,0 +1,178 @@
+"""
+Verified-token cache: a token is decoded and its user loaded once, then
+served from memory until it expires, the snapshot goes stale, or the user
+is invalidated.
+"""
+import asyncio
+import time
+
+import pytest
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError, JWTError
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from auth import token_cache
+from auth.token_cache import VerifiedTokenCache, resolve_token_user
+from models import Base
+from models.user import User
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    cache = VerifiedTokenCache(max_entries=100)
+    monkeypatch.setattr(token_cache, "verified_tokens", cache)
+    return cache
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tokens.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    for n in (1, 2):
+        session.add(User(email=f"T{n}@Example.com", email_lower=f"t{n}@example.com", first_name="T", last_name=str(n),
+                         password_hash="x", role="user"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _token(sub, expires_in=3600, secret=token_cache.SECRET_KEY):
+    claims = {"sub": str(sub), "aud": token_cache.AUDIENCE, "exp": int(time.time()) + expires_in}
+    return jwt.encode(claims, secret, algorithm=token_cache.ALGORITHM)
+
+
+class _Queries:
+    """Counts the SELECTs run on the session's engine while the block runs."""
+
+    def __init__(self, db):
+        self.engine = db.get_bind()
+        self.count = 0
+
+    def _record(self, conn, cursor, statement, *args):
+        self.count += statement.lstrip().upper().startswith("SELECT")
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+def test_second_request_needs_no_decode_and_no_query(db, tokens, monkeypatch):
+    token = _token(1)
+    first = resolve_token_user(db, token)
+    db.expunge_all()
+
+    monkeypatch.setattr(token_cache.jwt, "decode", lambda *args, **kwargs: pytest.fail("decoded again"))
+    with _Queries(db) as queries:
+        second = resolve_token_user(db, token)
+        email, role = second.email, second.role
+
+    assert (first.id, second.id) == (1, 1)
+    assert (email, role) == ("T1@Example.com", "user")
+    assert queries.count == 0
+    assert tokens.stats == {**tokens.stats, "hits": 1, "misses": 1}
+
+
+def test_tokens_that_fail_verification_are_never_cached(db, tokens):
+    with pytest.raises(ExpiredSignatureError):
+        resolve_token_user(db, _token(1, expires_in=-10))
+    with pytest.raises(JWTError):
+        resolve_token_user(db, _token(1, secret="not-the-secret"))
+    with pytest.raises(JWTError):
+        resolve_token_user(db, _token(1)[:-2] + "xx")
+    assert len(tokens) == 0
+
+
+def test_entries_expire_with_their_token(db, tokens, monkeypatch):
+    token = _token(1, expires_in=60)
+    resolve_token_user(db, token)
+    assert tokens.get(token_cache.token_key(token)) is not None
+
+    later = time.time() + 61
+    monkeypatch.setattr(token_cache.time, "time", lambda: later)
+    assert tokens.get(token_cache.token_key(token)) is None
+    assert len(tokens) == 0
+
+
+def test_stale_snapshot_is_reread(db, tokens, monkeypatch):
+    token = _token(1)
+    resolve_token_user(db, token)
+    db.query(User).filter(User.id == 1).update({"role": "admin"})
+    db.commit()
+
+    assert resolve_token_user(db, token).role == "user"
+    monkeypatch.setattr(token_cache, "USER_SNAPSHOT_TTL", -1)
+    assert resolve_token_user(db, token).role == "admin"
+    assert tokens.stats["snapshot_refreshes"] == 1
+
+
+def test_deleted_user_is_noticed_when_the_snapshot_is_reread(db, tokens, monkeypatch):
+    token = _token(2)
+    resolve_token_user(db, token)
+    db.query(User).filter(User.id == 2).delete()
+    db.commit()
+    monkeypatch.setattr(token_cache, "USER_SNAPSHOT_TTL", -1)
+
+    assert resolve_token_user(db, token) is None
+    assert len(tokens) == 0
+
+
+def test_invalidate_user_revokes_every_token_of_that_user(db, tokens, fake_redis):
+    first, second, other = _token(1), _token(1, expires_in=7200), _token(2)
+    for token in (first, second, other):
+        resolve_token_user(db, token)
+    db.query(User).filter(User.id == 1).delete()
+    db.commit()
+
+    async def run():
+        await token_cache.redis_cache.set(f"{token_cache.USER_CACHE_PREFIX}1", "cached user")
+        await token_cache.invalidate_user(1, "T1@Example.com")
+        return await token_cache.redis_cache.client.exists(f"{token_cache.USER_CACHE_PREFIX}1")
+
+    assert asyncio.run(run()) == 0
+    assert len(tokens) == 1
+    # Without the cached entry the token is verified again, and its user is gone
+    assert resolve_token_user(db, first) is None
+    assert resolve_token_user(db, other).id == 2
+
+
+def test_invalidation_from_another_worker_drops_the_user(db, tokens):
+    resolve_token_user(db, _token(1))
+    resolve_token_user(db, _token(2))
+
+    token_cache._on_remote_invalidation(f"{token_cache.USER_CACHE_PREFIX}1")
+    token_cache._on_remote_invalidation(f"{token_cache.USER_CACHE_PREFIX}not-an-id")
+    token_cache._on_remote_invalidation("users:list")
+
+    assert len(tokens) == 1
+    assert tokens.stats["user_invalidations"] == 1
+
+
+def test_older_tokens_carrying_an_email_resolve(db, tokens):
+    assert resolve_token_user(db, _token("t2@EXAMPLE.com")).id == 2
+    assert resolve_token_user(db, _token("nobody@example.com")) is None
+    assert len(tokens) == 1
+
+
+def test_least_recently_used_tokens_are_evicted(db, monkeypatch):
+    tokens = VerifiedTokenCache(max_entries=2)
+    monkeypatch.setattr(token_cache, "verified_tokens", tokens)
+    first, second, third = _token(1), _token(1, expires_in=7200), _token(2)
+
+    resolve_token_user(db, first)
+    resolve_token_user(db, second)
+    resolve_token_user(db, first)
+    resolve_token_user(db, third)
+
+    assert tokens.get(token_cache.token_key(second)) is None
+    assert tokens.get(token_cache.token_key(first)) is not None
+    assert tokens.stats["evictions"] == 1
+    # The per-user index follows evictions, so dropping the user leaves nothing behind
+    tokens.drop_user(1)
+    tokens.drop_user(2)
+    assert len(tokens) == 0 and tokens._by_user == {}
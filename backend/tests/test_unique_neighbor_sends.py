@@ -0,0 +1,85 @@
+"""
+The migration making neighbor sends unique.
+"""
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base
+from models.messages.message_template import MessageTemplate
+from models.sent_count import SentCount
+from models.sent_message import SentMessage
+from models.targets.target_contact import TargetContact
+from models.targets.target_list import TargetList
+from models.user import User
+from sent_messages.counters import increment_sent_counts
+
+MIGRATION = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "migrations", "versions", "20251019160000_sent_messages_unique_neighbor_sends.py",
+)
+
+
+@pytest.fixture
+def migration():
+    spec = importlib.util.spec_from_file_location("sent_messages_unique_neighbor_sends", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def engine(tmp_path, migration):
+    """The schema as it was before the migration, with one user, template and two targets."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'neighbors.db'}")
+    Base.metadata.create_all(engine)
+    _run(engine, migration.downgrade)
+    with sessionmaker(bind=engine)() as session:
+        target_list = TargetList(name="n")
+        session.add_all([
+            User(email="n@example.com", email_lower="n@example.com", first_name="N", last_name="S",
+                 password_hash="x", role="user"),
+            MessageTemplate(name="n", content="hi", message_type="neighbor_to_neighbor", status="ACTIVE"),
+            target_list,
+        ])
+        session.flush()
+        session.add_all([
+            TargetContact(list_id=target_list.id, voter_id=f"v{n}", first_name="T", last_name="C", zip_code="1")
+            for n in (1, 2)
+        ])
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def _run(engine, step):
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    with engine.begin() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            step()
+
+
+def test_duplicate_neighbor_sends_are_removed_and_uncounted(engine, migration):
+    days = [datetime(2025, 10, 1, 9), datetime(2025, 10, 1, 10), datetime(2025, 10, 2, 9), datetime(2025, 10, 1, 11)]
+    sends = [(1, 1, 1, days[0]), (1, 1, 1, days[1]), (1, 1, 1, days[2]), (1, 1, 2, days[3])]
+    with engine.begin() as conn:
+        conn.execute(SentMessage.__table__.insert(), [
+            {"user_id": user_id, "message_template_id": template_id, "target_contact_id": target_id, "sent_at": sent_at}
+            for user_id, template_id, target_id, sent_at in sends
+        ])
+        increment_sent_counts(conn, [(template_id, user_id, sent_at) for user_id, template_id, _, sent_at in sends])
+
+    _run(engine, migration.upgrade)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(SentMessage.id).order_by(SentMessage.id)).scalars().all() == [1, 4]
+        assert conn.execute(select(SentCount.day, SentCount.n)).all() == [(days[0].date(), 2)]
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("sent_messages")}
+    assert indexes["uq_sent_messages_user_template_target"]["unique"]
+    assert "ix_sent_messages_user_template_target" not in indexes
@@ -0,0 +1,105 @@
+"""
+The migration adding users.email_lower.
+"""
+import importlib.util
+import os
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from models import Base
+from models.user import normalize_email
+
+MIGRATION = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "migrations", "versions", "20251019120000_users_email_lower.py",
+)
+
+
+@pytest.fixture
+def migration():
+    spec = importlib.util.spec_from_file_location("users_email_lower", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def engine(tmp_path, migration):
+    """The schema as it was before the migration."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'email.db'}")
+    Base.metadata.create_all(engine)
+    _run(engine, migration.downgrade)
+    yield engine
+    engine.dispose()
+
+
+def _run(engine, step):
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    with engine.begin() as conn:
+        with Operations.context(MigrationContext.configure(conn)):
+            step()
+
+
+def _add_users(engine, *emails):
+    with engine.begin() as conn:
+        for n, email in enumerate(emails):
+            conn.execute(text(
+                "INSERT INTO users (email, first_name, last_name, password_hash, role, has_shared_contacts) "
+                "VALUES (:email, 'U', :n, 'x', 'user', 0)"
+            ), {"email": email, "n": str(n)})
+
+
+def test_emails_are_normalized_and_indexed(engine, migration):
+    _add_users(engine, "Alice@Example.com", " bob@example.com ")
+    _run(engine, migration.upgrade)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT email_lower FROM users ORDER BY id")).scalars().all() == [
+            "alice@example.com", "bob@example.com",
+        ]
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("users")}
+    assert indexes["ix_users_email_lower"]["unique"]
+
+
+def test_case_duplicates_stop_the_upgrade_and_are_listed(engine, migration):
+    _add_users(engine, "Carol@example.com", "dave@example.com", "carol@EXAMPLE.com ", "CAROL@example.com")
+
+    with pytest.raises(RuntimeError) as failed:
+        _run(engine, migration.upgrade)
+
+    message = str(failed.value)
+    for user_id, email in ((1, "Carol@example.com"), (3, "carol@EXAMPLE.com "), (4, "CAROL@example.com")):
+        assert f"carol@example.com: user {user_id} ({email})" in message
+    assert "dave" not in message
+    # Nothing was changed, and nobody was left without a login
+    assert "email_lower" not in {column["name"] for column in inspect(engine).get_columns("users")}
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE users SET email = 'carol+2@example.com' WHERE id = 3"))
+        conn.execute(text("DELETE FROM users WHERE id = 4"))
+    _run(engine, migration.upgrade)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM users WHERE email_lower IS NULL")).scalar() == 0
+
+
+def test_emails_are_normalized_like_lookups(engine, migration):
+    _add_users(engine, "ÉMILE@x.com", "a@x.com\t")
+    _run(engine, migration.upgrade)
+
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT email_lower FROM users ORDER BY id")).scalars().all()
+    assert stored == [normalize_email("ÉMILE@x.com"), normalize_email("a@x.com\t")] == ["émile@x.com", "a@x.com"]
+
+
+def test_duplicates_are_found_the_way_lookups_normalize(engine, migration):
+    _add_users(engine, "émile@x.com", "ÉMILE@x.com", "a@x.com", "a@x.com\t")
+
+    with pytest.raises(RuntimeError) as failed:
+        _run(engine, migration.upgrade)
+
+    message = str(failed.value)
+    assert "émile@x.com: user 1 (émile@x.com)" in message and "émile@x.com: user 2 (ÉMILE@x.com)" in message
+    assert "a@x.com: user 3 (a@x.com)" in message and "a@x.com: user 4 (a@x.com\t)" in message
@@ -0,0 +1,141 @@
+"""
+Cache warm-up: builders run once at startup and again, debounced, after
+their tags are invalidated.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from utils import cache, warmup
+
+
+@pytest.fixture
+def builders(monkeypatch):
+    """An empty builder registry with a short debounce; returns the run log."""
+    monkeypatch.setattr(warmup, "_builders", {})
+    monkeypatch.setattr(warmup, "_builders_by_tag", {})
+    monkeypatch.setattr(warmup, "_scheduled", set())
+    monkeypatch.setattr(warmup, "warmup_stats", {"runs": 0, "errors": 0, "last_startup_ms": None})
+    monkeypatch.setattr(warmup, "WARMUP_DEBOUNCE_MS", 20)
+    monkeypatch.setattr(warmup, "WARMUP_ENABLED", True)
+    runs = []
+
+    def register(name, tags):
+        @warmup.register_warmup(name, tags=tags)
+        async def build():
+            runs.append(name)
+
+    register("users_page", ["users"])
+    register("groups_page", ["groups", "users"])
+    return runs
+
+
+async def _settle():
+    await asyncio.sleep(0.1)
+    await asyncio.gather(*warmup._tasks)
+
+
+def test_warm_all_runs_every_builder_once(builders):
+    asyncio.run(warmup.warm_all())
+    assert sorted(builders) == ["groups_page", "users_page"]
+    assert warmup.warmup_stats["runs"] == 2
+    assert warmup.warmup_stats["last_startup_ms"] is not None
+
+
+def test_a_burst_of_invalidations_rebuilds_once(builders):
+    async def run():
+        for _ in range(5):
+            warmup.schedule_rebuild("users")
+        warmup.schedule_rebuild("groups")
+        # Still inside the debounce window: nothing has run yet
+        await asyncio.sleep(0)
+        assert builders == []
+        await _settle()
+
+    asyncio.run(run())
+    assert sorted(builders) == ["groups_page", "users_page"]
+
+
+def test_only_dependent_builders_rebuild(builders):
+    async def run():
+        warmup.schedule_rebuild("groups")
+        warmup.schedule_rebuild("unrelated")
+        await _settle()
+
+    asyncio.run(run())
+    assert builders == ["groups_page"]
+
+
+def test_invalidations_after_a_rebuild_schedule_another(builders):
+    async def run():
+        warmup.schedule_rebuild("users")
+        await _settle()
+        warmup.schedule_rebuild("users")
+        await _settle()
+
+    asyncio.run(run())
+    assert builders.count("users_page") == 2
+
+
+def test_invalidate_tag_triggers_a_rebuild(builders, fake_redis):
+    async def run():
+        await cache.invalidate_tag("groups")
+        await _settle()
+
+    asyncio.run(run())
+    assert builders == ["groups_page"]
+
+
+def test_a_failing_builder_does_not_stop_the_others(builders):
+    @warmup.register_warmup("broken", tags=["users"])
+    async def broken():
+        raise RuntimeError("database down")
+
+    async def run():
+        warmup.schedule_rebuild("users")
+        await _settle()
+
+    asyncio.run(run())
+    assert sorted(builders) == ["groups_page", "users_page"]
+    assert warmup.warmup_stats["errors"] == 1
+
+
+def test_disabled_warmup_does_nothing(builders, monkeypatch):
+    monkeypatch.setattr(warmup, "WARMUP_ENABLED", False)
+
+    async def run():
+        await warmup.warm_all()
+        warmup.schedule_rebuild("users")
+        await _settle()
+
+    asyncio.run(run())
+    assert builders == []
+
+
+def test_list_builders_query_off_the_event_loop(fake_redis, monkeypatch):
+    import groups.routes
+    import users.routes
+
+    threads = []
+
+    class Session:
+        def close(self):
+            pass
+
+    def load(db, skip, limit):
+        threads.append(threading.get_ident())
+        return []
+
+    for module, name in ((users.routes, "load_users_list"), (groups.routes, "load_groups_list")):
+        monkeypatch.setattr(module, name, load)
+        monkeypatch.setattr(module, "ReadSessionLocal", Session)
+
+    async def run():
+        await users.routes.warm_users_list()
+        await groups.routes.warm_groups_list()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert len(threads) == 2
+    assert loop_thread not in threads
@@ -4,15 +4,25 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 from database import get_db
-from models.user import User
+from models.user import User, normalize_email
 from models.group import Group, UserGroup
+from models.sent_message import SentMessage
+from models.shared_contact import SharedContact
+from models.contact import Contact
+from models.messages.message import Message
+from models.messages.user_message_template import UserMessageTemplate
+from models.identification.id_answer import IdAnswer
+from sqlalchemy import delete, or_, select, update
 from pydantic import BaseModel
 from auth.auth import get_current_user, oauth2_scheme, User as AuthUser
 from pydantic import Field
+import logging
 
 
 router = APIRouter(tags=["users"])
 
+logger = logging.getLogger(__name__)
+
 
 
 class UserResponse(BaseModel):
@@ -46,7 +56,7 @@ from auth.auth import get_current_user
 
 @router.get("/me", response_model=UserResponse)
 async def read_users_me(request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    print(f"GET /api/users/me - Authenticated as: {current_user.email} (Role: {getattr(current_user, 'role', 'user')})")
+    logger.debug("GET /api/users/me - Authenticated as: %s (Role: %s)", current_user.email, getattr(current_user, 'role', 'user'))
     
     # Ensure user is attached to session
     if current_user not in db:
@@ -102,12 +112,12 @@ async def create_user(
         print(f"Access denied: User {current_user.email} is not an admin")
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     # Check if email already exists
-    existing = db.query(User).filter(User.email == user.email).first()
+    existing = db.query(User).filter(User.email_lower == normalize_email(user.email)).first()
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
     # Hash password
-    from auth.auth import get_password_hash
-    hashed_pw = get_password_hash(user.password)
+    from auth.passwords import hash_password_async
+    hashed_pw = await hash_password_async(user.password)
     db_user = User(
         email=user.email,
         first_name=user.first_name,
@@ -122,43 +132,31 @@ async def create_user(
     db.commit()
     db.refresh(db_user)
     # Invalidate users list cache
-    await delete_pattern('users:list:*')
+    await invalidate_tag('users')
     return db_user
 
 from fastapi.encoders import jsonable_encoder
 import json
-from utils.cache import redis_cache, delete_pattern  # Adjust import if your Redis instance is elsewhere
+from database import ReadSessionLocal
+from utils.cache import get_or_set, invalidate_tag, bump_namespace, refresh
+from utils.warmup import register_warmup
+from starlette.concurrency import run_in_threadpool
+from sent_messages.counters import delete_sent_messages
+from auth.token_cache import invalidate_user
 
-@router.get("/", response_model=List[UserResponse])
-async def get_users(
-    skip: Optional[int] = 0, 
-    limit: Optional[int] = 100, 
-    db: Session = Depends(get_db),
-    current_user = Depends(get_current_user)
-):
-    from datetime import datetime
-    start_time = datetime.now()
-    print("\n=== GET /api/users/ ===")
-    print(f"Authenticated as user: {current_user.email} (Role: {getattr(current_user, 'role', 'user')})")
-    
-    # Check if user is admin
-    if not hasattr(current_user, 'role') or current_user.role != 'admin':
-        print(f"Access denied: User {current_user.email} is not an admin")
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin access required"
-        )
+# The list embeds group names, so group changes invalidate it too
+USERS_LIST_CACHE_TTL = 30
+USERS_LIST_CACHE_TAGS = ['users', 'groups']
 
-    # Redis cache key includes skip, limit, and admin user id
-    cache_key = f"users:list:skip={skip}:limit={limit}:admin={current_user.id}"
-    cached = await redis_cache.get(cache_key)
-    if cached:
-        print("Cache hit for users list")
-        end_time = datetime.now()
-        elapsed_ms = (end_time - start_time).total_seconds() * 1000
-        print(f"[TIMING] GET /api/users/ (cache hit): {elapsed_ms:.2f} ms")
-        return json.loads(cached)
+def users_list_cache_key(skip, limit) -> str:
+    # Same for every admin, so one warm entry serves them all
+    return f"users:list:skip={skip}:limit={limit}"
 
+def load_users_list(db: Session, skip, limit):
+    """
+    Users with their groups, in the cached (JSON-ready) form of GET /api/users/.
+    Blocking; callers run it with run_in_threadpool.
+    """
     # Raw SQL query for users (no relationships)
     from sqlalchemy import text
     user_sql = """
@@ -170,30 +168,26 @@ async def get_users(
     """
     result = db.execute(text(user_sql), {"limit": limit, "offset": skip})
     users = result.fetchall()
-    print(f"Found {len(users)} users in database")
+    logger.debug("Found %d users in database", len(users))
 
     user_ids = [row[0] for row in users]
     groups_map = {uid: [] for uid in user_ids}
     if user_ids:
-        # Batch fetch user groups
-        # Dynamically create the correct number of placeholders for SQLite
-        # Dynamically create named placeholders and param dict for SQLite compatibility
-        placeholders = ','.join([f":id{i}" for i in range(len(user_ids))])
-        group_sql = f"""
+        # Batch fetch user groups; the expanding parameter renders one
+        # placeholder per id in whatever style the backend uses
+        from sqlalchemy import bindparam
+        group_sql = text("""
             SELECT ug.user_id, g.id, g.name
             FROM user_groups ug
             JOIN groups g ON ug.group_id = g.id
-            WHERE ug.user_id IN ({placeholders})
-        """
-        param_dict = {f"id{i}": uid for i, uid in enumerate(user_ids)}
-        from sqlalchemy import text as sa_text
-        group_result = db.execute(sa_text(group_sql), param_dict)
+            WHERE ug.user_id IN :user_ids
+        """).bindparams(bindparam("user_ids", expanding=True))
+        group_result = db.execute(group_sql, {"user_ids": user_ids})
         for user_id, group_id, group_name in group_result.fetchall():
             groups_map[user_id].append({"id": group_id, "name": group_name})
 
     user_responses = []
-    for i, row in enumerate(users, 1):
-        print(f"User {i}: ID={row[0]}, Email={row[1]}, Name={row[2]} {row[3]} (Role: {row[10]})")
+    for row in users:
         user_responses.append({
             "id": row[0],
             "email": row[1],
@@ -210,12 +204,46 @@ async def get_users(
             "groups": groups_map.get(row[0], [])
         })
     db.commit()
-    # Cache the result for 30 seconds
-    await redis_cache.set(cache_key, json.dumps(jsonable_encoder(user_responses)), ex=30)
-    print("Cached users list in Redis")
-    end_time = datetime.now()
-    elapsed_ms = (end_time - start_time).total_seconds() * 1000
-    print(f"[TIMING] GET /api/users/: {elapsed_ms:.2f} ms")
+    return jsonable_encoder(user_responses)
+
+@register_warmup("users_list", tags=USERS_LIST_CACHE_TAGS)
+async def warm_users_list():
+    # First page as requested by the admin users screen
+    db = ReadSessionLocal()
+    try:
+        await refresh(
+            users_list_cache_key(0, 100),
+            lambda: run_in_threadpool(load_users_list, db, 0, 100),
+            ttl=USERS_LIST_CACHE_TTL,
+            tags=USERS_LIST_CACHE_TAGS
+        )
+    finally:
+        db.close()
+
+@router.get("/", response_model=List[UserResponse])
+async def get_users(
+    skip: Optional[int] = 0, 
+    limit: Optional[int] = 100, 
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    print("\n=== GET /api/users/ ===")
+    print(f"Authenticated as user: {current_user.email} (Role: {getattr(current_user, 'role', 'user')})")
+    
+    # Check if user is admin
+    if not hasattr(current_user, 'role') or current_user.role != 'admin':
+        print(f"Access denied: User {current_user.email} is not an admin")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+
+    user_responses = await get_or_set(
+        users_list_cache_key(skip, limit),
+        lambda: run_in_threadpool(load_users_list, db, skip, limit),
+        ttl=USERS_LIST_CACHE_TTL,
+        tags=USERS_LIST_CACHE_TAGS
+    )
     return user_responses
 
 @router.get("/{user_id}", response_model=UserResponse)
@@ -258,6 +286,14 @@ async def update_user(
         raise HTTPException(status_code=404, detail="User not found")
     print(f"Incoming update payload: {update_data}")
     print(f"User before update: has_shared_contacts={user.has_shared_contacts}")
+    previous_email = user.email
+    if "email" in update_data and normalize_email(update_data["email"]) != user.email_lower:
+        taken = db.query(User.id).filter(
+            User.email_lower == normalize_email(update_data["email"]),
+            User.id != user.id
+        ).first()
+        if taken:
+            raise HTTPException(status_code=400, detail="Email already registered")
     # Update fields if present
     for field in ["first_name", "last_name", "email", "role", "is_active", "city", "state", "zip_code", "has_shared_contacts", "max_neighbor_messages"]:
         if field in update_data:
@@ -268,8 +304,12 @@ async def update_user(
     db.commit()
     db.refresh(user)
     print(f"User after update: has_shared_contacts={user.has_shared_contacts}")
+    # Sessions of this user must see the new role and profile
+    await invalidate_user(user.id, previous_email)
     # Invalidate users list cache
-    await delete_pattern('users:list:*')
+    await invalidate_tag('users')
+    # Template lists embed assigned user names
+    await bump_namespace('message_templates')
     # Serialize groups as list of dicts
     groups = [
         {"id": g.id, "name": g.name} for g in getattr(user, 'groups', [])
@@ -290,6 +330,31 @@ async def update_user(
         "groups": groups
     }
 
+def _delete_user_rows(db: Session, user_id: int):
+    """
+    Delete a user and everything that references them, in the caller's transaction.
+
+    Several references to users have no ON DELETE action, and the ORM
+    relationships on User would try to null out NOT NULL columns, so the
+    dependents are handled here with explicit statements.
+    """
+    # The user's sends go with them, and come off the send counters
+    delete_sent_messages(db, SentMessage.user_id == user_id)
+    user_contacts = select(SharedContact.id).where(SharedContact.user_id == user_id)
+    # Answers they recorded, and anyone's answers about their shared contacts
+    db.execute(delete(IdAnswer).where(or_(
+        IdAnswer.user_id == user_id, IdAnswer.shared_contact_id.in_(user_contacts)
+    )))
+    db.execute(delete(UserMessageTemplate).where(UserMessageTemplate.user_id == user_id))
+    db.execute(delete(UserGroup).where(UserGroup.user_id == user_id))
+    db.execute(
+        update(Contact).where(Contact.assigned_to_id == user_id).values(assigned_to_id=None, is_unassigned=True)
+    )
+    db.execute(update(Message).where(Message.sender_id == user_id).values(sender_id=None))
+    # Their shared contacts cascade to matches and detach from other sends
+    db.execute(delete(SharedContact).where(SharedContact.user_id == user_id))
+    db.execute(delete(User).where(User.id == user_id))
+
 @router.delete("/{user_id}", status_code=204)
 async def delete_user(
     user_id: int,
@@ -319,10 +384,14 @@ async def delete_user(
                 detail="Cannot delete the last admin user"
             )
     
-    db.delete(user)
+    deleted_email = user.email
+    _delete_user_rows(db, user_id)
     db.commit()
+    # Outstanding tokens of this user stop resolving
+    await invalidate_user(user_id, deleted_email)
     # Invalidate users list cache
-    await delete_pattern('users:list:*')
+    await invalidate_tag('users')
+    await bump_namespace('message_templates')
     return {"ok": True}
 
 @router.get("/{user_id}/groups", response_model=List[GroupResponse])
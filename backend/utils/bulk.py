@@ -0,0 +1,145 @@
+"""
+Dialect-aware bulk statements.
+
+The same code runs on SQLite and PostgreSQL (selected by DATABASE_URL). On
+SQLite a bulk insert is one executemany inside the write transaction. On
+PostgreSQL, executemany is a round trip per row, so large row sets go through
+COPY on the psycopg drivers and through a single INSERT ... SELECT FROM
+unnest(...) on asyncpg. asyncpg's COPY bypasses SQLAlchemy's lazily started
+transaction and could commit outside the caller's SAVEPOINT; unnest runs as a
+normal statement in it.
+
+Every helper takes a sync Connection or Session, so it works inside
+utils.db_writer units as well as in sync handlers.
+"""
+import io
+from datetime import date, datetime
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import Table, any_, bindparam, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from utils.entity_versions import mark_written
+
+_dialect_inserts = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def dialect_of(conn) -> str:
+    """Dialect name ("sqlite", "postgresql") of a Connection or Session."""
+    return (conn.get_bind() if isinstance(conn, Session) else conn).dialect.name
+
+
+def insert_or_ignore(conn, table: Table):
+    """INSERT that skips rows violating a unique constraint, on either backend."""
+    return _dialect_inserts[dialect_of(conn)](table).on_conflict_do_nothing()
+
+
+def in_values(conn, column, values: Sequence[Any]):
+    """
+    column IN values.
+
+    On PostgreSQL the values go as one array parameter (column = ANY(:values)),
+    so the statement text is the same for any number of values and large lists
+    don't hit the driver's parameter limit.
+    """
+    if dialect_of(conn) == "postgresql":
+        return column == any_(bindparam(None, list(values), type_=postgresql.ARRAY(column.type)))
+    return column.in_(values)
+
+
+def copy_rows(conn, table: Table, rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert rows as fast as the backend allows; returns the number inserted.
+
+    A key missing from a row is NULL. Python-side column defaults (created_at
+    and the like) are filled in here, since COPY and unnest skip them; server
+    defaults and autoincrement keys are left to the database.
+    """
+    if not rows:
+        return 0
+    if isinstance(conn, Session):
+        conn = conn.connection()
+    if conn.dialect.name != "postgresql":
+        conn.execute(insert(table), rows)
+        return len(rows)
+
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    defaults = {}
+    for column in table.columns:
+        if column.name in names or column.default is None or column.primary_key:
+            continue
+        default = column.default
+        if default.is_scalar:
+            defaults[column.name] = default.arg
+        elif default.is_callable:
+            defaults[column.name] = default.arg(None)
+    columns = names + list(defaults)
+    records = [tuple(row.get(name) for name in names) + tuple(defaults.values()) for row in rows]
+
+    if conn.dialect.driver == "asyncpg":
+        _insert_unnest(conn, table, columns, records)
+    else:
+        _copy(conn, table, columns, records)
+        # COPY runs on the raw cursor, out of sight of the statement hooks
+        mark_written(conn, table.name)
+    return len(records)
+
+
+def _insert_unnest(conn, table: Table, columns: List[str], records: List[tuple]):
+    """One INSERT ... SELECT FROM unnest(col1[], col2[], ...) for all rows."""
+    arrays = []
+    params = {}
+    for i, name in enumerate(columns):
+        type_ = table.c[name].type
+        arrays.append(f"CAST(:c{i} AS {type_.compile(conn.dialect)}[])")
+        params[f"c{i}"] = [record[i] for record in records]
+    column_list = ", ".join(f'"{name}"' for name in columns)
+    stmt = text(
+        f'INSERT INTO "{table.name}" ({column_list}) '
+        f"SELECT * FROM unnest({', '.join(arrays)})"
+    ).bindparams(*[
+        bindparam(f"c{i}", type_=postgresql.ARRAY(table.c[name].type)) for i, name in enumerate(columns)
+    ])
+    conn.execute(stmt, params)
+
+
+def _copy(conn, table: Table, columns: List[str], records: List[tuple]):
+    """COPY ... FROM STDIN on the connection's psycopg / psycopg2 cursor."""
+    column_list = ", ".join(f'"{name}"' for name in columns)
+    sql = f'COPY "{table.name}" ({column_list}) FROM STDIN'
+    cursor = conn.connection.cursor()
+    try:
+        if conn.dialect.driver == "psycopg":
+            with cursor.copy(sql) as copy:
+                for record in records:
+                    copy.write_row(record)
+        else:
+            buffer = io.StringIO()
+            for record in records:
+                buffer.write("\t".join(_copy_text(value) for value in record))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+def _copy_text(value: Any) -> str:
+    """One field in COPY's text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
@@ -1,8 +1,16 @@
 import os
+import asyncio
+import json
 import logging
+import math
+import random
 import time
+import uuid
+import zlib
 import redis.asyncio as redis
+from collections import OrderedDict
 from functools import wraps
+from typing import List, Optional, Sequence
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +19,167 @@ REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "10"))
 REDIS_TIMEOUT = int(os.getenv("REDIS_TIMEOUT", "2"))  # 2 second timeout
 
+# In-process (L1) cache configuration
+L1_MAX_ENTRIES = int(os.getenv("CACHE_L1_MAX_ENTRIES", "10000"))
+L1_MAX_TTL = int(os.getenv("CACHE_L1_MAX_TTL", "60"))  # Upper bound if an invalidation is missed
+INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")
+
+# Circuit breaker: after BREAKER_FAILURE_THRESHOLD consecutive Redis errors the
+# cache stops calling Redis and serves from the in-process tier only, while a
+# background probe pings Redis every BREAKER_PROBE_INTERVAL seconds
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("CACHE_BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_PROBE_INTERVAL = float(os.getenv("CACHE_BREAKER_PROBE_INTERVAL", "5"))
+MAX_MISSED_INVALIDATIONS = 10000
+
+# Tag sets outlive their members; stale members are harmless to UNLINK
+TAG_PREFIX = "tag"
+TAG_TTL = int(os.getenv("CACHE_TAG_TTL", "86400"))
+
+def _tag_key(tag: str) -> str:
+    return f"{TAG_PREFIX}:{tag}"
+
+class LocalCache:
+    """Size-bounded LRU with a TTL per key, holding values exactly as read from Redis."""
+
+    def __init__(self, max_entries=L1_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# Codecs for cached objects
+#
+# set_obj/get_obj store objects as raw bytes: a two byte header naming the
+# serializer and compression, then the payload. orjson or msgpack are used
+# when installed (falling back to json), and payloads above
+# CACHE_COMPRESS_THRESHOLD bytes are compressed with zstd or zlib. Any frame
+# can be decoded whatever the current settings, as long as its library is
+# installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CACHE_SERIALIZER = os.getenv("CACHE_SERIALIZER", "auto")  # auto, orjson, msgpack or json
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "auto")  # auto, zstd, zlib or none
+CACHE_COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", "1024"))
+
+FRAME_MAGIC = 0xC1  # Never the first byte of JSON text or valid UTF-8
+
+_SERIALIZERS = {
+    # code: (name, dumps, loads)
+    1: ("json", lambda obj: json.dumps(obj, separators=(",", ":")).encode(), json.loads),
+}
+if orjson is not None:
+    _SERIALIZERS[2] = ("orjson", orjson.dumps, orjson.loads)
+if msgpack is not None:
+    _SERIALIZERS[3] = ("msgpack", lambda obj: msgpack.packb(obj, use_bin_type=True), lambda data: msgpack.unpackb(data, raw=False))
+
+_COMPRESSORS = {
+    # code: (name, compress, decompress)
+    0: ("none", None, None),
+    1: ("zlib", lambda data: zlib.compress(data, 6), zlib.decompress),
+}
+if zstandard is not None:
+    _COMPRESSORS[2] = (
+        "zstd",
+        lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+def _pick_codec(table, setting, preference):
+    """Resolve an env setting to a codec code, falling back to what is installed."""
+    codes = {name: code for code, (name, _, _) in table.items()}
+    if setting in codes:
+        return codes[setting]
+    if setting != "auto":
+        logger.warning(f"Cache codec {setting} is not available, using auto")
+    return next(codes[name] for name in preference if name in codes)
+
+_serializer_code = _pick_codec(_SERIALIZERS, CACHE_SERIALIZER, ("orjson", "msgpack", "json"))
+_compressor_code = _pick_codec(_COMPRESSORS, CACHE_COMPRESSION, ("zstd", "zlib"))
+
+codec_stats = {
+    "encodes": 0, "decodes": 0, "decode_errors": 0,
+    "encode_ms": 0.0, "decode_ms": 0.0,
+    "bytes_serialized": 0, "bytes_stored": 0,
+}
+
+def encode_value(value) -> bytes:
+    """Serialize (and maybe compress) an object into a cache frame."""
+    start_time = time.perf_counter()
+    data = _SERIALIZERS[_serializer_code][1](value)
+    serialized_size = len(data)
+    compression = 0
+    compress = _COMPRESSORS[_compressor_code][1]
+    if compress is not None and len(data) >= CACHE_COMPRESS_THRESHOLD:
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            data, compression = compressed, _compressor_code
+    frame = bytes((FRAME_MAGIC, (_serializer_code << 4) | compression)) + data
+    codec_stats["encodes"] += 1
+    codec_stats["encode_ms"] += (time.perf_counter() - start_time) * 1000
+    codec_stats["bytes_serialized"] += serialized_size
+    codec_stats["bytes_stored"] += len(frame)
+    return frame
+
+def decode_value(frame):
+    """Decode a cache frame; returns None for anything that isn't one."""
+    if not isinstance(frame, (bytes, bytearray)) or len(frame) < 2 or frame[0] != FRAME_MAGIC:
+        return None
+    start_time = time.perf_counter()
+    serializer, compression = _SERIALIZERS.get(frame[1] >> 4), _COMPRESSORS.get(frame[1] & 0x0F)
+    if serializer is None or compression is None:
+        codec_stats["decode_errors"] += 1
+        logger.warning(f"Cannot decode cache frame with header {frame[1]:#04x}")
+        return None
+    try:
+        data = bytes(frame[2:])
+        if compression[2] is not None:
+            data = compression[2](data)
+        value = serializer[2](data)
+    except Exception as e:
+        codec_stats["decode_errors"] += 1
+        logger.error(f"Failed to decode cached value: {e}")
+        return None
+    codec_stats["decodes"] += 1
+    codec_stats["decode_ms"] += (time.perf_counter() - start_time) * 1000
+    return value
+
 # Singleton pattern for Redis connection pool
 class RedisCache:
     _instance = None
@@ -34,58 +203,285 @@ class RedisCache:
                 health_check_interval=30
             )
             self.client = redis.Redis.from_pool(self.pool)
+            # Encoded objects (see get_obj/set_obj) are stored as raw bytes
+            self.binary_pool = redis.ConnectionPool.from_url(
+                REDIS_URL,
+                decode_responses=False,
+                max_connections=REDIS_POOL_SIZE,
+                socket_timeout=REDIS_TIMEOUT,
+                socket_connect_timeout=REDIS_TIMEOUT,
+                health_check_interval=30
+            )
+            self.binary_client = redis.Redis.from_pool(self.binary_pool)
             logger.info("Redis connection pool initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Redis: {e}")
             # Fallback to a dummy implementation that won't break the application
             self.client = None
+            self.binary_client = None
+        # L1 tier in front of Redis, kept coherent across workers over pub/sub
+        self.local = LocalCache()
+        self.origin = uuid.uuid4().hex
+        self.stats = {
+            "l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0, "invalidations_received": 0,
+            "breaker_trips": 0, "breaker_recoveries": 0, "fallback_reads": 0, "fallback_writes": 0,
+        }
+        self._listener_task = None
+        # Called with each key another worker invalidated, for caches outside L1
+        self.remote_key_hooks = []
+        self.breaker_open = False
+        self._failures = 0
+        self._probe_task = None
+        # Invalidations that could not reach Redis, replayed once it is back
+        self.missed_invalidations = {"keys": set(), "tags": set(), "namespaces": set()}
+
+    @property
+    def available(self) -> bool:
+        """True when Redis calls should be attempted."""
+        return self.client is not None and not self.breaker_open
+
+    def _record_success(self):
+        self._failures = 0
+
+    def _record_failure(self, error):
+        self._failures += 1
+        if self._failures >= BREAKER_FAILURE_THRESHOLD and not self.breaker_open:
+            self._trip(error)
+
+    def _trip(self, error):
+        self.breaker_open = True
+        self.stats["breaker_trips"] += 1
+        logger.error(f"Redis circuit breaker open after {self._failures} failures ({error}); serving from local cache")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = loop.create_task(self._probe())
+
+    async def _probe(self):
+        """Ping Redis until it answers, then close the breaker and replay missed invalidations."""
+        while self.breaker_open:
+            await asyncio.sleep(BREAKER_PROBE_INTERVAL)
+            try:
+                await self.client.ping()
+            except Exception as e:
+                logger.debug(f"Redis probe failed: {e}")
+                continue
+            self.breaker_open = False
+            self._failures = 0
+            self.stats["breaker_recoveries"] += 1
+            logger.info("Redis circuit breaker closed, Redis is reachable again")
+            await _replay_missed_invalidations()
+
+    def _remember_missed(self, kind, value):
+        missed = self.missed_invalidations[kind]
+        if len(missed) < MAX_MISSED_INVALIDATIONS:
+            missed.add(value)
+        else:
+            logger.warning(f"Too many missed cache invalidations, dropping {kind} {value}")
     
     async def get(self, key, default=None):
-        """Get a value from Redis with error handling."""
-        if self.client is None:
+        """Get a value from the in-process cache, then Redis, with error handling."""
+        return await self._read(self.client, key, default)
+
+    async def get_obj(self, key, default=None):
+        """
+        Get an object stored with set_obj. L1 holds the decoded object, so
+        in-process hits skip deserialization; callers must not mutate it.
+        """
+        return await self._read(self.binary_client, key, default, decode=decode_value)
+
+    async def _read(self, client, key, default, decode=None):
+        value = self.local.get(key)
+        if value is not None:
+            self.stats["l1_hits"] += 1
+            return value
+        self.stats["l1_misses"] += 1
+
+        if client is None:
+            return default
+        if self.breaker_open:
+            self.stats["fallback_reads"] += 1
             return default
             
         try:
             start_time = time.time()
-            value = await self.client.get(key)
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                value, ttl = await pipe.execute()
             elapsed = (time.time() - start_time) * 1000
             
             if elapsed > 100:  # Log slow operations (>100ms)
                 logger.warning(f"Slow Redis GET: {key} took {elapsed:.2f}ms")
-                
+
+            self._record_success()
+            if value is not None and decode is not None:
+                value = decode(value)
+            if value is None:
+                self.stats["l2_misses"] += 1
+                return default
+            self.stats["l2_hits"] += 1
+            # Keep it in L1 no longer than it has left to live in Redis
+            self.local.set(key, value, L1_MAX_TTL if ttl == -1 else min(ttl, L1_MAX_TTL))
             return value
         except redis.RedisError as e:
             logger.error(f"Redis GET error for key {key}: {e}")
+            self._record_failure(e)
             return default
     
-    async def set(self, key, value, ex=None):
-        """Set a value in Redis with error handling."""
-        if self.client is None:
+    async def set(self, key, value, ex=None, tags=None):
+        """
+        Set a value in Redis with error handling.
+
+        tags: names the key is recorded under, so invalidate_tag() can later
+        remove it along with every other key sharing the tag.
+        """
+        return await self._write(self.client, key, value, value, ex, tags)
+
+    async def set_obj(self, key, value, ex=None, tags=None):
+        """Set a JSON-compatible object, encoded with the configured codec."""
+        try:
+            data = encode_value(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Could not encode value for {key}, not caching: {e}")
             return False
+        return await self._write(self.binary_client, key, data, value, ex, tags)
+
+    async def _write(self, client, key, stored, local_value, ex, tags):
+        if client is None:
+            return False
+        if self.breaker_open:
+            # Local only; other workers may still see the old value in Redis later
+            self.stats["fallback_writes"] += 1
+            self.local.set(key, local_value, ex or L1_MAX_TTL)
+            self._remember_missed("keys", key)
+            return True
             
         try:
             start_time = time.time()
-            result = await self.client.set(key, value, ex=ex)
+            if tags:
+                async with client.pipeline(transaction=False) as pipe:
+                    pipe.set(key, stored, ex=ex)
+                    for tag in tags:
+                        pipe.sadd(_tag_key(tag), key)
+                        pipe.expire(_tag_key(tag), max(ex or 0, TAG_TTL))
+                    result = (await pipe.execute())[0]
+            else:
+                result = await client.set(key, stored, ex=ex)
             elapsed = (time.time() - start_time) * 1000
+            self._record_success()
             
             if elapsed > 100:  # Log slow operations (>100ms)
                 logger.warning(f"Slow Redis SET: {key} took {elapsed:.2f}ms")
-                
+
+            # Other workers may hold the previous value
+            self.local.set(key, local_value, min(ex, L1_MAX_TTL) if ex else L1_MAX_TTL)
+            await self.publish_invalidation(keys=[key])
             return result
         except redis.RedisError as e:
             logger.error(f"Redis SET error for key {key}: {e}")
+            self._record_failure(e)
             return False
     
     async def delete(self, key):
         """Delete a key from Redis with error handling."""
+        self.local.delete(key)
         if self.client is None:
             return 0
+        if self.breaker_open:
+            self._remember_missed("keys", key)
+            return 0
             
         try:
-            return await self.client.delete(key)
+            result = await self.client.delete(key)
+            self._record_success()
+            await self.publish_invalidation(keys=[key])
+            return result
         except redis.RedisError as e:
             logger.error(f"Redis DELETE error for key {key}: {e}")
+            self._record_failure(e)
+            self._remember_missed("keys", key)
             return 0
+
+    async def publish_invalidation(self, keys):
+        """Tell every other worker to drop the given keys from L1."""
+        if not self.available or not keys:
+            return
+        message = json.dumps({"origin": self.origin, "keys": list(keys)})
+        try:
+            await self.client.publish(INVALIDATION_CHANNEL, message)
+        except redis.RedisError as e:
+            logger.error(f"Redis PUBLISH error for invalidation {message}: {e}")
+            self._record_failure(e)
+
+    def _apply_invalidation(self, data):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed cache invalidation: {data!r}")
+            return
+        if message.get("origin") == self.origin:
+            return
+        self.stats["invalidations_received"] += 1
+        for key in message.get("keys", []):
+            self.local.delete(key)
+            for hook in self.remote_key_hooks:
+                try:
+                    hook(key)
+                except Exception as e:
+                    logger.error(f"Remote invalidation hook {hook} failed for key {key}: {e}")
+
+    async def _listen_for_invalidations(self):
+        disconnected = False
+        while True:
+            if self.breaker_open:
+                await asyncio.sleep(BREAKER_PROBE_INTERVAL)
+                continue
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                if disconnected:
+                    # Invalidations sent while we were away were lost
+                    self.local.clear()
+                    disconnected = False
+                logger.info(f"Listening for cache invalidations on {INVALIDATION_CHANNEL}")
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_invalidation(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not disconnected:
+                    logger.error(f"Cache invalidation listener error: {e}")
+                disconnected = True
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def start_invalidation_listener(self):
+        """Start the pub/sub listener that keeps L1 coherent across workers."""
+        if self.client is None:
+            return
+        if self._listener_task is not None and not self._listener_task.done():
+            return
+        self._listener_task = asyncio.get_running_loop().create_task(self._listen_for_invalidations())
+
+    async def stop_invalidation_listener(self):
+        for task in (self._listener_task, self._probe_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._listener_task = None
+        self._probe_task = None
     
     async def scan_iter(self, match=None):
         """Scan for keys matching a pattern with error handling."""
@@ -103,37 +499,365 @@ class RedisCache:
 # Create the singleton instance
 redis_cache = RedisCache()
 
-async def delete_pattern(pattern: str):
+# Callables run with the tag name after each invalidate_tag (see utils.warmup)
+_invalidation_hooks = []
+
+def add_invalidation_hook(hook):
+    """Register hook(tag) to be called whenever a tag is invalidated."""
+    _invalidation_hooks.append(hook)
+
+def _run_invalidation_hooks(tag: str):
+    for hook in _invalidation_hooks:
+        try:
+            hook(tag)
+        except Exception as e:
+            logger.error(f"Cache invalidation hook {hook} failed for tag {tag}: {e}")
+
+async def invalidate_tag(tag: str):
     """
-    Delete all keys matching the given pattern from Redis (async).
-    With error handling and performance logging.
+    Delete every key stored with the given tag.
+    Cost is proportional to the number of tagged keys, not the keyspace.
     """
+    try:
+        return await _invalidate_tag(tag)
+    finally:
+        _run_invalidation_hooks(tag)
+
+async def _invalidate_tag(tag: str):
     if redis_cache.client is None:
-        logger.warning(f"Redis not available, skipping delete_pattern for {pattern}")
+        logger.warning(f"Redis not available, skipping invalidate_tag for {tag}")
         return 0
-        
+    if redis_cache.breaker_open:
+        # Tag members are only known to Redis, so drop all local entries
+        redis_cache.local.clear()
+        redis_cache._remember_missed("tags", tag)
+        return 0
+
     try:
         start_time = time.time()
-        count = 0
-        
-        async for key in redis_cache.scan_iter(match=pattern):
-            await redis_cache.delete(key)
-            count += 1
-            
+        tag_key = _tag_key(tag)
+        # Read and drop the tag set atomically so keys tagged meanwhile aren't orphaned
+        async with redis_cache.client.pipeline(transaction=True) as pipe:
+            pipe.smembers(tag_key)
+            pipe.unlink(tag_key)
+            keys, _ = await pipe.execute()
+        if not keys:
+            return 0
+
+        keys = list(keys)
+        for key in keys:
+            redis_cache.local.delete(key)
+        async with redis_cache.client.pipeline(transaction=False) as pipe:
+            for i in range(0, len(keys), 500):
+                pipe.unlink(*keys[i:i + 500])
+            count = sum(await pipe.execute())
+        redis_cache._record_success()
+        await redis_cache.publish_invalidation(keys)
+
         elapsed = (time.time() - start_time) * 1000
         if elapsed > 100 or count > 10:  # Log if slow or many keys deleted
-            logger.info(f"Redis delete_pattern: {pattern} deleted {count} keys in {elapsed:.2f}ms")
-            
+            logger.info(f"Redis invalidate_tag: {tag} deleted {count} keys in {elapsed:.2f}ms")
+
         return count
-    except Exception as e:
-        logger.error(f"Error in delete_pattern for {pattern}: {e}")
+    except redis.RedisError as e:
+        logger.error(f"Error in invalidate_tag for {tag}: {e}")
+        redis_cache._record_failure(e)
+        redis_cache.local.clear()
+        redis_cache._remember_missed("tags", tag)
         return 0
 
-import json
+# Namespace versioning
+#
+# Each entity family (e.g. "message_templates") owns a version counter stored
+# in Redis. Cache keys embed the current version, so invalidating the whole
+# family is a single INCR: old keys are never read again and simply expire.
+NAMESPACE_VERSION_PREFIX = "ns_version"
+
+def _namespace_version_key(namespace: str) -> str:
+    return f"{NAMESPACE_VERSION_PREFIX}:{namespace}"
+
+async def get_namespace_version(namespace: str) -> int:
+    """Return the current version of a cache namespace (0 if never bumped)."""
+    value = await redis_cache.get(_namespace_version_key(namespace))
+    try:
+        return int(value) if value else 0
+    except (TypeError, ValueError):
+        return 0
+
+async def read_namespace_versions(namespaces: Sequence[str]) -> Optional[List[int]]:
+    """
+    Current versions of several namespaces, read from Redis in one MGET.
+
+    Unlike get_namespace_version this skips the in-process tier, whose copy
+    can trail a bump made on another worker until its invalidation arrives.
+    Returns None when Redis can't be read.
+    """
+    if not redis_cache.available:
+        return None
+    try:
+        values = await redis_cache.client.mget([_namespace_version_key(namespace) for namespace in namespaces])
+        redis_cache._record_success()
+    except redis.RedisError as e:
+        logger.error(f"Redis MGET error for namespace versions: {e}")
+        redis_cache._record_failure(e)
+        return None
+    versions = []
+    for value in values:
+        try:
+            versions.append(int(value) if value else 0)
+        except (TypeError, ValueError):
+            versions.append(0)
+    return versions
+
+async def bump_namespace(namespace: str) -> int:
+    """
+    Invalidate every key in a namespace with a single INCR.
+    Returns the new version, or 0 if Redis is unavailable.
+    """
+    if redis_cache.client is None:
+        logger.warning(f"Redis not available, skipping bump_namespace for {namespace}")
+        return 0
+
+    key = _namespace_version_key(namespace)
+    if redis_cache.breaker_open:
+        return await _bump_namespace_locally(namespace)
+
+    redis_cache.local.delete(key)
+    try:
+        version = await redis_cache.client.incr(key)
+        redis_cache._record_success()
+        await redis_cache.publish_invalidation(keys=[key])
+        return version
+    except redis.RedisError as e:
+        logger.error(f"Redis INCR error for namespace {namespace}: {e}")
+        redis_cache._record_failure(e)
+        return await _bump_namespace_locally(namespace)
+
+async def _bump_namespace_locally(namespace: str) -> int:
+    """Move this worker to a new namespace version until Redis can be bumped too."""
+    version = await get_namespace_version(namespace) + 1
+    redis_cache.local.set(_namespace_version_key(namespace), str(version), 3600)
+    redis_cache._remember_missed("namespaces", namespace)
+    return version
+
+async def versioned_key(namespace: str, *parts) -> str:
+    """Build a cache key scoped to the current version of a namespace."""
+    version = await get_namespace_version(namespace)
+    return ":".join([namespace, f"v{version}", *(str(part) for part in parts)])
+
+async def _replay_missed_invalidations():
+    """Apply the invalidations made while the circuit breaker was open."""
+    missed = redis_cache.missed_invalidations
+    redis_cache.missed_invalidations = {"keys": set(), "tags": set(), "namespaces": set()}
+    if not any(missed.values()):
+        return
+    logger.info(
+        f"Replaying missed cache invalidations: {len(missed['keys'])} keys, "
+        f"{len(missed['tags'])} tags, {len(missed['namespaces'])} namespaces"
+    )
+    # Local entries were written without the rest of the cluster; start over
+    redis_cache.local.clear()
+    keys = list(missed["keys"])
+    try:
+        if keys:
+            async with redis_cache.client.pipeline(transaction=False) as pipe:
+                for i in range(0, len(keys), 500):
+                    pipe.unlink(*keys[i:i + 500])
+                await pipe.execute()
+            await redis_cache.publish_invalidation(keys)
+    except redis.RedisError as e:
+        logger.error(f"Failed to replay missed key invalidations: {e}")
+        redis_cache._record_failure(e)
+        for key in keys:
+            redis_cache._remember_missed("keys", key)
+    for tag in missed["tags"]:
+        await invalidate_tag(tag)
+    for namespace in missed["namespaces"]:
+        await bump_namespace(namespace)
+
+# Stampede protection
+#
+# Cached values are stored in an envelope recording when they stop being fresh
+# and how long they took to compute. The Redis TTL extends STALE_TTL beyond
+# freshness, so an expired value can still be served while exactly one caller
+# recomputes it: concurrent callers in the same process share one in-flight
+# load, and callers in other processes are kept out by a short Redis lease.
+# Hot keys are also refreshed probabilistically a little before they expire
+# ("XFetch"), with expensive values refreshed earlier than cheap ones.
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "30"))
+CACHE_LEASE_TTL_MS = int(os.getenv("CACHE_LEASE_TTL_MS", "10000"))
+CACHE_LEASE_WAIT_MS = int(os.getenv("CACHE_LEASE_WAIT_MS", "2000"))
+CACHE_EARLY_REFRESH_BETA = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+LEASE_PREFIX = "lease"
+
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_inflight = {}
+stampede_stats = {"loads": 0, "coalesced": 0, "stale_served": 0, "early_refreshes": 0, "lease_waits": 0}
+
+def _decode_entry(entry):
+    """Return the envelope stored by get_or_set, or None for a miss or foreign value."""
+    if not isinstance(entry, dict) or "v" not in entry or "fresh_until" not in entry:
+        return None
+    return entry
+
+def _needs_refresh(entry) -> bool:
+    now = time.time()
+    if now >= entry["fresh_until"]:
+        return True
+    # XFetch: -log(U) is exponentially distributed, so refreshes start early
+    # only occasionally, and earlier for values that are slow to compute
+    delta = entry.get("delta", 0)
+    if delta > 0 and now - delta * CACHE_EARLY_REFRESH_BETA * math.log(random.random() or 1e-12) >= entry["fresh_until"]:
+        stampede_stats["early_refreshes"] += 1
+        return True
+    return False
+
+async def _acquire_lease(key):
+    """Take the cross-process right to recompute a key. Returns a token or None."""
+    if not redis_cache.available:
+        return "local"
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis_cache.client.set(f"{LEASE_PREFIX}:{key}", token, nx=True, px=CACHE_LEASE_TTL_MS)
+    except redis.RedisError as e:
+        logger.error(f"Redis lease error for key {key}: {e}")
+        redis_cache._record_failure(e)
+        return "local"
+    return token if acquired else None
+
+async def _release_lease(key, token):
+    if not redis_cache.available or token == "local":
+        return
+    try:
+        # Only release the lease if it is still ours
+        await redis_cache.client.eval(_RELEASE_LEASE_SCRIPT, 1, f"{LEASE_PREFIX}:{key}", token)
+    except redis.RedisError as e:
+        logger.error(f"Redis lease release error for key {key}: {e}")
+        redis_cache._record_failure(e)
+
+async def _wait_for_entry(key):
+    """Poll for a value being computed by another process, up to CACHE_LEASE_WAIT_MS."""
+    stampede_stats["lease_waits"] += 1
+    deadline = time.time() + CACHE_LEASE_WAIT_MS / 1000
+    while time.time() < deadline:
+        await asyncio.sleep(0.05)
+        entry = _decode_entry(await redis_cache.get_obj(key))
+        if entry is not None:
+            return entry
+        if not redis_cache.available:
+            break
+        try:
+            if not await redis_cache.client.exists(f"{LEASE_PREFIX}:{key}"):
+                break  # Lease released or expired without a value
+        except redis.RedisError as e:
+            redis_cache._record_failure(e)
+            break
+    return None
+
+_NO_VALUE = object()
+
+async def _serve_stale(entry):
+    stampede_stats["stale_served"] += 1
+    return entry["v"]
+
+async def _wait_for_value(key):
+    entry = await _wait_for_entry(key)
+    # The other loader is slow or gone; compute it ourselves
+    return entry["v"] if entry is not None else _NO_VALUE
+
+async def _load(key, loader, ttl, tags, when_leased):
+    """
+    Compute key as this process's one in-flight load. The future is in
+    _inflight before the lease is requested, so callers arriving meanwhile
+    wait on it instead of going to Redis themselves. When another worker
+    holds the lease, `await when_leased()` supplies the value instead, or
+    _NO_VALUE to compute it anyway.
+    """
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    lease = None
+    try:
+        lease = await _acquire_lease(key)
+        value = _NO_VALUE
+        if lease is None:
+            value = await when_leased()
+        if value is _NO_VALUE:
+            stampede_stats["loads"] += 1
+            start_time = time.time()
+            value = await loader()
+            delta = time.time() - start_time
+            if value is not None:
+                entry = {"v": value, "fresh_until": time.time() + ttl, "delta": round(delta, 4)}
+                await redis_cache.set_obj(key, entry, ex=ttl + CACHE_STALE_TTL, tags=tags)
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Waiters re-raise it; don't warn when there are none
+        raise
+    finally:
+        _inflight.pop(key, None)
+        if lease is not None:
+            await _release_lease(key, lease)
+
+async def get_or_set(key, loader, ttl=300, tags=None):
+    """
+    Return the cached value for key, computing it with `await loader()` at
+    most once per expiry across all workers. Values must be JSON compatible
+    and are stored with the cache codec (see encode_value).
+    """
+    entry = _decode_entry(await redis_cache.get_obj(key))
+    if entry is not None:
+        if not _needs_refresh(entry):
+            return entry["v"]
+        # Stale or due for early refresh: one caller recomputes, the rest keep serving it
+        if key in _inflight:
+            return await _serve_stale(entry)
+        return await _load(key, loader, ttl, tags, lambda: _serve_stale(entry))
+
+    if key in _inflight:
+        stampede_stats["coalesced"] += 1
+        return await asyncio.shield(_inflight[key])
+    return await _load(key, loader, ttl, tags, lambda: _wait_for_value(key))
+
+async def refresh(key, loader, ttl=300, tags=None):
+    """
+    Recompute and store a key now, as get_or_set would on a miss (cache warm-up).
+    Skipped when another caller in this process is already loading it; waits
+    for a load already running in another worker.
+    """
+    if key in _inflight:
+        return False
+    await _load(key, loader, ttl, tags, lambda: _wait_for_value(key))
+    return True
+
+def cache_stats() -> dict:
+    """Hit/miss counters for each cache tier, plus codec timings and compression ratio."""
+    codec = dict(codec_stats)
+    codec["serializer"] = _SERIALIZERS[_serializer_code][0]
+    codec["compression"] = _COMPRESSORS[_compressor_code][0]
+    codec["compression_ratio"] = round(codec["bytes_serialized"] / codec["bytes_stored"], 3) if codec["bytes_stored"] else None
+    return {
+        **redis_cache.stats,
+        "breaker_state": "open" if redis_cache.breaker_open else "closed",
+        "l1_entries": len(redis_cache.local),
+        **stampede_stats,
+        "codec": codec,
+    }
 
 def cache_decorator(prefix, ttl=300):
     """
     Decorator to cache function results in Redis.
+    Loads are coalesced and served stale-while-revalidate (see get_or_set).
     
     Args:
         prefix: Prefix for the cache key
@@ -164,38 +888,9 @@ def cache_decorator(prefix, ttl=300):
                     key_parts.append(f"{k}_{v}")
             
             cache_key = ":".join(key_parts)
-            
-            # Try to get from cache first
-            cached = await redis_cache.get(cache_key)
-            if cached:
-                try:
-                    # Parse the JSON string back to the original data structure
-                    parsed_result = json.loads(cached)
-                    elapsed = (time.time() - start_time) * 1000
-                    logger.info(f"Cache hit for {func.__name__} in {elapsed:.2f}ms")
-                    return parsed_result
-                except json.JSONDecodeError:
-                    # If not JSON, return as is
-                    return cached
-            
-            # Cache miss - call the function
-            function_start = time.time()
-            result = await func(*args, **kwargs)
-            function_time = (time.time() - function_start) * 1000
-            
-            # Cache the result if not None
-            if result is not None:
-                try:
-                    # Convert result to JSON string for storage
-                    json_result = json.dumps(result)
-                    await redis_cache.set(cache_key, json_result, ex=ttl)
-                except (TypeError, Exception):
-                    # If can't serialize to JSON, try storing as string
-                    logger.warning(f"Could not JSON serialize result for {func.__name__}, storing as string")
-                    await redis_cache.set(cache_key, str(result), ex=ttl)
-            
+            result = await get_or_set(cache_key, lambda: func(*args, **kwargs), ttl=ttl)
             elapsed = (time.time() - start_time) * 1000
-            logger.info(f"Cache miss for {func.__name__}, function took {function_time:.2f}ms, total {elapsed:.2f}ms")
+            logger.debug(f"Cached call {func.__name__} took {elapsed:.2f}ms")
             return result
         return wrapper
     return decorator
@@ -0,0 +1,185 @@
+"""
+Serialized writer for SQLite.
+
+SQLite allows one writer at a time. When many requests write at the same
+moment they each take the lock, fsync and release it, and the ones that lose
+the race wait out busy_timeout or fail with "database is locked". Instead,
+writes are submitted here as units: plain functions that take a sync
+Connection and do their statements. One writer task applies queued units
+back to back on the single write connection, each inside its own SAVEPOINT,
+and commits the whole group once. A unit that raises is rolled back alone
+and its caller gets the exception; the others still commit.
+
+On PostgreSQL, which has no single-writer limit, up to
+DB_ASYNC_WRITE_POOL_SIZE groups are applied at once on separate connections.
+
+Units run inside the writer's transaction, so they must not commit, and
+they should only do database work: everything else in the group waits on
+them.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+from sqlalchemy.engine import Connection
+
+from database import DB_ASYNC_WRITE_POOL_SIZE, async_engine, engine
+
+logger = logging.getLogger(__name__)
+
+# Most units a single commit covers
+WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "200"))
+# How long the writer waits for more units before committing a partial group
+WRITE_LINGER_MS = int(os.getenv("DB_WRITE_LINGER_MS", "2"))
+
+Unit = Callable[..., Any]
+WriteItem = Tuple[Unit, tuple, asyncio.Future, float]
+
+
+class WriteQueue:
+    """Applies write units from many callers on one connection with group commit."""
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BATCH_SIZE,
+        linger_ms: int = WRITE_LINGER_MS,
+        concurrency: int = DB_ASYNC_WRITE_POOL_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self.concurrency = concurrency
+        self.stats = {
+            "units": 0, "failed_units": 0, "batches": 0, "batch_failures": 0,
+            "max_batch": 0, "queue_depth": 0, "max_queue_depth": 0,
+            "queue_wait_ms": 0.0, "commit_ms": 0.0,
+        }
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    def start(self):
+        """Start the writer task on the running loop (restarting it if the loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._in_flight = set()
+        self._task = loop.create_task(self._run())
+
+    async def submit(self, unit: Unit, *args) -> Any:
+        """
+        Queue unit(conn, *args) and wait until the group it ran in is committed.
+
+        Returns what the unit returned, or raises what it raised.
+        """
+        self.start()
+        future = self._loop.create_future()
+        self._queue.put_nowait((unit, args, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        self.stats["queue_depth"] = depth
+        if depth > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = depth
+        return await asyncio.shield(future)
+
+    def submit_from_thread(self, unit: Unit, *args) -> Any:
+        """
+        Blocking submit for code running in a worker thread (background tasks).
+
+        Without a running writer (scripts, tests) the unit runs in its own
+        transaction on the sync engine.
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed() or self._task is None or self._task.done():
+            with engine.begin() as conn:
+                return unit(conn, *args)
+        return asyncio.run_coroutine_threadsafe(self.submit(unit, *args), loop).result()
+
+    async def _run(self):
+        while True:
+            # Wait for a free connection first, so units keep queueing into the next group meanwhile
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            if self.linger and self._queue.qsize() < self.batch_size:
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self.stats["queue_depth"] = self._queue.qsize()
+            task = self._loop.create_task(self._apply_in_slot(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _apply_in_slot(self, batch: List[WriteItem]):
+        try:
+            await self._apply(batch)
+        except Exception as e:
+            logger.error(f"Writer loop error: {e}")
+        finally:
+            self._slots.release()
+
+    async def _apply(self, batch: List[WriteItem]):
+        started = time.perf_counter()
+        self.stats["queue_wait_ms"] = max((started - queued_at) * 1000 for _, _, _, queued_at in batch)
+        try:
+            async with async_engine.connect() as conn:
+                outcomes = await conn.run_sync(_apply_units, [(unit, args) for unit, args, _, _ in batch])
+        except Exception as e:
+            self.stats["batch_failures"] += 1
+            logger.error(f"Failed to commit {len(batch)} writes: {e}")
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        self.stats["units"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        self.stats["commit_ms"] = (time.perf_counter() - started) * 1000
+        for (_, _, future, _), (ok, value) in zip(batch, outcomes):
+            if not ok:
+                self.stats["failed_units"] += 1
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    async def close(self):
+        """Apply everything still queued and stop the writer task."""
+        if self._task is None:
+            return
+        while not self._queue.empty():
+            batch = []
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._apply(batch)
+        self._task.cancel()
+        self._task = None
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+
+def _apply_units(conn: Connection, units: List[Tuple[Unit, tuple]]) -> List[Tuple[bool, Any]]:
+    """Run each unit in a savepoint of one transaction; commit once at the end."""
+    outcomes = []
+    with conn.begin():
+        for unit, args in units:
+            savepoint = conn.begin_nested()
+            try:
+                value = unit(conn, *args)
+                savepoint.commit()
+                outcomes.append((True, value))
+            except Exception as e:
+                savepoint.rollback()
+                outcomes.append((False, e))
+    return outcomes
+
+
+# Process-wide writer shared by every route that writes through it
+db_writer = WriteQueue()
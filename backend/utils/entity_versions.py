@@ -0,0 +1,149 @@
+"""
+Version counters per table.
+
+Each table has a version counter, stored as the cache namespace
+"entity:<table>" (see utils.cache), so every worker sees the same numbers.
+track_writes() hooks an engine:
+- each INSERT, UPDATE or DELETE notes its table on the connection
+- when the transaction commits and the connection goes back to the pool,
+  those tables are queued
+- the event loop then bumps their counters
+
+A result built only from some set of tables cannot have changed while none
+of their versions has moved; middleware.response_cache uses this for ETags.
+
+Counters move after the commit, never before, so a version is never ahead
+of the data. A request that wrote calls flush() before its response
+starts, so the client that made a change sees it on its next request.
+"""
+import asyncio
+import logging
+import re
+import threading
+from functools import lru_cache
+from typing import Iterable, Optional, Set, Tuple
+
+from sqlalchemy import event
+
+from utils.cache import bump_namespace, read_namespace_versions
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_PREFIX = "entity"
+
+# Keys in the pooled connection's info dict
+_WRITTEN = "entity_versions.written"
+_COMMITTED = "entity_versions.committed"
+
+_WRITE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)"
+    r"\s+(?:ONLY\s+)?(?:[\"`]?\w+[\"`]?\.)?[\"`]?(\w+)",
+    re.IGNORECASE,
+)
+
+
+@lru_cache(maxsize=2048)
+def written_table(statement: str) -> Optional[str]:
+    """The table an INSERT, UPDATE or DELETE writes to; None for anything else."""
+    match = _WRITE.match(statement)
+    return match.group(1).lower() if match else None
+
+
+def namespace(table: str) -> str:
+    return f"{NAMESPACE_PREFIX}:{table}"
+
+
+class EntityVersions:
+    """Tables committed on this worker whose counters still have to be bumped."""
+
+    def __init__(self):
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.stats = {"bumps": 0, "flushes": 0}
+
+    def start(self):
+        """Flush on the running loop whenever a commit lands; called at application startup."""
+        self._loop = asyncio.get_running_loop()
+
+    def changed(self, tables: Iterable[str]):
+        """Queue tables whose writes just committed. Safe to call from any thread."""
+        with self._lock:
+            self._pending.update(tables)
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._schedule_flush)
+
+    def _schedule_flush(self):
+        self._loop.create_task(self.flush())
+
+    async def flush(self):
+        """Bump every queued table. Also waits out a flush already in progress."""
+        if not self._pending and (self._flush_lock is None or not self._flush_lock.locked()):
+            return
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            with self._lock:
+                tables, self._pending = self._pending, set()
+            if not tables:
+                return
+            self.stats["flushes"] += 1
+            for table in sorted(tables):
+                await bump_namespace(namespace(table))
+                self.stats["bumps"] += 1
+            logger.debug("Bumped entity versions: %s", ", ".join(sorted(tables)))
+
+    async def versions(self, tables: Tuple[str, ...]) -> Optional[Tuple[int, ...]]:
+        """
+        Current version of each table, in the order given, straight from Redis.
+        None when Redis can't be read: a version this worker remembers may
+        already have moved on another.
+        """
+        versions = await read_namespace_versions([namespace(table) for table in tables])
+        return tuple(versions) if versions is not None else None
+
+
+entity_versions = EntityVersions()
+
+
+def mark_written(conn, table: str):
+    """
+    Note a write the statement hooks cannot see, such as COPY on the raw DBAPI
+    cursor. Its table is bumped with the others when conn's transaction commits.
+    """
+    conn.info.setdefault(_WRITTEN, set()).add(table)
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    table = written_table(statement)
+    if table is not None:
+        mark_written(conn, table)
+
+
+def _on_commit(conn):
+    written = conn.info.pop(_WRITTEN, None)
+    if written:
+        conn.info.setdefault(_COMMITTED, set()).update(written)
+
+
+def _on_rollback(conn):
+    conn.info.pop(_WRITTEN, None)
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    # The commit has finished by the time the connection is returned
+    if connection_record is None:
+        return
+    connection_record.info.pop(_WRITTEN, None)
+    committed = connection_record.info.pop(_COMMITTED, None)
+    if committed:
+        entity_versions.changed(committed)
+
+
+def track_writes(engine):
+    """Bump the version of every table a committed transaction on engine wrote to."""
+    event.listen(engine, "after_cursor_execute", _on_execute)
+    event.listen(engine, "commit", _on_commit)
+    event.listen(engine, "rollback", _on_rollback)
+    event.listen(engine.pool, "checkin", _on_checkin)
@@ -0,0 +1,138 @@
+"""
+Logging pipeline.
+
+configure_logging() puts a single QueueHandler on the root logger. The
+calling thread, usually the event loop, only appends the record to an
+in-memory queue. A QueueListener thread formats each record and writes it
+to stdout and LOG_FILE. Records are not formatted before they are queued:
+the %-style message and its args travel as they are, so a log call costs
+a queue append. Pass arguments instead of building f-strings:
+
+    logger.debug("Matched %s in list %s", voter_id, list_id)
+
+Per-logger levels come from LOG_LEVELS, e.g.
+"contacts.matching=DEBUG,sqlalchemy.engine=WARNING".
+
+Debug lines are sampled per call site: each source line may emit
+LOG_SAMPLE_PER_S records per second. The next record that gets through says
+how many were dropped, so a per-row debug line in a loop over 10,000 rows
+doesn't flood the log or the queue.
+"""
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "sqlalchemy.engine=WARNING")
+# Empty logs to stdout only
+LOG_FILE = os.getenv("LOG_FILE", os.path.join("logs", "app.log"))
+LOG_FORMAT = os.getenv("LOG_FORMAT", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+# Records per second each call site may emit at or below LOG_SAMPLE_LEVEL; 0 disables sampling
+LOG_SAMPLE_PER_S = float(os.getenv("LOG_SAMPLE_PER_S", "10"))
+LOG_SAMPLE_LEVEL = os.getenv("LOG_SAMPLE_LEVEL", "DEBUG").upper()
+
+_listener: Optional[QueueListener] = None
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """"a=DEBUG,b.c=WARNING" -> {"a": "DEBUG", "b.c": "WARNING"}"""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class SamplingFilter(logging.Filter):
+    """Token bucket per call site for records at or below max_level."""
+
+    def __init__(self, per_second: float = LOG_SAMPLE_PER_S, max_level: int = logging.DEBUG):
+        super().__init__()
+        self.per_second = per_second
+        self.max_level = max_level
+        self._lock = threading.Lock()
+        # call site -> [tokens, last refill, records dropped since the last one let through]
+        self._buckets: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or self.per_second <= 0:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.per_second, now, 0]
+            bucket[0] = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            dropped, bucket[2] = bucket[2], 0
+        if dropped:
+            record.msg = f"{record.getMessage()} ({dropped} similar lines dropped)"
+            record.args = None
+        return True
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Queues the record itself; the listener thread does all the formatting."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, log_file: str = LOG_FILE) -> QueueListener:
+    """Route all logging through a queue to a background writer thread. Safe to call twice."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if log_file:
+        os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _LazyQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(max_level=logging.getLevelName(LOG_SAMPLE_LEVEL)))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # uvicorn gives its loggers their own stdout handlers; the access log is
+    # one line per request, so send it through the queue as well
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+    for name, logger_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
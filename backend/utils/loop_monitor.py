@@ -0,0 +1,69 @@
+"""
+Event-loop lag monitor.
+
+A background task asks to be woken every LOOP_MONITOR_INTERVAL_MS and
+measures how late it actually wakes up. That delay is time the loop spent
+running something else without yielding: a synchronous database call, CPU
+work, a blocking library. Lag above LOOP_LAG_WARN_MS is logged, and the
+numbers are reported by /api/admin/health so a blocked loop shows up under load.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_LAG_WARN_MS = int(os.getenv("LOOP_LAG_WARN_MS", "100"))
+# Recent samples kept for the percentiles
+LOOP_LAG_WINDOW = 600
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop runs a timer it scheduled."""
+
+    def __init__(self, interval_ms: int = LOOP_MONITOR_INTERVAL_MS, warn_ms: int = LOOP_LAG_WARN_MS):
+        self.interval = interval_ms / 1000
+        self.warn_ms = warn_ms
+        self.samples = deque(maxlen=LOOP_LAG_WINDOW)
+        self.stats = {"samples": 0, "blocked": 0, "max_lag_ms": 0.0, "last_lag_ms": 0.0}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    def record(self, lag_ms: float):
+        self.samples.append(lag_ms)
+        self.stats["samples"] += 1
+        self.stats["last_lag_ms"] = lag_ms
+        if lag_ms > self.stats["max_lag_ms"]:
+            self.stats["max_lag_ms"] = lag_ms
+        if lag_ms > self.warn_ms:
+            self.stats["blocked"] += 1
+            logger.warning(f"Event loop blocked for {lag_ms:.1f}ms")
+
+    def snapshot(self) -> dict:
+        """Stats plus p50/p99 lag over the recent window."""
+        ordered = sorted(self.samples)
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p))] if ordered else 0.0
+        return {**self.stats, "p50_lag_ms": percentile(0.5), "p99_lag_ms": percentile(0.99)}
+
+
+loop_monitor = LoopLagMonitor()
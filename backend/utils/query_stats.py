@@ -0,0 +1,173 @@
+"""
+Per-request database query instrumentation.
+
+middleware.query_stats opens a RequestQueries for every HTTP request and
+keeps it in a context variable. The cursor hooks in database.py add each
+statement's duration and fingerprint to it. Sync handlers running in the
+threadpool and async sessions inherit the same context. When the request
+finishes, its totals are folded into per-route aggregates. A fingerprint
+repeated QUERY_N_PLUS_ONE_THRESHOLD times in one request is reported as a
+likely N+1 loop: the same query issued once per row of an earlier result.
+"""
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() == "true"
+# Add X-DB-* and Server-Timing headers to every response (for debugging)
+QUERY_STATS_HEADER = os.getenv("QUERY_STATS_HEADER", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "10"))
+# Repeated fingerprints remembered per route
+SUSPECTS_PER_ROUTE = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|:\w+|\$\d+|%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(statement: str) -> str:
+    """
+    Statement with literals and bind parameters replaced by ?.
+
+    IN lists collapse to (?) so that the same query over a different number of
+    ids counts as one fingerprint.
+    """
+    text = _SPACE.sub(" ", statement).strip()
+    text = _STRING.sub("?", text)
+    text = _POSTCOMPILE.sub("(?)", text)
+    text = _PLACEHOLDER.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    return _IN_LIST.sub("(?)", text)
+
+
+class RequestQueries:
+    """Queries issued while serving one request."""
+
+    __slots__ = ("scope", "count", "total_ms", "fingerprints", "closed")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.count = 0
+        self.total_ms = 0.0
+        self.fingerprints: Counter = Counter()
+        self.closed = False
+
+    def record(self, statement: str, duration_ms: float):
+        # Tasks spawned by the request keep its context; stop counting once it is answered
+        if self.closed:
+            return
+        self.count += 1
+        self.total_ms += duration_ms
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """Fingerprints issued at least threshold times, most repeated first."""
+        return [(fp, n) for fp, n in self.fingerprints.most_common() if n >= threshold]
+
+
+_current: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def route_label(scope) -> str:
+    """METHOD plus the matched route template, filled in by the router."""
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return f"{scope['method']} {path}"
+
+
+def begin_request(scope: Optional[dict] = None) -> RequestQueries:
+    queries = RequestQueries(scope)
+    _current.set(queries)
+    return queries
+
+
+def current_request() -> Optional[RequestQueries]:
+    return _current.get()
+
+
+def current_route() -> Optional[str]:
+    """Route of the request being served, if any."""
+    queries = _current.get()
+    if queries is None or queries.scope is None:
+        return None
+    return route_label(queries.scope)
+
+
+def record_query(statement: str, duration_ms: float):
+    """Called from the engine hooks for every statement."""
+    queries = _current.get()
+    if queries is not None:
+        queries.record(statement, duration_ms)
+
+
+class RouteQueryStats:
+    """Query counts and DB time aggregated per route."""
+
+    def __init__(self):
+        self._routes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, route: str, queries: RequestQueries) -> List[Tuple[str, int]]:
+        """Fold one finished request into its route; returns its likely N+1 fingerprints."""
+        queries.closed = True
+        suspects = queries.repeated()
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    "requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0,
+                    "max_db_ms": 0.0, "n_plus_one_requests": 0, "suspects": {},
+                }
+            stats["requests"] += 1
+            stats["queries"] += queries.count
+            stats["db_ms"] += queries.total_ms
+            stats["max_queries"] = max(stats["max_queries"], queries.count)
+            stats["max_db_ms"] = max(stats["max_db_ms"], queries.total_ms)
+            if suspects:
+                stats["n_plus_one_requests"] += 1
+                known = stats["suspects"]
+                for fp, n in suspects:
+                    entry = known.setdefault(fp, {"requests": 0, "max_repeats": 0})
+                    entry["requests"] += 1
+                    entry["max_repeats"] = max(entry["max_repeats"], n)
+                if len(known) > SUSPECTS_PER_ROUTE:
+                    ranked = sorted(known.items(), key=lambda item: item[1]["requests"], reverse=True)
+                    stats["suspects"] = dict(ranked[:SUSPECTS_PER_ROUTE])
+        for fp, n in suspects:
+            logger.warning(f"Possible N+1 on {route}: {n}x {fp[:200]}")
+        return suspects
+
+    def snapshot(self) -> List[dict]:
+        """Routes by total DB time, with per-request averages."""
+        with self._lock:
+            routes = [
+                {
+                    "route": route,
+                    **{key: value for key, value in stats.items() if key != "suspects"},
+                    "avg_queries": stats["queries"] / stats["requests"],
+                    "avg_db_ms": stats["db_ms"] / stats["requests"],
+                    "suspects": [
+                        {"fingerprint": fp, **entry} for fp, entry in stats["suspects"].items()
+                    ],
+                }
+                for route, stats in self._routes.items()
+            ]
+        return sorted(routes, key=lambda route: route["db_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+query_stats = RouteQueryStats()
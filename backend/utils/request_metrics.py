@@ -0,0 +1,202 @@
+"""
+Per-route HTTP metrics.
+
+middleware.request_logging times every HTTP request and records it here,
+labelled by method and route template, not by raw path. For each route it
+keeps:
+- a latency histogram
+- a response size histogram
+- a count per status code
+There is also a gauge of requests in flight.
+
+The histograms use fixed buckets, so recording is O(1) and memory does not
+grow with traffic. GET /metrics renders everything in the Prometheus text
+format (histogram_quantile() works on the buckets) to callers presenting
+METRICS_TOKEN or connecting from METRICS_ALLOWED_IPS. GET
+/api/admin/request-stats shows p50/p95/p99 estimated from the same buckets,
+interpolated within a bucket the way Prometheus does.
+"""
+import hmac
+import os
+import threading
+from bisect import bisect_left
+from collections import Counter
+from ipaddress import ip_address, ip_network
+from typing import Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Who may read GET /metrics: scrapers sending "Authorization: Bearer <token>",
+# and clients from these comma-separated addresses or networks. Neither is
+# set by default, so the endpoint refuses everyone until one is configured.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_ALLOWED_IPS = [
+    ip_network(network.strip(), strict=False)
+    for network in os.getenv("METRICS_ALLOWED_IPS", "").split(",") if network.strip()
+]
+
+# Upper bounds; an implicit +Inf bucket follows the last one
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS_BYTES = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histogram:
+    """Fixed-bucket histogram, cumulative on export like Prometheus'."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs, +Inf last."""
+        total = 0
+        pairs = []
+        for bound, count in zip(list(self.bounds) + [float("inf")], self.counts):
+            total += count
+            pairs.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return pairs
+
+    def quantile(self, q: float) -> float:
+        """Estimate, interpolating linearly inside the bucket holding the q-th observation."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.bounds):
+                    # Past the last bound; the best we can say is "at least this"
+                    return self.bounds[-1]
+                lower = self.bounds[i - 1] if i else 0.0
+                return lower + (self.bounds[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+def metrics_access_allowed(client_host: Optional[str], authorization: Optional[str]) -> bool:
+    """Whether a request may read the metrics, by its bearer token or client address."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if METRICS_TOKEN and scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return True
+    if not client_host or not METRICS_ALLOWED_IPS:
+        return False
+    try:
+        address = ip_address(client_host)
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOWED_IPS)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """Latency, size and status histograms per (method, route)."""
+
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finish(self, method: str, route: str, status: int, duration_s: float, size: int):
+        with self._lock:
+            self.in_flight -= 1
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = {
+                    "latency": Histogram(LATENCY_BUCKETS_S),
+                    "size": Histogram(SIZE_BUCKETS_BYTES),
+                    "statuses": Counter(),
+                    "max_s": 0.0,
+                }
+            stats["latency"].observe(duration_s)
+            stats["size"].observe(size)
+            stats["statuses"][status] += 1
+            stats["max_s"] = max(stats["max_s"], duration_s)
+
+    def snapshot(self) -> List[dict]:
+        """Routes by total time spent serving them, with latency percentiles in ms."""
+        with self._lock:
+            routes = []
+            for (method, route), stats in self._routes.items():
+                latency, size = stats["latency"], stats["size"]
+                # A bucket estimate can land past the slowest request actually seen
+                percentile = lambda q: round(min(latency.quantile(q), stats["max_s"]) * 1000, 2)
+                routes.append({
+                    "route": f"{method} {route}",
+                    "requests": latency.count,
+                    "total_ms": round(latency.sum * 1000, 2),
+                    "avg_ms": round(latency.sum / latency.count * 1000, 2),
+                    "p50_ms": percentile(0.5),
+                    "p95_ms": percentile(0.95),
+                    "p99_ms": percentile(0.99),
+                    "max_ms": round(stats["max_s"] * 1000, 2),
+                    "avg_bytes": round(size.sum / size.count),
+                    "statuses": {str(code): n for code, n in sorted(stats["statuses"].items())},
+                })
+        return sorted(routes, key=lambda route: route["total_ms"], reverse=True)
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = [
+            "# HELP http_requests_in_flight Requests being served right now.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        with self._lock:
+            lines.append(f"http_requests_in_flight {self.in_flight}")
+            routes = sorted(self._routes.items())
+            statuses = [
+                (method, route, code, n)
+                for (method, route), stats in routes
+                for code, n in sorted(stats["statuses"].items())
+            ]
+            histograms = {
+                name: [
+                    (method, route, stats[key].cumulative(), stats[key].sum, stats[key].count)
+                    for (method, route), stats in routes
+                ]
+                for name, key in (("http_request_duration_seconds", "latency"), ("http_response_size_bytes", "size"))
+            }
+
+        lines += [
+            "# HELP http_requests_total Requests served, by route and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for method, route, code, n in statuses:
+            lines.append(f'http_requests_total{{method="{method}",route="{_label(route)}",status="{code}"}} {n}')
+
+        helps = {
+            "http_request_duration_seconds": "Time from receiving a request to sending the last byte of its response.",
+            "http_response_size_bytes": "Response body size.",
+        }
+        for name, series in histograms.items():
+            lines += [f"# HELP {name} {helps[name]}", f"# TYPE {name} histogram"]
+            for method, route, buckets, total, count in series:
+                labels = f'method="{method}",route="{_label(route)}"'
+                lines += [f'{name}_bucket{{{labels},le="{le}"}} {n}' for le, n in buckets]
+                lines.append(f"{name}_sum{{{labels}}} {total}")
+                lines.append(f"{name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self.max_in_flight = self.in_flight
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,238 @@
+"""
+Slow-query store.
+
+Every statement slower than SLOW_QUERY_MS is recorded by the cursor hooks
+in database.py. Each one keeps:
+- the full statement, normalized (see utils.query_stats.fingerprint)
+- a hash of its parameters, not the values themselves
+- its duration
+- the route being served
+
+The last SLOW_QUERY_BUFFER events stay in a ring buffer. Per-statement
+totals go to a slow_queries table in a side SQLite file (SLOW_QUERY_DB_PATH),
+so they survive restarts without taking the application database's write
+lock. The first time a statement is seen in this process, its EXPLAIN QUERY
+PLAN is captured on the same connection, so a full scan that wants an index
+shows up next to the time it costs.
+
+Plans are only captured on SQLite. On PostgreSQL a failed EXPLAIN would
+abort the caller's transaction; use auto_explain there.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils.query_stats import current_route, fingerprint
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_BUFFER = int(os.getenv("SLOW_QUERY_BUFFER", "500"))
+# Side database for the totals; empty keeps them in memory only
+SLOW_QUERY_DB_PATH = os.getenv(
+    "SLOW_QUERY_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "slow_queries.db"),
+)
+# Statements kept in the side table; the ones with the least total time go first
+SLOW_QUERY_MAX_ROWS = int(os.getenv("SLOW_QUERY_MAX_ROWS", "1000"))
+SLOW_QUERY_FLUSH_INTERVAL_S = int(os.getenv("SLOW_QUERY_FLUSH_INTERVAL_S", "10"))
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def explain_query_plan(dbapi_connection, statement: str, parameters) -> Optional[str]:
+    """SQLite's EXPLAIN QUERY PLAN as an indented tree, or None if it can't be explained."""
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return None
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as e:
+        logger.debug(f"EXPLAIN QUERY PLAN failed: {e}")
+        return None
+    finally:
+        cursor.close()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+
+def params_hash(parameters) -> str:
+    return hashlib.sha1(repr(parameters).encode()).hexdigest()[:12]
+
+
+def _new_totals() -> dict:
+    return {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "plan": None}
+
+
+def _add(totals: dict, event: dict, duration_ms: float, plan: Optional[str]):
+    totals["calls"] += 1
+    totals["total_ms"] += duration_ms
+    totals["max_ms"] = max(totals["max_ms"], duration_ms)
+    totals["route"] = event["route"]
+    totals["params_hash"] = event["params_hash"]
+    totals["last_seen"] = event["at"]
+    if plan is not None:
+        totals["plan"] = plan
+
+
+class SlowQueryLog:
+    """Ring buffer of recent slow queries plus persisted per-statement totals."""
+
+    def __init__(self, path: str = SLOW_QUERY_DB_PATH, threshold_ms: int = SLOW_QUERY_MS):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.recent = deque(maxlen=SLOW_QUERY_BUFFER)
+        self._lock = threading.Lock()
+        # Totals not yet written to the side table, by fingerprint
+        self._pending: Dict[str, dict] = {}
+        # Totals for what this process has seen: decides when to capture a plan,
+        # and is what top() reports when there is no side table
+        self._totals: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._db_ready = False
+
+    def record(self, conn, statement: str, parameters, executemany: bool, duration_ms: float):
+        """Called from the engine hooks for every statement over the threshold."""
+        fp = fingerprint(statement)
+        route = current_route()
+        event = {
+            "at": datetime.utcnow().isoformat(),
+            "fingerprint": fp,
+            "duration_ms": round(duration_ms, 2),
+            "route": route,
+            "params_hash": params_hash(parameters),
+        }
+        with self._lock:
+            first_seen = fp not in self._totals
+            if first_seen:
+                if len(self._totals) >= SLOW_QUERY_MAX_ROWS:
+                    del self._totals[min(self._totals, key=lambda key: self._totals[key]["total_ms"])]
+                self._totals[fp] = _new_totals()
+        plan = None
+        if first_seen and not executemany and conn.dialect.name == "sqlite":
+            plan = explain_query_plan(conn.connection, statement, parameters)
+        with self._lock:
+            self.recent.append(event)
+            if fp in self._totals:
+                _add(self._totals[fp], event, duration_ms, plan)
+            _add(self._pending.setdefault(fp, _new_totals()), event, duration_ms, plan)
+        logger.warning(f"SLOW QUERY: {duration_ms:.0f}ms on {route or 'no request'} - {fp}")
+
+    # Side table
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=5)
+        if not self._db_ready:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS slow_queries (
+                    fingerprint TEXT PRIMARY KEY,
+                    calls INTEGER NOT NULL,
+                    total_ms REAL NOT NULL,
+                    max_ms REAL NOT NULL,
+                    route TEXT,
+                    params_hash TEXT,
+                    plan TEXT,
+                    first_seen TEXT NOT NULL,
+                    last_seen TEXT NOT NULL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS ix_slow_queries_total_ms ON slow_queries (total_ms)")
+            self._db_ready = True
+        return db
+
+    def flush(self):
+        """Add pending totals to the side table (blocking; run off the event loop)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or not self.path:
+            return
+        try:
+            db = self._connect()
+            try:
+                with db:
+                    db.executemany("""
+                        INSERT INTO slow_queries
+                            (fingerprint, calls, total_ms, max_ms, route, params_hash, plan, first_seen, last_seen)
+                        VALUES (:fingerprint, :calls, :total_ms, :max_ms, :route, :params_hash, :plan, :last_seen, :last_seen)
+                        ON CONFLICT (fingerprint) DO UPDATE SET
+                            calls = calls + excluded.calls,
+                            total_ms = total_ms + excluded.total_ms,
+                            max_ms = MAX(max_ms, excluded.max_ms),
+                            route = excluded.route,
+                            params_hash = excluded.params_hash,
+                            plan = COALESCE(excluded.plan, plan),
+                            last_seen = excluded.last_seen
+                    """, [{"fingerprint": fp, **totals} for fp, totals in pending.items()])
+                    db.execute("""
+                        DELETE FROM slow_queries WHERE fingerprint NOT IN (
+                            SELECT fingerprint FROM slow_queries ORDER BY total_ms DESC LIMIT ?
+                        )
+                    """, (SLOW_QUERY_MAX_ROWS,))
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to persist slow queries: {e}")
+
+    def top(self, limit: int = 20) -> List[dict]:
+        """Statements by total time spent in them (blocking; run off the event loop)."""
+        self.flush()
+        if not self.path:
+            with self._lock:
+                rows = [{"fingerprint": fp, **totals} for fp, totals in self._totals.items()]
+            rows.sort(key=lambda row: row["total_ms"], reverse=True)
+            return [{**row, "avg_ms": row["total_ms"] / row["calls"]} for row in rows[:limit]]
+        db = self._connect()
+        db.row_factory = sqlite3.Row
+        try:
+            rows = db.execute("""
+                SELECT *, total_ms / calls AS avg_ms FROM slow_queries
+                ORDER BY total_ms DESC LIMIT ?
+            """, (limit,)).fetchall()
+        finally:
+            db.close()
+        return [dict(row) for row in rows]
+
+    def reset(self):
+        with self._lock:
+            self.recent.clear()
+            self._pending.clear()
+            self._totals.clear()
+        if self.path:
+            db = self._connect()
+            try:
+                with db:
+                    db.execute("DELETE FROM slow_queries")
+            finally:
+                db.close()
+
+    # Background flushing
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SLOW_QUERY_FLUSH_INTERVAL_S)
+            await asyncio.to_thread(self.flush)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,150 @@
+"""
+Startup timing.
+
+main.py times the steps of building the application (schema check, each
+router) and logs the total once the app is ready. With STARTUP_PROFILE on,
+it also times every module imported while the app is being built and logs
+the slowest ones. For each module it reports:
+- cumulative time, including the modules it imports
+- self time, its own top-level code only
+
+The same report is served at GET /api/admin/startup.
+
+This module is imported before FastAPI and SQLAlchemy so their imports are
+counted too; keep its own imports to the standard library.
+"""
+import importlib.abc
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "false").lower() == "true"
+# Modules listed in the log and the report, slowest first
+STARTUP_PROFILE_TOP = int(os.getenv("STARTUP_PROFILE_TOP", "25"))
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time its exec_module."""
+
+    def __init__(self, loader, timer: "ImportTimer", name: str):
+        self._loader = loader
+        self._timer = timer
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._timer.enter(self._name)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.exit()
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """Meta path hook recording cumulative and self import time per module."""
+
+    def __init__(self):
+        self.modules: Dict[str, dict] = {}
+        # [name, start, time spent in nested imports]
+        self._stack: List[list] = []
+        self._finding = False
+
+    def find_spec(self, fullname, path=None, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self, fullname)
+        return spec
+
+    def enter(self, name: str):
+        self._stack.append([name, time.perf_counter(), 0.0])
+
+    def exit(self):
+        name, start, nested = self._stack.pop()
+        total = time.perf_counter() - start
+        if self._stack:
+            self._stack[-1][2] += total
+        self.modules[name] = {"cumulative_ms": total * 1000, "self_ms": (total - nested) * 1000}
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def slowest(self, limit: int) -> List[dict]:
+        rows = sorted(self.modules.items(), key=lambda item: item[1]["cumulative_ms"], reverse=True)
+        return [
+            {"module": name, "cumulative_ms": round(t["cumulative_ms"], 2), "self_ms": round(t["self_ms"], 2)}
+            for name, t in rows[:limit]
+        ]
+
+
+class StartupProfile:
+    """Timed steps of application startup, plus per-module import times when profiling."""
+
+    def __init__(self, profile_imports: bool = STARTUP_PROFILE):
+        self.started = time.perf_counter()
+        self.phases: List[dict] = []
+        self.total_ms: Optional[float] = None
+        self.imports = ImportTimer() if profile_imports else None
+        if self.imports is not None:
+            self.imports.install()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({"phase": name, "ms": round((time.perf_counter() - start) * 1000, 2)})
+
+    def finish(self):
+        """The app is built: stop timing imports and log the results."""
+        self.total_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        if self.imports is None:
+            logger.info(f"Application built in {self.total_ms:.0f}ms")
+            return
+        self.imports.uninstall()
+        lines = [f"Application built in {self.total_ms:.0f}ms"]
+        lines += [f"  {p['ms']:8.1f}ms  {p['phase']}" for p in self.phases]
+        lines.append(f"Slowest of {len(self.imports.modules)} imports (cumulative / self):")
+        lines += [
+            f"  {m['cumulative_ms']:8.1f}ms {m['self_ms']:8.1f}ms  {m['module']}"
+            for m in self.imports.slowest(STARTUP_PROFILE_TOP)
+        ]
+        logger.info("\n".join(lines))
+
+    def report(self) -> dict:
+        return {
+            "total_ms": self.total_ms,
+            "phases": self.phases,
+            "imports": self.imports.slowest(STARTUP_PROFILE_TOP) if self.imports is not None else None,
+        }
+
+
+startup_profile = StartupProfile()
@@ -0,0 +1,112 @@
+"""
+Cache warm-up for hot endpoints.
+
+Routes register a builder for each cached page that admins hit first after a
+deploy or a Redis flush, together with the cache tags it depends on. All
+builders run in the background at startup, and a builder runs again shortly
+after any of its tags is invalidated by a write, so the next reader finds
+the page already cached.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Set
+
+from utils.cache import add_invalidation_hook
+
+logger = logging.getLogger(__name__)
+
+# Writes often come in bursts; wait a little so one rebuild covers them all
+WARMUP_DEBOUNCE_MS = int(os.getenv("CACHE_WARMUP_DEBOUNCE_MS", "250"))
+WARMUP_ENABLED = os.getenv("CACHE_WARMUP_ENABLED", "true").lower() == "true"
+
+Builder = Callable[[], Awaitable[None]]
+
+_builders: Dict[str, Builder] = {}
+_builders_by_tag: Dict[str, List[str]] = {}
+_scheduled: Set[str] = set()
+_tasks: Set[asyncio.Task] = set()
+warmup_stats = {"runs": 0, "errors": 0, "last_startup_ms": None}
+
+
+def register_warmup(name: str, tags: List[str] = ()):
+    """
+    Decorator registering an async builder that refreshes one or more cache keys.
+    Builders run on the event loop, so blocking work such as sync ORM queries
+    has to go through run_in_threadpool.
+
+    Args:
+        name: Unique builder name, used in logs
+        tags: Cache tags whose invalidation should trigger a rebuild
+    """
+    def decorator(func: Builder) -> Builder:
+        _builders[name] = func
+        for tag in tags:
+            _builders_by_tag.setdefault(tag, []).append(name)
+        return func
+    return decorator
+
+
+async def _run_builder(name: str):
+    start_time = time.time()
+    try:
+        await _builders[name]()
+        warmup_stats["runs"] += 1
+        elapsed = (time.time() - start_time) * 1000
+        logger.info(f"Cache warm-up {name} finished in {elapsed:.2f}ms")
+    except Exception as e:
+        warmup_stats["errors"] += 1
+        logger.error(f"Cache warm-up {name} failed: {e}")
+
+
+async def warm_all():
+    """Run every registered builder once (used at startup)."""
+    if not WARMUP_ENABLED:
+        return
+    start_time = time.time()
+    for name in list(_builders):
+        await _run_builder(name)
+    warmup_stats["last_startup_ms"] = round((time.time() - start_time) * 1000, 2)
+
+
+def _spawn(coro):
+    task = asyncio.get_running_loop().create_task(coro)
+    # Keep a reference so the task isn't garbage collected mid-run
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+def start_warmup():
+    """Warm every cache in the background without delaying startup."""
+    if WARMUP_ENABLED:
+        _spawn(warm_all())
+
+
+async def _rebuild_after_delay():
+    await asyncio.sleep(WARMUP_DEBOUNCE_MS / 1000)
+    names = list(_scheduled)
+    _scheduled.clear()
+    for name in names:
+        await _run_builder(name)
+
+
+def schedule_rebuild(tag: str):
+    """Invalidation hook: rebuild the caches depending on tag once writes settle."""
+    if not WARMUP_ENABLED:
+        return
+    names = _builders_by_tag.get(tag)
+    if not names:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    already_pending = bool(_scheduled)
+    _scheduled.update(names)
+    if not already_pending:
+        _spawn(_rebuild_after_delay())
+
+
+add_invalidation_hook(schedule_rebuild)